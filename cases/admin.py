@@ -6,6 +6,12 @@ from django.urls import reverse
 from cases.models.clinical_case import ClinicalCase
 from cases.models.medical_imaging import MedicalImaging
 from cases.models.lung_nodule import LungNodule
+from cases.models.processing_job import ProcessingJob
+from cases.models.processed_image_cache import ProcessedImageCache
+from cases.models.inference_result_cache import InferenceResultCache
+from cases.models.upload_session import UploadSession, UploadChunk
+from cases.models.case_volume import CaseVolume
+from cases.models.dicom_metadata import DicomMetadata
 
 
 class MedicalImagingInline(admin.TabularInline):
@@ -53,6 +59,62 @@ class CustomLungNoduleAdmin(admin.ModelAdmin):
     ordering = ("-created_at", "-updated_at")
 
 
+class CustomProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "medical_imaging", "kind", "state", "attempts", "worker", "started_at", "finished_at", "created_at")
+    search_fields = ("id", "medical_imaging__id", "worker")
+    list_filter = ("kind", "state", "created_at")
+    ordering = ("-created_at", "-updated_at")
+
+
+class CustomProcessedImageCacheAdmin(admin.ModelAdmin):
+    list_display = ("id", "key", "parameters", "size", "hits", "last_used_at", "created_at")
+    search_fields = ("key",)
+    list_filter = ("parameters", "last_used_at")
+    ordering = ("-last_used_at",)
+
+
+class CustomInferenceResultCacheAdmin(admin.ModelAdmin):
+    list_display = ("id", "image_hash", "workspace_name", "workflow_id", "workflow_version", "expires_at", "created_at")
+    search_fields = ("image_hash",)
+    list_filter = ("workflow_id", "workflow_version", "expires_at")
+    ordering = ("-created_at", "-updated_at")
+
+
+class UploadChunkInline(admin.TabularInline):
+    model = UploadChunk
+    extra = 0
+
+    readonly_fields = ('file_index', 'offset', 'size', 'created_at')
+    fields = ('file_index', 'offset', 'size', 'created_at')
+
+
+class CustomUploadSessionAdmin(admin.ModelAdmin):
+    list_display = ("id", "key", "clinical_case", "state", "created_at", "updated_at")
+    search_fields = ("key", "clinical_case__id")
+    list_filter = ("state", "created_at")
+    ordering = ("-created_at", "-updated_at")
+    inlines = (UploadChunkInline,)
+
+
+class CustomCaseVolumeAdmin(admin.ModelAdmin):
+    list_display = ("id", "clinical_case", "file_name", "width", "height", "slice_count", "updated_at")
+    search_fields = ("clinical_case__id", "file_name")
+    ordering = ("-updated_at",)
+
+
+class CustomDicomMetadataAdmin(admin.ModelAdmin):
+    list_display = ("id", "medical_imaging", "modality", "study_date", "series_instance_uid", "instance_number", "slice_location")
+    search_fields = ("medical_imaging__id", "study_instance_uid", "series_instance_uid", "series_description")
+    list_filter = ("modality", "study_date", "manufacturer")
+    ordering = ("-created_at", "-updated_at")
+
+
 admin.site.register(ClinicalCase, CustomClinicalCaseAdmin)
 admin.site.register(MedicalImaging, CustomMedicalImagingAdmin)
-admin.site.register(LungNodule, CustomLungNoduleAdmin)
\ No newline at end of file
+admin.site.register(LungNodule, CustomLungNoduleAdmin)
+admin.site.register(ProcessingJob, CustomProcessingJobAdmin)
+admin.site.register(ProcessedImageCache, CustomProcessedImageCacheAdmin)
+admin.site.register(InferenceResultCache, CustomInferenceResultCacheAdmin)
+admin.site.register(UploadSession, CustomUploadSessionAdmin)
+admin.site.register(CaseVolume, CustomCaseVolumeAdmin)
+admin.site.register(DicomMetadata, CustomDicomMetadataAdmin)
\ No newline at end of file
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CasesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "cases"
+
+    def ready(self):
+        # Calibrate the image filter engines once per process when requested
+        if settings.IMAGE_FILTER_CALIBRATE_ON_STARTUP:
+            from oncovision.utils.filter_engines import getFilterDispatcher
+            getFilterDispatcher()
@@ -0,0 +1,261 @@
+import io
+import os
+
+from oncovision.settings import IMAGE_PROCESSING_WORKERS, DICOM_WINDOW
+
+# Header attributes stored in their own indexed DicomMetadata columns: keyword -> (column, type)
+METADATA_COLUMNS = {
+    'Modality': ('modality', str),
+    'StudyInstanceUID': ('study_instance_uid', str),
+    'SeriesInstanceUID': ('series_instance_uid', str),
+    'StudyDate': ('study_date', 'date'),
+    'SeriesDescription': ('series_description', str),
+    'Manufacturer': ('manufacturer', str),
+    'BodyPartExamined': ('body_part_examined', str),
+    'InstanceNumber': ('instance_number', int),
+    'SliceLocation': ('slice_location', float),
+    'SliceThickness': ('slice_thickness', float),
+    'KVP': ('kvp', float),
+    'Exposure': ('exposure', float),
+    'ConvolutionKernel': ('convolution_kernel', str),
+    'Rows': ('rows', int),
+    'Columns': ('columns', int),
+}
+# Value representations left out of the attributes: binary data and sequences
+METADATA_SKIPPED_VRS = ('OB', 'OD', 'OF', 'OL', 'OV', 'OW', 'SQ', 'UN')
+METADATA_MAX_VALUE_LENGTH = 256
+
+# Archive entries that are not slices: the DICOMDIR index and macOS Finder metadata
+ARCHIVE_SKIPPED_ENTRIES = ('DICOMDIR', '.DS_Store')
+
+
+class DicomError(Exception):
+    """
+    Raised when an uploaded DICOM file cannot be converted to an image.
+    """
+
+
+def read_dicom(source, stop_before_pixels=False):
+    """
+    Parses a DICOM file without copying it to disk. source can be a Django uploaded
+    file (a large upload is read from the temporary file Django already wrote), a
+    path, bytes or any binary file object.
+    """
+    from pydicom import dcmread
+
+    if hasattr(source, 'temporary_file_path'):
+        source = source.temporary_file_path()
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    elif hasattr(source, 'seek'):
+        source.seek(0)
+    return dcmread(source, stop_before_pixels=stop_before_pixels)
+
+
+def _encode_dicom(dataset, window):
+    """
+    Returns the windowed 8-bit pixels of a parsed DICOM file and their PNG bytes.
+    """
+    import cv2
+    from oncovision.utils.windowing import windowDataset
+
+    pixel_array = windowDataset(dataset, window)
+
+    # Encode as PNG
+    success, encoded_image = cv2.imencode('.png', pixel_array)
+    if not success:
+        raise DicomError("Failed to encode the pixel data as PNG.")
+    return pixel_array, encoded_image.tobytes()
+
+
+def dicom_to_png(source, window=DICOM_WINDOW):
+    """
+    Converts the pixel data of a DICOM file to 8-bit PNG bytes, mapping the Hounsfield
+    units of the given window (see windowing.windowFor) to the 0-255 range.
+    Raises DicomError when it cannot be encoded.
+    """
+    return _encode_dicom(read_dicom(source), window)[1]
+
+
+def _convert_dicom_slice(source):
+    """
+    Converts one DICOM file in a pool worker. Returns the PNG bytes, None, the
+    SOPInstanceUID, the pixelDigest of the stored pixel values and the header metadata
+    (see dicom_metadata), or None, the error message, None, None and None.
+    """
+    from oncovision.utils.image_pipeline import pixelDigest
+
+    try:
+        dataset = read_dicom(source)
+        _, png_bytes = _encode_dicom(dataset, DICOM_WINDOW)
+        # pixel_array is cached on the dataset, it is not decoded again
+        return (
+            png_bytes, None, dataset.get('SOPInstanceUID') or None, pixelDigest(dataset.pixel_array),
+            dicom_metadata(dataset)
+        )
+    except DicomError:
+        return None, "Failed to convert DICOM image to PNG format.", None, None, None
+    except Exception as e:
+        return None, f"Error processing DICOM file: {str(e)}", None, None, None
+
+
+def _dicom_source(upload):
+    """
+    Returns the path of a file already on disk (Django's temporary upload file or a
+    file opened from disk), or the bytes of an in-memory upload.
+    """
+    if isinstance(upload, bytes):
+        return upload
+    if hasattr(upload, 'temporary_file_path'):
+        return upload.temporary_file_path()
+    path = getattr(getattr(upload, 'file', None), 'name', None)
+    if isinstance(path, str) and os.path.isfile(path):
+        return path
+    return upload.read()
+
+
+def convert_dicom_slices(uploads, workers=IMAGE_PROCESSING_WORKERS):
+    """
+    Converts uploaded DICOM files (or their bytes) to PNG across a pool of worker
+    processes. Files already on disk are passed to the workers by path, in-memory
+    uploads by their bytes. Returns a list of (PNG bytes, error message,
+    SOPInstanceUID, content hash, header metadata) in upload order, used to detect
+    duplicate slices and index the headers.
+    """
+    from oncovision.utils.image_pipeline import parallelMap
+
+    return parallelMap(_convert_dicom_slice, [_dicom_source(upload) for upload in uploads], workers)
+
+
+def slice_position(dataset):
+    """
+    Returns the position of a slice along the normal of its plane (the z coordinate
+    for axial slices), or None when the file has no ImagePositionPatient.
+    """
+    position = dataset.get('ImagePositionPatient')
+    if position is None or len(position) != 3:
+        return None
+    orientation = dataset.get('ImageOrientationPatient')
+    if orientation is None or len(orientation) != 6:
+        return float(position[2])
+    row, column = [float(value) for value in orientation[:3]], [float(value) for value in orientation[3:]]
+    normal = (
+        row[1] * column[2] - row[2] * column[1],
+        row[2] * column[0] - row[0] * column[2],
+        row[0] * column[1] - row[1] * column[0],
+    )
+    return sum(float(value) * axis for value, axis in zip(position, normal))
+
+
+def slice_sort_key(dataset, name):
+    """
+    Orders the slices of an archive by series, then by InstanceNumber and by
+    ImagePositionPatient when the instance numbers are missing or equal, then by name.
+    """
+    instance_number = dataset.get('InstanceNumber')
+    position = slice_position(dataset)
+    return (
+        str(dataset.get('SeriesInstanceUID', '')),
+        instance_number is None, int(instance_number) if instance_number is not None else 0,
+        position is None, position if position is not None else 0.0,
+        name,
+    )
+
+
+def open_archive(upload):
+    """
+    Opens an uploaded ZIP archive without reading it into memory: from disk when
+    Django wrote it to a temporary file (or it is a file opened from disk), otherwise
+    from the in-memory upload.
+    """
+    import zipfile
+
+    if hasattr(upload, 'temporary_file_path'):
+        return zipfile.ZipFile(upload.temporary_file_path())
+    path = getattr(getattr(upload, 'file', None), 'name', None)
+    if isinstance(path, str) and os.path.isfile(path):
+        return zipfile.ZipFile(path)
+    upload.seek(0)
+    return zipfile.ZipFile(upload)
+
+
+def archive_slices(archive):
+    """
+    Reads the header of every entry of a ZIP archive (flat or DICOMDIR-structured),
+    skipping the pixel data, and returns the entry names of the slices in series
+    order (see slice_sort_key) and a list of {"file", "error"} for the entries that
+    are not DICOM images.
+    """
+    slices = []
+    errors = []
+    for info in archive.infolist():
+        basename = os.path.basename(info.filename)
+        if info.is_dir() or basename in ARCHIVE_SKIPPED_ENTRIES or basename.startswith('._') \
+                or info.filename.startswith('__MACOSX/'):
+            continue
+        try:
+            with archive.open(info) as entry:
+                dataset = read_dicom(entry, stop_before_pixels=True)
+        except Exception:
+            errors.append({"file": info.filename, "error": "Not a DICOM file."})
+            continue
+        if 'Rows' not in dataset:
+            errors.append({"file": info.filename, "error": "DICOM file has no image."})
+            continue
+        slices.append((slice_sort_key(dataset, info.filename), info.filename))
+    slices.sort()
+    return [name for _, name in slices], errors
+
+
+def _metadata_value(value):
+    """
+    Converts a header value to JSON: numbers stay numbers, everything else is a string.
+    """
+    from pydicom.multival import MultiValue
+
+    if isinstance(value, (list, tuple, MultiValue)):
+        return [_metadata_value(item) for item in value]
+    if isinstance(value, (int, float)):
+        return value
+    return str(value)
+
+
+def dicom_metadata(dataset):
+    """
+    Returns the header metadata of a parsed DICOM file (it can be read with
+    stop_before_pixels): the METADATA_COLUMNS values, None when absent or invalid, and
+    under "attributes" every other short non-binary element by keyword.
+    """
+    from pydicom.multival import MultiValue
+    import datetime
+
+    metadata = {}
+    for keyword, (column, kind) in METADATA_COLUMNS.items():
+        value = dataset.get(keyword)
+        try:
+            if value is None or value == '':
+                value = None
+            elif kind == 'date':
+                value = datetime.datetime.strptime(str(value), '%Y%m%d').date().isoformat()
+            elif kind is str:
+                # Multi-valued strings, like ConvolutionKernel, are joined
+                value = '\\'.join(str(item) for item in value) if isinstance(value, MultiValue) else str(value)
+            else:
+                value = kind(value)
+        except (TypeError, ValueError):
+            value = None
+        metadata[column] = value
+
+    spacing = dataset.get('PixelSpacing')
+    metadata['pixel_spacing_row'], metadata['pixel_spacing_column'] = \
+        (float(spacing[0]), float(spacing[1])) if spacing is not None and len(spacing) == 2 else (None, None)
+
+    attributes = {}
+    for element in dataset:
+        if not element.keyword or element.keyword in METADATA_COLUMNS or element.VR in METADATA_SKIPPED_VRS:
+            continue
+        value = _metadata_value(element.value)
+        if len(str(value)) <= METADATA_MAX_VALUE_LENGTH:
+            attributes[element.keyword] = value
+    metadata['attributes'] = attributes
+    return metadata
@@ -0,0 +1,94 @@
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+import hashlib
+
+from cases.models.processed_image_cache import ProcessedImageCache
+from oncovision.settings import PROCESSED_IMAGE_CACHE_MAX_SIZE
+
+
+def cache_parameters(window_size, sigma_d, width, height, fast_statistics=False, engine=None):
+    """
+    Returns the string identifying the filter parameters, engine and engine version
+    that produced a processed image. Entries made with other parameters are never
+    reused. The exact engines give bit-identical output and share their entries; any
+    other engine (such as 'cuda') is keyed by its name.
+    """
+    from oncovision.utils.filter_engines import ENGINE_VERSION, ENGINES
+
+    statistics = 'fast' if fast_statistics else 'exact'
+    engine = 'exact' if engine is None or ENGINES[engine].exact else engine
+    return f"abf-v{ENGINE_VERSION}:w{window_size}:s{sigma_d}:{width}x{height}:{statistics}:{engine}"
+
+
+def cache_key(digest, parameters):
+    """
+    Returns the cache key of a slice from the digest of its decoded pixels.
+    """
+    return hashlib.sha256(f"{digest}:{parameters}".encode()).hexdigest()
+
+
+def lookup(keys):
+    """
+    Returns a dict of key -> processed PNG bytes for the cached keys, marking them as
+    recently used.
+    """
+    if not keys or PROCESSED_IMAGE_CACHE_MAX_SIZE <= 0:
+        return {}
+    cached = {}
+    entries = ProcessedImageCache.objects.filter(key__in=set(keys))
+    for entry in entries:
+        try:
+            with entry.image.open('rb') as image_file:
+                cached[entry.key] = image_file.read()
+        except (FileNotFoundError, ValueError):
+            # The file was removed from storage, drop the entry
+            entry.delete()
+    ProcessedImageCache.objects.filter(key__in=cached).update(
+        last_used_at=timezone.now(), hits=F('hits') + 1
+    )
+    return cached
+
+
+def store(images, parameters, max_size=PROCESSED_IMAGE_CACHE_MAX_SIZE):
+    """
+    Caches a dict of key -> processed PNG bytes made with parameters, then evicts the
+    least recently used entries above max_size bytes.
+    """
+    if max_size <= 0:
+        return
+    for key, image_bytes in images.items():
+        try:
+            with transaction.atomic():
+                entry = ProcessedImageCache.objects.create(key=key, parameters=parameters, size=len(image_bytes))
+        except IntegrityError:
+            # Another worker cached the same image
+            continue
+        entry.image.save(f"{key}.png", ContentFile(image_bytes), save=True)
+    evict(parameters, max_size)
+
+
+def _delete(entry):
+    if entry.image:
+        entry.image.delete(save=False)
+    entry.delete()
+
+
+def evict(parameters, max_size=PROCESSED_IMAGE_CACHE_MAX_SIZE):
+    """
+    Deletes the entries made with other filter parameters, then the least recently used
+    entries until the cache holds at most max_size bytes.
+    """
+    for entry in ProcessedImageCache.objects.exclude(parameters=parameters):
+        _delete(entry)
+
+    total_size = ProcessedImageCache.objects.aggregate(total=Sum('size'))['total'] or 0
+    if total_size <= max_size:
+        return
+    for entry in ProcessedImageCache.objects.order_by('last_used_at'):
+        _delete(entry)
+        total_size -= entry.size
+        if total_size <= max_size:
+            break
@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+import logging
+import base64
+import time
+
+from oncovision.settings import ROBOFLOW_API_URL, ROBOFLOW_API_KEY, INFERENCE_WORKSPACE, INFERENCE_WORKFLOW_ID, \
+    INFERENCE_MAX_IN_FLIGHT, INFERENCE_TIMEOUT, INFERENCE_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class InferenceError(Exception):
+    """
+    Raised when a workflow call fails after its retries.
+    """
+
+
+class InferenceDispatcher:
+    """
+    Runs a Roboflow workflow on many images concurrently over one pooled HTTP session.
+    At most max_in_flight calls run at once; each call has a timeout of timeout seconds
+    and is retried up to retries times on connection errors, timeouts, interrupted
+    responses and the RETRY_STATUS_CODES responses; other request errors fail at once.
+    The requests match the inference SDK's run_workflow, so api_url can point at
+    Roboflow or at a self-hosted inference server.
+    """
+
+    def __init__(self, api_url=ROBOFLOW_API_URL, api_key=ROBOFLOW_API_KEY, workspace_name=INFERENCE_WORKSPACE,
+                 workflow_id=INFERENCE_WORKFLOW_ID, max_in_flight=INFERENCE_MAX_IN_FLIGHT, timeout=INFERENCE_TIMEOUT,
+                 retries=INFERENCE_RETRIES, backoff=0.5):
+        self.api_url = api_url.rstrip('/')
+        self.api_key = api_key
+        self.workspace_name = workspace_name
+        self.workflow_id = workflow_id
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # Latency records of the most recent calls
+        self.latencies = deque(maxlen=1000)
+        self._session = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"{self.api_url}/{self.workspace_name}/workflows/{self.workflow_id}"
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="inference")
+            return self._executor
+
+    def run(self, image, key=None):
+        """
+        Runs the workflow on one image (PNG bytes or a file path) and returns the
+        workflow outputs. Raises InferenceError when every attempt fails.
+        """
+        import requests
+
+        if isinstance(image, str):
+            with open(image, 'rb') as image_file:
+                image = image_file.read()
+        payload = {
+            "api_key": self.api_key,
+            "use_cache": True,
+            "enable_profiling": False,
+            "inputs": {"image": {"type": "base64", "value": base64.b64encode(image).decode()}},
+        }
+
+        session = self._get_session()
+        start = time.perf_counter()
+        error = None
+        for attempt in range(1, self.retries + 2):
+            try:
+                response = session.post(self.url, json=payload, timeout=self.timeout)
+                if response.status_code >= 400:
+                    error = InferenceError(f"Workflow call failed with status {response.status_code}.")
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        # Client errors (bad key, unknown workflow) will not succeed on retry
+                        break
+                else:
+                    outputs = response.json()["outputs"]
+                    self._record(key, start, attempt, True)
+                    return outputs
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                error = InferenceError(f"Workflow call failed: {e}")
+            except requests.RequestException as e:
+                # Invalid URLs, redirect loops and the like will not succeed on retry
+                error = InferenceError(f"Workflow call failed: {e}")
+                break
+            except (ValueError, KeyError):
+                error = InferenceError("Workflow returned an invalid response.")
+                break
+            if attempt <= self.retries:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+        self._record(key, start, attempt, False)
+        raise error
+
+    def _record(self, key, start, attempts, success):
+        seconds = time.perf_counter() - start
+        self.latencies.append({"key": key, "seconds": seconds, "attempts": attempts, "success": success})
+        logger.debug("Workflow call for %s took %.3fs in %d attempts", key, seconds, attempts)
+
+    def run_many(self, images):
+        """
+        Runs the workflow on a dict of key -> image concurrently. Returns a dict of
+        key -> workflow outputs, or the InferenceError raised for that image.
+        """
+        futures = {key: self._get_executor().submit(self.run, image, key) for key, image in images.items()}
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except InferenceError as e:
+                results[key] = e
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+_dispatcher = None
+
+
+def get_inference_dispatcher():
+    """
+    Returns the process-wide inference dispatcher configured from the INFERENCE_*
+    settings, creating it on first use.
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = InferenceDispatcher()
+    return _dispatcher
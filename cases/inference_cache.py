@@ -0,0 +1,58 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+import hashlib
+
+from cases.models.inference_result_cache import InferenceResultCache
+from oncovision.settings import INFERENCE_CACHE_TTL, INFERENCE_WORKFLOW_VERSION
+
+
+def image_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def lookup(hashes, workspace_name, workflow_id, workflow_version=INFERENCE_WORKFLOW_VERSION):
+    """
+    Returns a dict of image hash -> cached workflow outputs for the hashes with an
+    unexpired result of this workflow version.
+    """
+    if not hashes or INFERENCE_CACHE_TTL <= 0:
+        return {}
+    entries = InferenceResultCache.objects.filter(
+        image_hash__in=set(hashes), workspace_name=workspace_name, workflow_id=workflow_id,
+        workflow_version=workflow_version, expires_at__gt=timezone.now()
+    )
+    return {entry.image_hash: entry.outputs for entry in entries}
+
+
+def store(results, workspace_name, workflow_id, workflow_version=INFERENCE_WORKFLOW_VERSION,
+          ttl=INFERENCE_CACHE_TTL):
+    """
+    Caches a dict of image hash -> workflow outputs for ttl seconds.
+    """
+    if ttl <= 0:
+        return
+    expires_at = timezone.now() + timezone.timedelta(seconds=ttl)
+    for digest, outputs in results.items():
+        try:
+            with transaction.atomic():
+                InferenceResultCache.objects.update_or_create(
+                    image_hash=digest, workspace_name=workspace_name, workflow_id=workflow_id,
+                    workflow_version=workflow_version,
+                    defaults={"outputs": outputs, "expires_at": expires_at}
+                )
+        except IntegrityError:
+            # Another worker cached the same result
+            continue
+
+
+def purge(workflow_version=INFERENCE_WORKFLOW_VERSION, everything=False):
+    """
+    Deletes the expired results and those of other workflow versions, or every result.
+    Returns the number of deleted entries.
+    """
+    entries = InferenceResultCache.objects.all()
+    if not everything:
+        entries = entries.filter(expires_at__lte=timezone.now()) | entries.exclude(workflow_version=workflow_version)
+    deleted, _ = entries.delete()
+    return deleted
@@ -0,0 +1,299 @@
+from django.core.files.base import ContentFile
+from django.db.models import Q
+
+import os
+import zipfile
+
+from cases.dicom import convert_dicom_slices, open_archive, archive_slices, _dicom_source
+from cases.models.medical_imaging import MedicalImaging
+from cases.models.lung_nodule import LungNodule
+from cases.models.dicom_metadata import DicomMetadata
+from cases.pyramids import build_pyramids
+from cases.processing import enqueue_volume_job
+from oncovision.settings import DICOM_ARCHIVE_BATCH_SIZE, DUPLICATE_UPLOAD_SCOPE, IMAGE_PROCESSING_WORKERS, \
+    VOLUME_STORE_ENABLED
+
+ALLOWED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.dcm', '.zip')
+DUPLICATE_SCOPES = ('case', 'patient', 'off')
+
+
+def _dicom_image(clinical_case, name, png_bytes):
+    medical_image = MedicalImaging(clinical_case=clinical_case, state='preview')
+    # Use original filename but change extension to .png
+    base_filename = os.path.splitext(os.path.basename(name))[0]
+    medical_image.full_image.save(f"{base_filename}.png", ContentFile(png_bytes), save=False)
+    return medical_image
+
+
+def _regular_image(clinical_case, file):
+    medical_image = MedicalImaging(clinical_case=clinical_case, state='preview')
+    medical_image.full_image.save(os.path.basename(file.name), file, save=False)
+    return medical_image
+
+
+def image_digests(files, workers=IMAGE_PROCESSING_WORKERS):
+    """
+    Returns the content hash (image_pipeline.imageDigest) of PNG/JPG uploads, decoded
+    across the processing pool. None for the files that cannot be decoded.
+    """
+    from oncovision.utils.image_pipeline import imageDigest, parallelMap
+
+    return parallelMap(imageDigest, [_dicom_source(file) for file in files], workers)
+
+
+def save_dicom_metadata(headers):
+    """
+    Stores the DICOM header metadata (see dicom.dicom_metadata) of saved images, given
+    as a list of (MedicalImaging, metadata), with one bulk insert.
+    """
+    DicomMetadata.objects.bulk_create(
+        [DicomMetadata(medical_imaging=medical_image, **metadata) for medical_image, metadata in headers if metadata],
+        batch_size=500
+    )
+
+
+class DuplicateIndex:
+    """
+    Finds the uploaded slices already stored, by SOPInstanceUID or pixel content hash,
+    among the images of a clinical case (scope 'case') or of all the cases of its
+    patient (scope 'patient'). Each batch of files is looked up with one indexed
+    query, then every file is checked with dict lookups, including against the files
+    added earlier in the same upload.
+    Duplicates of the same case are skipped; duplicates from another case are linked:
+    a new record of this case shares the stored files, state and nodules of the
+    existing one, so it is neither filtered nor analyzed again.
+    """
+
+    def __init__(self, clinical_case, scope=DUPLICATE_UPLOAD_SCOPE):
+        self.clinical_case = clinical_case
+        self.scope = scope
+        self.duplicates = []
+        self._by_uid = {}
+        self._by_hash = {}
+        self._linked = []
+
+    def _images(self):
+        if self.scope == 'patient' and self.clinical_case.patient_id is not None:
+            return MedicalImaging.objects.filter(clinical_case__patient_id=self.clinical_case.patient_id)
+        return MedicalImaging.objects.filter(clinical_case=self.clinical_case)
+
+    def load(self, sop_instance_uids, content_hashes):
+        """
+        Loads the stored images matching any of the given keys.
+        """
+        sop_instance_uids = {uid for uid in sop_instance_uids if uid and uid not in self._by_uid}
+        content_hashes = {digest for digest in content_hashes if digest and digest not in self._by_hash}
+        if self.scope == 'off' or not (sop_instance_uids or content_hashes):
+            return
+        images = self._images().filter(
+            Q(sop_instance_uid__in=sop_instance_uids) | Q(content_hash__in=content_hashes)
+        ).order_by('id')
+        for image in images:
+            self._remember(image)
+
+    def _remember(self, image):
+        # An image of this case takes precedence, so its duplicates are skipped rather than linked
+        for index, key in ((self._by_uid, image.sop_instance_uid), (self._by_hash, image.content_hash)):
+            if key and (key not in index or image.clinical_case_id == self.clinical_case.id):
+                index[key] = image
+
+    def add(self, name, sop_instance_uid, content_hash, build):
+        """
+        Returns the record to create for an uploaded file, built by build() when it is
+        new or linked to the existing image, or None when it is skipped.
+        """
+        existing = None
+        if self.scope != 'off':
+            existing = self._by_uid.get(sop_instance_uid) if sop_instance_uid else None
+            if existing is None and content_hash:
+                existing = self._by_hash.get(content_hash)
+        if existing is not None and existing.clinical_case_id == self.clinical_case.id:
+            self.duplicates.append({"file": name, "action": "skipped", "image": existing})
+            return None
+
+        if existing is None:
+            medical_image = build()
+        else:
+            medical_image = self._link(existing)
+            self.duplicates.append({"file": name, "action": "linked", "image": existing})
+        medical_image.sop_instance_uid = sop_instance_uid
+        medical_image.content_hash = content_hash
+        self._remember(medical_image)
+        return medical_image
+
+    def _link(self, existing):
+        medical_image = MedicalImaging(
+            clinical_case=self.clinical_case,
+            full_image=existing.full_image.name,
+            thumbnail_image=existing.thumbnail_image.name,
+            medium_image=existing.medium_image.name,
+            tiles=existing.tiles.name,
+            state='preview',
+        )
+        if existing.state in ('ready', 'analyzed') and existing.processed_image:
+            medical_image.processed_image = existing.processed_image.name
+            medical_image.state = existing.state
+            if existing.state == 'analyzed':
+                self._linked.append((medical_image, existing))
+        return medical_image
+
+    def copy_nodules(self):
+        """
+        Copies the nodules of the analyzed images to the records linked to them. Call
+        it once the linked records are saved.
+        """
+        nodules = []
+        sources = {}
+        for medical_image, existing in self._linked:
+            sources.setdefault(existing.id, []).append(medical_image)
+        for nodule in LungNodule.objects.filter(medical_imaging_id__in=sources.keys()):
+            for medical_image in sources[nodule.medical_imaging_id]:
+                nodules.append(LungNodule(
+                    medical_imaging=medical_image,
+                    malignancy_type=nodule.malignancy_type,
+                    x_position=nodule.x_position,
+                    y_position=nodule.y_position,
+                    width=nodule.width,
+                    height=nodule.height,
+                    confidence=nodule.confidence,
+                ))
+        LungNodule.objects.bulk_create(nodules, batch_size=500)
+        self._linked = []
+
+    def report(self):
+        """
+        Returns the deduplicated files as {"file", "action", "duplicate_of",
+        "clinical_case_id"}, where duplicate_of is the id of the image already stored.
+        """
+        return [
+            {
+                "file": duplicate["file"],
+                "action": duplicate["action"],
+                "duplicate_of": duplicate["image"].id,
+                "clinical_case_id": duplicate["image"].clinical_case_id,
+            }
+            for duplicate in self.duplicates
+        ]
+
+
+def ingest_archive(clinical_case, archive_file, batch_size=DICOM_ARCHIVE_BATCH_SIZE, duplicates=None):
+    """
+    Stores the DICOM slices of a ZIP archive (a flat series or a DICOMDIR-structured
+    export) as preview MedicalImaging records, created in slice order. Only the
+    headers are read to order the slices, then batch_size entries at a time are read,
+    converted and saved, so memory stays flat whatever the archive size. Slices
+    already stored are deduplicated with the given DuplicateIndex. Returns the created
+    records and a list of {"file", "error"} for the skipped entries.
+    """
+    duplicates = duplicates if duplicates is not None else DuplicateIndex(clinical_case)
+    archive_name = os.path.basename(archive_file.name)
+    medical_images = []
+    with open_archive(archive_file) as archive:
+        names, errors = archive_slices(archive)
+        errors = [{"file": f"{archive_name}/{error['file']}", "error": error["error"]} for error in errors]
+        for start in range(0, len(names), batch_size):
+            batch = names[start:start + batch_size]
+            converted = convert_dicom_slices([archive.read(name) for name in batch])
+            duplicates.load([result[2] for result in converted], [result[3] for result in converted])
+            batch_images = []
+            headers = []
+            for name, (png_bytes, error, sop_instance_uid, content_hash, metadata) in zip(batch, converted):
+                if error:
+                    errors.append({"file": f"{archive_name}/{name}", "error": error})
+                    continue
+                medical_image = duplicates.add(
+                    f"{archive_name}/{name}", sop_instance_uid, content_hash,
+                    lambda: _dicom_image(clinical_case, name, png_bytes)
+                )
+                if medical_image is not None:
+                    batch_images.append(medical_image)
+                    headers.append((medical_image, metadata))
+            batch_images = MedicalImaging.objects.bulk_create(batch_images)
+            save_dicom_metadata(headers)
+            duplicates.copy_nodules()
+            build_pyramids(batch_images)
+            medical_images.extend(batch_images)
+    return medical_images, errors
+
+
+def ingest_files(clinical_case, files, duplicate_scope=DUPLICATE_UPLOAD_SCOPE):
+    """
+    Stores uploaded files as preview MedicalImaging records of a clinical case. DICOM
+    files are converted to PNG across the processing pool and the records are created
+    with one bulk insert, along with their DICOM headers (see save_dicom_metadata),
+    then their pyramid levels are built (see build_pyramids). files are Django File
+    objects (uploads or files opened from disk). ZIP archives are expanded with
+    ingest_archive. Slices already stored are skipped or linked according to
+    duplicate_scope (see DuplicateIndex). With VOLUME_STORE_ENABLED a job is queued to
+    add the new slices to the case's volume (see enqueue_volume_job).
+    Returns the created records in the order of files, a list of {"file", "error"}
+    for the files that were skipped and the DuplicateIndex.report() of the
+    deduplicated ones.
+    """
+    duplicates = DuplicateIndex(clinical_case, duplicate_scope)
+    errors = []
+    medical_images = []
+    # Index in files of each record, to return them in upload order
+    positions = []
+    image_files = []
+    dicom_files = []
+    archives = []
+    for index, file in enumerate(files):
+        # Check if it's in a correct format
+        if not file.name.lower().endswith(ALLOWED_EXTENSIONS):
+            errors.append({
+                "file": file.name,
+                "error": "Invalid file type. Only PNG, JPG, JPEG, DICOM and ZIP files are allowed."
+            })
+        elif file.name.lower().endswith('.dcm'):
+            dicom_files.append((index, file))
+        elif file.name.lower().endswith('.zip'):
+            archives.append((index, file))
+        else:
+            image_files.append((index, file))
+
+    # Hash the regular images and convert the DICOMs to PNG across the processing pool
+    digests = [None] * len(image_files)
+    if duplicate_scope != 'off':
+        digests = image_digests([file for _, file in image_files])
+    converted = convert_dicom_slices([file for _, file in dicom_files])
+    duplicates.load([result[2] for result in converted], digests + [result[3] for result in converted])
+
+    for (index, file), content_hash in zip(image_files, digests):
+        # Handle regular image files (PNG, JPG, JPEG)
+        medical_image = duplicates.add(file.name, None, content_hash, lambda: _regular_image(clinical_case, file))
+        if medical_image is not None:
+            medical_images.append(medical_image)
+            positions.append(index)
+
+    headers = []
+    for (index, file), (png_bytes, error, sop_instance_uid, content_hash, metadata) in zip(dicom_files, converted):
+        if error:
+            errors.append({"file": file.name, "error": error})
+            continue
+        medical_image = duplicates.add(
+            file.name, sop_instance_uid, content_hash, lambda: _dicom_image(clinical_case, file.name, png_bytes)
+        )
+        if medical_image is not None:
+            medical_images.append(medical_image)
+            positions.append(index)
+            headers.append((medical_image, metadata))
+    medical_images = MedicalImaging.objects.bulk_create(medical_images)
+    save_dicom_metadata(headers)
+    duplicates.copy_nodules()
+    build_pyramids(medical_images)
+
+    for index, archive_file in archives:
+        try:
+            archive_images, archive_errors = ingest_archive(clinical_case, archive_file, duplicates=duplicates)
+        except zipfile.BadZipFile:
+            errors.append({"file": archive_file.name, "error": "Invalid ZIP archive."})
+            continue
+        medical_images.extend(archive_images)
+        positions.extend([index] * len(archive_images))
+        errors.extend(archive_errors)
+    medical_images = [image for _, image in sorted(zip(positions, medical_images), key=lambda pair: pair[0])]
+
+    if VOLUME_STORE_ENABLED and medical_images:
+        enqueue_volume_job(medical_images[0])
+    return medical_images, errors, duplicates.report()
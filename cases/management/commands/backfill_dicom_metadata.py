@@ -0,0 +1,174 @@
+from django.core.management.base import BaseCommand
+
+import os
+import zipfile
+
+from cases.dicom import read_dicom, dicom_metadata
+from cases.ingestion import save_dicom_metadata
+from cases.models.dicom_metadata import DicomMetadata
+from cases.models.medical_imaging import MedicalImaging
+from oncovision.settings import DICOM_WINDOW, IMAGE_PROCESSING_WORKERS
+
+
+def original_conversion(pixel_array):
+    """
+    Returns the 8-bit pixels of a DICOM slice as uploads converted them before DICOM
+    windowing: each slice stretched to its own range and truncated to uint8.
+    """
+    import numpy as np
+
+    if pixel_array.dtype != np.uint8:
+        pixel_min = pixel_array.min()
+        pixel_max = pixel_array.max()
+        if pixel_max != pixel_min:
+            pixel_array = ((pixel_array - pixel_min) * 255.0 / (pixel_max - pixel_min))
+        pixel_array = pixel_array.astype(np.uint8)
+    return pixel_array
+
+
+class Command(BaseCommand):
+    """
+    Indexes the DICOM headers of medical images uploaded before their metadata was
+    stored. Only the converted PNGs are kept, so the headers are read from the
+    original DICOM files, given as files, directories or ZIP archives, and matched to
+    the images by SOPInstanceUID. Images stored before SOPInstanceUIDs were kept are
+    matched by content instead: the DICOM is converted again, with the current window
+    and with the min-max stretch earlier uploads used, and compared with the pixels of
+    the stored PNG. Matched images also get their sop_instance_uid and content_hash,
+    so later uploads of the same slices are deduplicated.
+    """
+
+    help = "Index the DICOM headers of existing medical images from their original DICOM files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="DICOM files, directories or ZIP archives.")
+        parser.add_argument("--case", type=int, help="Only match the images of this clinical case.")
+        parser.add_argument("--overwrite", action="store_true", help="Replace the metadata already indexed.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Headers matched and saved at a time.")
+        parser.add_argument("--workers", type=int, default=IMAGE_PROCESSING_WORKERS,
+                            help="Processes decoding the stored images to match them by content.")
+
+    def headers(self, paths, pixels):
+        """
+        Yields the (name, dataset) of every DICOM file under the paths, read without
+        its pixel data unless pixels is set.
+        """
+        for path in paths:
+            if os.path.isdir(path):
+                files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+            else:
+                files = [path]
+            for file_path in files:
+                if zipfile.is_zipfile(file_path):
+                    with zipfile.ZipFile(file_path) as archive:
+                        for info in archive.infolist():
+                            if info.is_dir():
+                                continue
+                            try:
+                                with archive.open(info) as entry:
+                                    dataset = read_dicom(entry, stop_before_pixels=not pixels)
+                                yield f"{file_path}/{info.filename}", dataset
+                            except Exception:
+                                continue
+                    continue
+                try:
+                    yield file_path, read_dicom(file_path, stop_before_pixels=not pixels)
+                except Exception:
+                    continue
+
+    def images(self, options):
+        images = MedicalImaging.objects.all()
+        if options["case"] is not None:
+            images = images.filter(clinical_case_id=options["case"])
+        if not options["overwrite"]:
+            images = images.filter(dicom_metadata__isnull=True)
+        return images
+
+    def stored_digests(self, images, workers):
+        """
+        Returns a dict of pixelDigest -> images for the stored images without a
+        SOPInstanceUID, decoded across the processing pool.
+        """
+        from oncovision.utils.image_pipeline import imageDigest, parallelMap
+
+        images = list(images.filter(sop_instance_uid__isnull=True).exclude(full_image='').exclude(full_image=None))
+        digests = {}
+        image_digests = parallelMap(imageDigest, [image.full_image.path for image in images], workers)
+        for image, digest in zip(images, image_digests):
+            if digest is not None:
+                digests.setdefault(digest, []).append(image)
+        return digests
+
+    def entry(self, dataset, match_content):
+        """
+        Returns what the backfill needs of a DICOM file: its SOPInstanceUID, header
+        metadata and, when images are matched by content, the content_hash of its
+        stored pixels and the pixelDigest of each conversion to 8 bits.
+        """
+        from oncovision.utils.image_pipeline import pixelDigest
+        from oncovision.utils.windowing import windowDataset
+
+        entry = {
+            "sop_instance_uid": str(dataset.get('SOPInstanceUID') or '') or None,
+            "metadata": dicom_metadata(dataset),
+            "content_hash": None,
+            "digests": (),
+        }
+        if match_content:
+            try:
+                pixel_array = dataset.pixel_array
+                entry["content_hash"] = pixelDigest(pixel_array)
+                entry["digests"] = {
+                    pixelDigest(windowDataset(dataset, DICOM_WINDOW)), pixelDigest(original_conversion(pixel_array))
+                }
+            except Exception:
+                # The pixel data cannot be decoded, only the SOPInstanceUID can match
+                pass
+        return entry
+
+    def save(self, batch, images, stored_digests, overwrite):
+        """
+        Stores the metadata of the images matching a batch of entries (see entry), by
+        SOPInstanceUID first, then by content. Returns the number of images indexed.
+        """
+        matches = {}
+        by_uid = {entry["sop_instance_uid"]: entry for entry in batch if entry["sop_instance_uid"]}
+        for image in images.filter(sop_instance_uid__in=by_uid.keys()):
+            matches[image.id] = (image, by_uid[image.sop_instance_uid])
+        for entry in batch:
+            for digest in entry["digests"]:
+                for image in stored_digests.pop(digest, []):
+                    matches.setdefault(image.id, (image, entry))
+
+        updated = []
+        for image, entry in matches.values():
+            if image.sop_instance_uid is None or image.content_hash is None:
+                image.sop_instance_uid = image.sop_instance_uid or entry["sop_instance_uid"]
+                image.content_hash = image.content_hash or entry["content_hash"]
+                updated.append(image)
+        MedicalImaging.objects.bulk_update(updated, ['sop_instance_uid', 'content_hash'], batch_size=500)
+        if overwrite:
+            DicomMetadata.objects.filter(medical_imaging_id__in=matches.keys()).delete()
+        save_dicom_metadata([(image, entry["metadata"]) for image, entry in matches.values()])
+        return len(matches)
+
+    def handle(self, *args, **options):
+        images = self.images(options)
+        stored_digests = self.stored_digests(images, options["workers"])
+        match_content = bool(stored_digests)
+
+        read = indexed = 0
+        batch = []
+        for _, dataset in self.headers(options["paths"], pixels=match_content):
+            read += 1
+            batch.append(self.entry(dataset, match_content))
+            if len(batch) >= options["batch_size"]:
+                indexed += self.save(batch, images, stored_digests, options["overwrite"])
+                batch = []
+        if batch:
+            indexed += self.save(batch, images, stored_digests, options["overwrite"])
+
+        missing = MedicalImaging.objects.filter(dicom_metadata__isnull=True, sop_instance_uid__isnull=False).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {read} DICOM headers and indexed {indexed} images ({missing} DICOM images still without metadata)"
+        ))
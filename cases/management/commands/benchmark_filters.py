@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from oncovision.utils.filter_benchmark import BENCHMARK_ENGINES, runBenchmark
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks the adaptive bilateral filter engines on synthetic CT slices and checks
+    their outputs against the reference loop.
+    """
+
+    help = "Benchmark the image filter engines and check equivalence with the reference filter."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[128, 256, 512])
+        parser.add_argument("--window-sizes", nargs="+", type=int, default=[5, 9])
+        parser.add_argument("--engines", nargs="+", choices=list(BENCHMARK_ENGINES), default=None)
+        parser.add_argument("--repeats", type=int, default=3)
+        parser.add_argument(
+            "--reference-max-size", type=int, default=256,
+            help="Largest size compared with (and timed for) the reference loop."
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'engine':<16}{'size':>6}{'window':>8}{'seconds':>10}{'MP/s':>9}{'peak MB':>9}"
+            f"{'max diff':>10}{'mean diff':>11}  equivalent"
+        )
+        failures = []
+        for result in runBenchmark(
+            options["sizes"], options["window_sizes"], options["engines"],
+            options["repeats"], options["reference_max_size"]
+        ):
+            comparison = result["comparison"]
+            max_diff = f"{comparison['max_abs_diff']:>10}" if comparison else f"{'-':>10}"
+            mean_diff = f"{comparison['mean_abs_diff']:>11.4f}" if comparison else f"{'-':>11}"
+            equivalent = {True: "yes", False: "NO", None: "-"}[result["equivalent"]]
+            self.stdout.write(
+                f"{result['engine']:<16}{result['size']:>6}{result['window_size']:>8}"
+                f"{result['seconds']:>10.3f}{result['megapixels_per_second']:>9.2f}"
+                f"{result['peak_memory'] / 1024 / 1024:>9.1f}{max_diff}{mean_diff}  {equivalent}"
+            )
+            if result["equivalent"] is False:
+                failures.append(f"{result['engine']} ({result['size']}px, window {result['window_size']})")
+
+        if failures:
+            raise CommandError(f"Outputs outside tolerance: {', '.join(failures)}")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from cases.models.medical_imaging import MedicalImaging
+from cases.pyramids import build_pyramids
+from oncovision.settings import IMAGE_PYRAMID_TILES, IMAGE_PROCESSING_WORKERS
+
+
+class Command(BaseCommand):
+    """
+    Builds the missing pyramid levels of the stored medical images, for the images
+    uploaded before pyramids existed or after IMAGE_PYRAMID_LEVELS changed. Levels that
+    already exist are skipped.
+    """
+
+    help = "Build the missing pyramid levels (and Deep Zoom tiles) of the medical images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--case", type=int, help="Only the images of this clinical case.")
+        parser.add_argument("--tiles", action="store_true", default=IMAGE_PYRAMID_TILES,
+                            help="Also cut large images into Deep Zoom tiles.")
+        parser.add_argument("--batch-size", type=int, default=64, help="Images loaded and built at a time.")
+        parser.add_argument("--workers", type=int, default=IMAGE_PROCESSING_WORKERS,
+                            help="Processes decoding and downscaling the images.")
+
+    def handle(self, *args, **options):
+        images = MedicalImaging.objects.exclude(full_image="").exclude(full_image=None).order_by("id")
+        if options["case"] is not None:
+            images = images.filter(clinical_case_id=options["case"])
+
+        updated = 0
+        ids = list(images.values_list("id", flat=True))
+        for start in range(0, len(ids), options["batch_size"]):
+            batch = MedicalImaging.objects.filter(id__in=ids[start:start + options["batch_size"]]) \
+                .select_related("clinical_case")
+            updated += build_pyramids(list(batch), options["workers"], options["tiles"])
+        self.stdout.write(self.style.SUCCESS(f"Built the pyramids of {updated} of {len(ids)} images"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from cases.models.clinical_case import ClinicalCase
+from cases.volumes import build_volume
+from oncovision.settings import IMAGE_PROCESSING_WORKERS
+
+
+class Command(BaseCommand):
+    """
+    Builds or updates the volume store of the clinical cases: new slices are appended
+    to existing volumes, volumes whose images were removed or reordered are rebuilt.
+    """
+
+    help = "Pack the slices of the clinical cases into memory-mapped volume files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--case", type=int, help="Only this clinical case.")
+        parser.add_argument("--rebuild", action="store_true", help="Rewrite the volumes from scratch, retrying the slices that failed.")
+        parser.add_argument("--workers", type=int, default=IMAGE_PROCESSING_WORKERS,
+                            help="Processes decoding and resizing the slices.")
+
+    def handle(self, *args, **options):
+        cases = ClinicalCase.objects.filter(medical_imaging__isnull=False).distinct().order_by("id")
+        if options["case"] is not None:
+            cases = cases.filter(id=options["case"])
+
+        for clinical_case in cases:
+            volume = build_volume(clinical_case, options["workers"], rebuild=options["rebuild"])
+            self.stdout.write(
+                f"Case {clinical_case.id}: {volume.slice_count} slices, {len(volume.failed_image_ids)} failed"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Built the volumes of {len(cases)} clinical cases"))
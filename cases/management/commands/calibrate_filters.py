@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from oncovision.utils.filter_engines import FilterDispatcher
+
+
+class Command(BaseCommand):
+    """
+    Times the available filter engines and saves the calibration used by the dispatcher
+    to pick the fastest engine per image size and window size.
+    """
+
+    help = "Calibrate the image filter engines on this host."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[128, 256, 512, 1024])
+        parser.add_argument("--window-sizes", nargs="+", type=int, default=[5, 9])
+        parser.add_argument("--repeats", type=int, default=2)
+        # Filter jobs are batched, so engines are timed on stacks of this many slices
+        parser.add_argument("--batch-size", type=int, default=settings.PROCESSING_JOB_BATCH_SIZE)
+        parser.add_argument("--output", default=str(settings.IMAGE_FILTER_CALIBRATION_FILE))
+
+    def handle(self, *args, **options):
+        dispatcher = FilterDispatcher(
+            max_memory=settings.IMAGE_FILTER_MAX_MEMORY,
+            fast_statistics=settings.IMAGE_FILTER_FAST_STATISTICS,
+            workers=settings.IMAGE_FILTER_WORKERS,
+        )
+        records = dispatcher.calibrate(
+            options["sizes"], options["window_sizes"], options["repeats"], options["batch_size"]
+        )
+        for record in records:
+            timings = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in record["seconds"].items())
+            choice = dispatcher.choose((record["pixels"],), record["window_size"])
+            self.stdout.write(f"{record['pixels']} px, window {record['window_size']}: {timings} -> {choice}")
+
+        dispatcher.saveCalibration(options["output"])
+        self.stdout.write(self.style.SUCCESS(f"Calibration saved to {options['output']}"))
@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Libraries that should only be loaded by the endpoints that need them
+HEAVY_MODULES = ("numpy", "cv2", "cupy", "pydicom", "reportlab", "PIL")
+
+IMPORT_SCRIPT = """
+import importlib, json, sys
+import django
+django.setup()
+importlib.import_module(sys.argv[1])
+print(json.dumps([name for name in sys.argv[2:] if name in sys.modules]))
+"""
+
+
+class Command(BaseCommand):
+    """
+    Reports how long importing a module (the URLconf by default) takes in a fresh
+    interpreter, per imported module, and which heavy libraries it pulls in.
+    """
+
+    help = "Print per-module import cost of loading the URLconf in a fresh process."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--module", default=settings.ROOT_URLCONF)
+        parser.add_argument("--top", type=int, default=20, help="Number of slowest modules to list.")
+
+    def handle(self, *args, **options):
+        environment = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "oncovision.settings")}
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", IMPORT_SCRIPT, options["module"], *HEAVY_MODULES],
+            capture_output=True, text=True, env=environment, cwd=settings.BASE_DIR
+        )
+        if process.returncode != 0:
+            raise CommandError(process.stderr.strip().splitlines()[-1] if process.stderr else "Import failed.")
+
+        # Lines look like "import time:  self [us] | cumulative | imported package"
+        timings = []
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "imported package" in line:
+                continue
+            own, cumulative, name = line[len("import time:"):].split("|")
+            timings.append((name.strip(), int(own), int(cumulative)))
+
+        total = sum(own for _, own, _ in timings)
+        self.stdout.write(f"Total import time, including django.setup(): {total / 1000:.1f} ms across {len(timings)} modules")
+        self.stdout.write(f"{'cumulative ms':>14}{'self ms':>10}  module")
+        for name, own, cumulative in sorted(timings, key=lambda timing: timing[2], reverse=True)[:options["top"]]:
+            self.stdout.write(f"{cumulative / 1000:>14.1f}{own / 1000:>10.1f}  {name}")
+
+        loaded = json.loads(process.stdout.strip().splitlines()[-1])
+        if loaded:
+            self.stdout.write(self.style.WARNING(f"Heavy libraries loaded by {options['module']}: {', '.join(loaded)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"No heavy libraries loaded by {options['module']}."))
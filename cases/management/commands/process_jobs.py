@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+import multiprocessing
+import socket
+import os
+
+from cases.workers import run_worker
+
+
+class Command(BaseCommand):
+    """
+    Runs the workers that filter and analyze the medical images queued by
+    MedicalImagingViewSet. Several workers (in this or other processes) can share the
+    same database, jobs are claimed atomically.
+    """
+
+    help = "Process the queued medical imaging jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Number of worker processes.")
+        parser.add_argument("--batch-size", type=int, default=settings.PROCESSING_JOB_BATCH_SIZE)
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls when idle.")
+        parser.add_argument("--job-timeout", type=int, default=settings.PROCESSING_JOB_TIMEOUT)
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        hostname = socket.gethostname()
+        worker_args = (options["batch_size"], options["poll_interval"], options["burst"], options["job_timeout"])
+
+        if options["workers"] <= 1:
+            worker_name = f"{hostname}:{os.getpid()}"
+            self.stdout.write(f"Worker {worker_name} started")
+            processed = run_worker(worker_name, *worker_args)
+            self.stdout.write(self.style.SUCCESS(f"Worker {worker_name} processed {processed} jobs"))
+            return
+
+        # Database connections must not be shared with the child processes
+        connections.close_all()
+        processes = []
+        for index in range(options["workers"]):
+            worker_name = f"{hostname}:{os.getpid()}:{index}"
+            process = multiprocessing.Process(target=run_worker, args=(worker_name, *worker_args), name=worker_name)
+            process.start()
+            processes.append(process)
+            self.stdout.write(f"Worker {worker_name} started")
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from cases.inference_cache import purge
+
+
+class Command(BaseCommand):
+    """
+    Deletes cached workflow results that expired or belong to another workflow version
+    than INFERENCE_WORKFLOW_VERSION.
+    """
+
+    help = "Purge stale cached inference results."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Delete every cached result.")
+
+    def handle(self, *args, **options):
+        deleted = purge(everything=options["all"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} cached inference results"))
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0003_lungnodule_confidence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('kind', models.CharField(choices=[('filter', 'Filtrado'), ('inference', 'Análisis')], max_length=50, verbose_name='Tipo de tarea')),
+                ('state', models.CharField(choices=[('queued', 'En cola'), ('running', 'En ejecución'), ('done', 'Completada'), ('failed', 'Fallida')], default='queued', max_length=50, verbose_name='Estado de la tarea')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Error')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('worker', models.CharField(blank=True, max_length=100, null=True, verbose_name='Trabajador')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de inicio')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de finalización')),
+                ('medical_imaging', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='processing_jobs', to='cases.medicalimaging', verbose_name='Imagen médica')),
+            ],
+            options={
+                'verbose_name': 'Tarea de procesamiento',
+                'verbose_name_plural': 'Tareas de procesamiento',
+                'ordering': ['-created_at', '-updated_at'],
+                'indexes': [models.Index(fields=['state', 'created_at'], name='cases_proce_state_e1e347_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0004_processingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedImageCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Clave')),
+                ('parameters', models.CharField(db_index=True, max_length=200, verbose_name='Parámetros del filtro')),
+                ('image', models.FileField(upload_to='medical_imaging/processed_cache/', verbose_name='Imagen procesada')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='Tamaño (bytes)')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Usos')),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Último uso')),
+            ],
+            options={
+                'verbose_name': 'Imagen procesada en caché',
+                'verbose_name_plural': 'Imágenes procesadas en caché',
+                'ordering': ['-last_used_at'],
+            },
+        ),
+    ]
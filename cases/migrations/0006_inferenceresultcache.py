@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0005_processedimagecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InferenceResultCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('image_hash', models.CharField(max_length=64, verbose_name='Hash de la imagen procesada')),
+                ('workspace_name', models.CharField(max_length=100, verbose_name='Espacio de trabajo')),
+                ('workflow_id', models.CharField(max_length=100, verbose_name='Flujo de trabajo')),
+                ('workflow_version', models.CharField(max_length=50, verbose_name='Versión del flujo de trabajo')),
+                ('outputs', models.JSONField(verbose_name='Resultados')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Fecha de expiración')),
+            ],
+            options={
+                'verbose_name': 'Resultado de análisis en caché',
+                'verbose_name_plural': 'Resultados de análisis en caché',
+                'ordering': ['-created_at', '-updated_at'],
+                'constraints': [models.UniqueConstraint(fields=('image_hash', 'workspace_name', 'workflow_id', 'workflow_version'), name='unique_inference_result')],
+            },
+        ),
+    ]
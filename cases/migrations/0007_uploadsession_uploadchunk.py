@@ -0,0 +1,57 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:17
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0006_inferenceresultcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('key', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Clave')),
+                ('state', models.CharField(choices=[('open', 'Abierta'), ('finalizing', 'Finalizando'), ('finalized', 'Finalizada')], default='open', max_length=50, verbose_name='Estado de la subida')),
+                ('files', models.JSONField(default=list, verbose_name='Archivos')),
+                ('clinical_case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='cases.clinicalcase', verbose_name='Caso clínico')),
+            ],
+            options={
+                'verbose_name': 'Sesión de subida',
+                'verbose_name_plural': 'Sesiones de subida',
+                'ordering': ['-created_at', '-updated_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('file_index', models.PositiveIntegerField(verbose_name='Índice del archivo')),
+                ('offset', models.PositiveBigIntegerField(verbose_name='Posición')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Tamaño')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='cases.uploadsession', verbose_name='Sesión de subida')),
+            ],
+            options={
+                'verbose_name': 'Fragmento de subida',
+                'verbose_name_plural': 'Fragmentos de subida',
+                'ordering': ['file_index', 'offset'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['state', 'created_at'], name='cases_uploa_state_f2708c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadchunk',
+            index=models.Index(fields=['session', 'file_index', 'offset'], name='cases_uploa_session_65a82d_idx'),
+        ),
+    ]
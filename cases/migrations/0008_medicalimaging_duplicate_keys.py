@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0007_uploadsession_uploadchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalimaging',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True, verbose_name='Hash del contenido'),
+        ),
+        migrations.AddField(
+            model_name='medicalimaging',
+            name='sop_instance_uid',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True, verbose_name='SOP Instance UID'),
+        ),
+    ]
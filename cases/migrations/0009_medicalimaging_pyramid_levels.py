@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:24
+
+import cases.models.medical_imaging
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0008_medicalimaging_duplicate_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalimaging',
+            name='medium_image',
+            field=models.FileField(blank=True, null=True, upload_to=cases.models.medical_imaging.pyramid_upload_path, verbose_name='Imagen mediana'),
+        ),
+        migrations.AddField(
+            model_name='medicalimaging',
+            name='thumbnail_image',
+            field=models.FileField(blank=True, null=True, upload_to=cases.models.medical_imaging.pyramid_upload_path, verbose_name='Miniatura'),
+        ),
+        migrations.AddField(
+            model_name='medicalimaging',
+            name='tiles',
+            field=models.FileField(blank=True, null=True, upload_to=cases.models.medical_imaging.pyramid_upload_path, verbose_name='Teselas'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0009_medicalimaging_pyramid_levels'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseVolume',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('file_name', models.CharField(max_length=200, verbose_name='Archivo')),
+                ('width', models.PositiveIntegerField(verbose_name='Ancho')),
+                ('height', models.PositiveIntegerField(verbose_name='Altura')),
+                ('image_ids', models.JSONField(default=list, verbose_name='Imágenes')),
+                ('clinical_case', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='volume', to='cases.clinicalcase', verbose_name='Caso clínico')),
+            ],
+            options={
+                'verbose_name': 'Volumen del caso',
+                'verbose_name_plural': 'Volúmenes de casos',
+                'ordering': ['-created_at', '-updated_at'],
+            },
+        ),
+    ]
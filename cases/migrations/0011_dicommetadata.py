@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0010_casevolume'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DicomMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Fecha de actualización')),
+                ('modality', models.CharField(blank=True, db_index=True, max_length=16, null=True, verbose_name='Modalidad')),
+                ('study_instance_uid', models.CharField(blank=True, db_index=True, max_length=64, null=True, verbose_name='Study Instance UID')),
+                ('series_instance_uid', models.CharField(blank=True, max_length=64, null=True, verbose_name='Series Instance UID')),
+                ('study_date', models.DateField(blank=True, db_index=True, null=True, verbose_name='Fecha del estudio')),
+                ('series_description', models.CharField(blank=True, max_length=200, null=True, verbose_name='Descripción de la serie')),
+                ('manufacturer', models.CharField(blank=True, max_length=100, null=True, verbose_name='Fabricante')),
+                ('body_part_examined', models.CharField(blank=True, max_length=50, null=True, verbose_name='Parte del cuerpo')),
+                ('instance_number', models.IntegerField(blank=True, null=True, verbose_name='Número de instancia')),
+                ('slice_location', models.FloatField(blank=True, db_index=True, null=True, verbose_name='Posición del corte')),
+                ('slice_thickness', models.FloatField(blank=True, null=True, verbose_name='Grosor del corte')),
+                ('kvp', models.FloatField(blank=True, null=True, verbose_name='kVp')),
+                ('exposure', models.FloatField(blank=True, null=True, verbose_name='Exposición (mAs)')),
+                ('convolution_kernel', models.CharField(blank=True, max_length=64, null=True, verbose_name='Kernel de reconstrucción')),
+                ('rows', models.PositiveIntegerField(blank=True, null=True, verbose_name='Filas')),
+                ('columns', models.PositiveIntegerField(blank=True, null=True, verbose_name='Columnas')),
+                ('pixel_spacing_row', models.FloatField(blank=True, null=True, verbose_name='Espaciado de píxel (filas)')),
+                ('pixel_spacing_column', models.FloatField(blank=True, null=True, verbose_name='Espaciado de píxel (columnas)')),
+                ('attributes', models.JSONField(blank=True, default=dict, verbose_name='Otros atributos')),
+                ('medical_imaging', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dicom_metadata', to='cases.medicalimaging', verbose_name='Imagen médica')),
+            ],
+            options={
+                'verbose_name': 'Metadatos DICOM',
+                'verbose_name_plural': 'Metadatos DICOM',
+                'ordering': ['series_instance_uid', 'instance_number', 'slice_location'],
+                'indexes': [models.Index(fields=['series_instance_uid', 'instance_number'], name='cases_dicom_series__ac2e3d_idx'), models.Index(fields=['modality', 'study_date'], name='cases_dicom_modalit_f05f75_idx')],
+            },
+        ),
+    ]
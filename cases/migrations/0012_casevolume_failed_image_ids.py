@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0011_dicommetadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='casevolume',
+            name='failed_image_ids',
+            field=models.JSONField(default=list, verbose_name='Imágenes fallidas'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cases', '0012_casevolume_failed_image_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processingjob',
+            name='kind',
+            field=models.CharField(choices=[('filter', 'Filtrado'), ('inference', 'Análisis'), ('volume', 'Volumen')], max_length=50, verbose_name='Tipo de tarea'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from oncovision.utils.models import BaseModel
+from django.db import models
+
+
+class CaseVolume(BaseModel):
+    """
+    Model representing the volume store of a clinical case: its slices, normalized to
+    width x height grayscale, packed in one raw uint8 array file that is memory-mapped
+    to read any slice or range of slices (see cases.volumes).
+    """
+
+    clinical_case = models.OneToOneField(
+        "cases.ClinicalCase",
+        on_delete=models.CASCADE,
+        related_name="volume",
+        verbose_name="Caso clínico"
+    )
+    # File name inside VOLUME_STORE_DIR
+    file_name = models.CharField(max_length=200, verbose_name="Archivo")
+    width = models.PositiveIntegerField(verbose_name="Ancho")
+    height = models.PositiveIntegerField(verbose_name="Altura")
+    # Index of the volume: the MedicalImaging id of every slice, in slice order
+    image_ids = models.JSONField(default=list, verbose_name="Imágenes")
+    # Images of the case whose slice could not be decoded, left out of the volume
+    failed_image_ids = models.JSONField(default=list, verbose_name="Imágenes fallidas")
+
+    class Meta:
+        verbose_name = "Volumen del caso"
+        verbose_name_plural = "Volúmenes de casos"
+        ordering = ["-created_at", "-updated_at"]
+
+    def __str__(self):
+        return f"Volumen - Caso clínico {self.clinical_case_id} ({len(self.image_ids)} cortes)"
+
+    @property
+    def slice_count(self):
+        return len(self.image_ids)
+
+    @property
+    def slice_size(self):
+        return self.width * self.height
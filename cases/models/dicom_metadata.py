@@ -0,0 +1,47 @@
+from oncovision.utils.models import BaseModel
+from django.db import models
+
+
+class DicomMetadata(BaseModel):
+    """
+    Model representing the DICOM header of a MedicalImaging converted from a DICOM
+    file, with the attributes used to search images in indexed columns and the rest
+    of the header in attributes.
+    """
+
+    medical_imaging = models.OneToOneField(
+        "cases.MedicalImaging",
+        on_delete=models.CASCADE,
+        related_name="dicom_metadata",
+        verbose_name="Imagen médica"
+    )
+    modality = models.CharField(max_length=16, blank=True, null=True, db_index=True, verbose_name="Modalidad")
+    study_instance_uid = models.CharField(max_length=64, blank=True, null=True, db_index=True, verbose_name="Study Instance UID")
+    series_instance_uid = models.CharField(max_length=64, blank=True, null=True, verbose_name="Series Instance UID")
+    study_date = models.DateField(blank=True, null=True, db_index=True, verbose_name="Fecha del estudio")
+    series_description = models.CharField(max_length=200, blank=True, null=True, verbose_name="Descripción de la serie")
+    manufacturer = models.CharField(max_length=100, blank=True, null=True, verbose_name="Fabricante")
+    body_part_examined = models.CharField(max_length=50, blank=True, null=True, verbose_name="Parte del cuerpo")
+    instance_number = models.IntegerField(blank=True, null=True, verbose_name="Número de instancia")
+    slice_location = models.FloatField(blank=True, null=True, db_index=True, verbose_name="Posición del corte")
+    slice_thickness = models.FloatField(blank=True, null=True, verbose_name="Grosor del corte")
+    kvp = models.FloatField(blank=True, null=True, verbose_name="kVp")
+    exposure = models.FloatField(blank=True, null=True, verbose_name="Exposición (mAs)")
+    convolution_kernel = models.CharField(max_length=64, blank=True, null=True, verbose_name="Kernel de reconstrucción")
+    rows = models.PositiveIntegerField(blank=True, null=True, verbose_name="Filas")
+    columns = models.PositiveIntegerField(blank=True, null=True, verbose_name="Columnas")
+    pixel_spacing_row = models.FloatField(blank=True, null=True, verbose_name="Espaciado de píxel (filas)")
+    pixel_spacing_column = models.FloatField(blank=True, null=True, verbose_name="Espaciado de píxel (columnas)")
+    attributes = models.JSONField(default=dict, blank=True, verbose_name="Otros atributos")
+
+    class Meta:
+        verbose_name = "Metadatos DICOM"
+        verbose_name_plural = "Metadatos DICOM"
+        ordering = ["series_instance_uid", "instance_number", "slice_location"]
+        indexes = [
+            models.Index(fields=["series_instance_uid", "instance_number"]),
+            models.Index(fields=["modality", "study_date"]),
+        ]
+
+    def __str__(self):
+        return f"Metadatos DICOM - Imagen médica {self.medical_imaging_id}"
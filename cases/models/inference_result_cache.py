@@ -0,0 +1,30 @@
+from oncovision.utils.models import BaseModel
+from django.db import models
+
+
+class InferenceResultCache(BaseModel):
+    """
+    Model representing the cached outputs of a workflow run on a processed image,
+    addressed by the hash of the image content, the workspace and the workflow.
+    """
+
+    image_hash = models.CharField(max_length=64, verbose_name="Hash de la imagen procesada")
+    workspace_name = models.CharField(max_length=100, verbose_name="Espacio de trabajo")
+    workflow_id = models.CharField(max_length=100, verbose_name="Flujo de trabajo")
+    workflow_version = models.CharField(max_length=50, verbose_name="Versión del flujo de trabajo")
+    outputs = models.JSONField(verbose_name="Resultados")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Fecha de expiración")
+
+    class Meta:
+        verbose_name = "Resultado de análisis en caché"
+        verbose_name_plural = "Resultados de análisis en caché"
+        ordering = ["-created_at", "-updated_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["image_hash", "workspace_name", "workflow_id", "workflow_version"],
+                name="unique_inference_result"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.workspace_name}/{self.workflow_id} - {self.image_hash[:12]}"
@@ -19,6 +19,14 @@ def processed_image_upload_path(instance, filename):
     case_id = instance.clinical_case.id if instance.clinical_case else 'unassigned'
     return f"medical_imaging/processed_images/{case_id}/{filename}"
 
+def pyramid_upload_path(instance, filename):
+    """
+    Generate file path for the pyramid levels and tiles, organizing them by clinical case ID.
+    """
+    # Use the clinical case ID if available, otherwise use 'unassigned'
+    case_id = instance.clinical_case.id if instance.clinical_case else 'unassigned'
+    return f"medical_imaging/pyramids/{case_id}/{filename}"
+
 
 class MedicalImaging(BaseModel):
     """
@@ -43,6 +51,23 @@ class MedicalImaging(BaseModel):
         blank=True, null=True,
         verbose_name="Imagen procesada"
     )
+    # Downscaled levels for the viewer (see cases.pyramids), empty when the full image is smaller
+    thumbnail_image = models.FileField(
+        upload_to=pyramid_upload_path,
+        blank=True, null=True,
+        verbose_name="Miniatura"
+    )
+    medium_image = models.FileField(
+        upload_to=pyramid_upload_path,
+        blank=True, null=True,
+        verbose_name="Imagen mediana"
+    )
+    # Deep Zoom descriptor (.dzi) of large images, its tiles are stored next to it
+    tiles = models.FileField(
+        upload_to=pyramid_upload_path,
+        blank=True, null=True,
+        verbose_name="Teselas"
+    )
     clinical_case = models.ForeignKey(
         "cases.ClinicalCase",
         blank=True, null=True,
@@ -50,6 +75,13 @@ class MedicalImaging(BaseModel):
         related_name="medical_imaging",
         verbose_name="Caso clínico"
     )
+    # Identify the same slice uploaded again (see cases.ingestion.DuplicateIndex)
+    sop_instance_uid = models.CharField(
+        max_length=64, blank=True, null=True, db_index=True, verbose_name="SOP Instance UID"
+    )
+    content_hash = models.CharField(
+        max_length=64, blank=True, null=True, db_index=True, verbose_name="Hash del contenido"
+    )
 
     class Meta:
         verbose_name = "Imagen médica"
@@ -0,0 +1,24 @@
+from oncovision.utils.models import BaseModel
+from django.db import models
+
+
+class ProcessedImageCache(BaseModel):
+    """
+    Model representing a cached processed image, addressed by the hash of the source
+    pixels and the filter parameters it was produced with.
+    """
+
+    key = models.CharField(max_length=64, unique=True, verbose_name="Clave")
+    parameters = models.CharField(max_length=200, db_index=True, verbose_name="Parámetros del filtro")
+    image = models.FileField(upload_to="medical_imaging/processed_cache/", verbose_name="Imagen procesada")
+    size = models.PositiveIntegerField(default=0, verbose_name="Tamaño (bytes)")
+    hits = models.PositiveIntegerField(default=0, verbose_name="Usos")
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Último uso")
+
+    class Meta:
+        verbose_name = "Imagen procesada en caché"
+        verbose_name_plural = "Imágenes procesadas en caché"
+        ordering = ["-last_used_at"]
+
+    def __str__(self):
+        return f"Caché {self.key[:12]}"
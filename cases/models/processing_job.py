@@ -0,0 +1,39 @@
+from oncovision.utils.models import BaseModel
+from oncovision.utils.options import PROCESSING_JOB_KINDS, PROCESSING_JOB_STATES
+from django.db import models
+
+
+class ProcessingJob(BaseModel):
+    """
+    Model representing a queued processing task (filtering or analysis) for a
+    MedicalImaging, run by the process_jobs workers. Volume jobs update the volume
+    store of the image's clinical case.
+    """
+
+    medical_imaging = models.ForeignKey(
+        "cases.MedicalImaging",
+        on_delete=models.CASCADE,
+        related_name="processing_jobs",
+        verbose_name="Imagen médica"
+    )
+    kind = models.CharField(max_length=50, choices=PROCESSING_JOB_KINDS, verbose_name="Tipo de tarea")
+    state = models.CharField(
+        max_length=50,
+        choices=PROCESSING_JOB_STATES,
+        default=PROCESSING_JOB_STATES[0][0],
+        verbose_name="Estado de la tarea"
+    )
+    error = models.TextField(default="", blank=True, verbose_name="Error")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Intentos")
+    worker = models.CharField(max_length=100, blank=True, null=True, verbose_name="Trabajador")
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="Fecha de inicio")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Fecha de finalización")
+
+    class Meta:
+        verbose_name = "Tarea de procesamiento"
+        verbose_name_plural = "Tareas de procesamiento"
+        ordering = ["-created_at", "-updated_at"]
+        indexes = [models.Index(fields=["state", "created_at"])]
+
+    def __str__(self):
+        return f"Tarea {self.id} ({self.kind}) - Imagen médica {self.medical_imaging_id}"
@@ -0,0 +1,63 @@
+from oncovision.utils.models import BaseModel
+from oncovision.utils.options import UPLOAD_SESSION_STATES
+from django.db import models
+
+import uuid
+
+
+class UploadSession(BaseModel):
+    """
+    Model representing a resumable chunked upload of files to a clinical case. The
+    files are written to part files on disk chunk by chunk and ingested when the
+    session is finalized.
+    """
+
+    key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name="Clave")
+    clinical_case = models.ForeignKey(
+        "cases.ClinicalCase",
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+        verbose_name="Caso clínico"
+    )
+    state = models.CharField(
+        max_length=50,
+        choices=UPLOAD_SESSION_STATES,
+        default=UPLOAD_SESSION_STATES[0][0],
+        verbose_name="Estado de la subida"
+    )
+    # [{"name": ..., "size": ...}] of the files being uploaded, in upload order
+    files = models.JSONField(default=list, verbose_name="Archivos")
+
+    class Meta:
+        verbose_name = "Sesión de subida"
+        verbose_name_plural = "Sesiones de subida"
+        ordering = ["-created_at", "-updated_at"]
+        indexes = [models.Index(fields=["state", "created_at"])]
+
+    def __str__(self):
+        return f"Sesión de subida {self.key} - Caso clínico {self.clinical_case_id}"
+
+
+class UploadChunk(BaseModel):
+    """
+    Model representing a byte range of a file received by an upload session.
+    """
+
+    session = models.ForeignKey(
+        UploadSession,
+        on_delete=models.CASCADE,
+        related_name="chunks",
+        verbose_name="Sesión de subida"
+    )
+    file_index = models.PositiveIntegerField(verbose_name="Índice del archivo")
+    offset = models.PositiveBigIntegerField(verbose_name="Posición")
+    size = models.PositiveBigIntegerField(verbose_name="Tamaño")
+
+    class Meta:
+        verbose_name = "Fragmento de subida"
+        verbose_name_plural = "Fragmentos de subida"
+        ordering = ["file_index", "offset"]
+        indexes = [models.Index(fields=["session", "file_index", "offset"])]
+
+    def __str__(self):
+        return f"Fragmento {self.file_index}:{self.offset}+{self.size} - Sesión {self.session_id}"
@@ -0,0 +1,423 @@
+from django.core.files import File
+from django.db import OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+import threading
+import logging
+import time
+import io
+
+from cases.models.medical_imaging import MedicalImaging
+from cases.models.lung_nodule import LungNodule
+from cases.models.processing_job import ProcessingJob
+from cases.volumes import build_volume
+from oncovision.settings import PROCESSED_IMAGE_WIDTH, PROCESSED_IMAGE_HEIGHT, PROCESSING_JOB_BATCH_SIZE, \
+    PROCESSING_JOB_TIMEOUT, PROCESSING_JOB_MAX_ATTEMPTS, IMAGE_PROCESSING_WORKERS, PROCESSED_IMAGE_PNG_COMPRESSION, \
+    PROCESSED_IMAGE_REDUCED_DECODE
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_JOB_STATES = ('queued', 'running')
+
+# Adaptive bilateral filter parameters of the processed images
+FILTER_WINDOW_SIZE = 5
+FILTER_SIGMA_D = 1.0
+
+
+class ProcessingError(Exception):
+    """
+    Raised when a medical image cannot be filtered or analyzed. The message is
+    returned to the API client.
+    """
+
+
+def job_kind(image, new_state):
+    """
+    Returns the job kind needed to move an image to new_state, or None when the
+    transition does not require any processing.
+    """
+    if image.state == 'preview' and new_state == 'ready':
+        return 'filter'
+    if image.state in ('ready', 'error') and new_state == 'processing':
+        return 'inference'
+    return None
+
+
+# Pipelines of each thread, by number of workers
+_pipelines = threading.local()
+
+
+def get_pipeline(workers=IMAGE_PROCESSING_WORKERS):
+    """
+    Returns the preprocessing pipeline of the calling thread for the given number of
+    workers, so its working buffers are reused across batches. load() returns a view
+    of the pipeline's working stack, so a pipeline is never shared between threads:
+    requests running jobs concurrently cannot overwrite each other's slices.
+    """
+    from oncovision.utils.image_pipeline import PreprocessingPipeline
+    from oncovision.utils.filter_engines import getFilterDispatcher
+
+    pipelines = getattr(_pipelines, 'by_workers', None)
+    if pipelines is None:
+        pipelines = _pipelines.by_workers = {}
+    if workers not in pipelines:
+        pipelines[workers] = PreprocessingPipeline(
+            PROCESSED_IMAGE_WIDTH, PROCESSED_IMAGE_HEIGHT, FILTER_WINDOW_SIZE, FILTER_SIGMA_D,
+            png_compression=PROCESSED_IMAGE_PNG_COMPRESSION, reduced_decode=PROCESSED_IMAGE_REDUCED_DECODE,
+            workers=workers, dispatcher=getFilterDispatcher()
+        )
+    return pipelines[workers]
+
+
+def prepare_images(images, workers=IMAGE_PROCESSING_WORKERS):
+    """
+    Creates the filtered 512x512 processed image of every preview image and moves them
+    to the ready state. The slices go through the preprocessing pipeline as one batch,
+    decoded and encoded across a pool of worker processes, and the state changes are written in
+    one transaction. Returns a dict of image id -> error message for the images that failed.
+    """
+    from cases.image_cache import cache_parameters, cache_key, lookup, store
+
+    errors = {}
+    readable_images = []
+    for image in images:
+        if image.full_image:
+            readable_images.append(image)
+        else:
+            errors[image.id] = f"Image {image.id} does not have an image uploaded."
+
+    pipeline = get_pipeline(workers)
+    pipeline.resetTimings()
+    stack, digests = pipeline.load([image.full_image.path for image in readable_images])
+    pending_images = []
+    for image, digest in zip(readable_images, digests):
+        if digest is None:
+            errors[image.id] = f"Failed to read image {image.full_image.name.split('/')[-1]}."
+        else:
+            pending_images.append((image, digest, stack[len(pending_images)]))
+
+    if not pending_images:
+        return errors
+
+    # Reuse the processed images of slices already filtered with the same parameters and
+    # engine; the engine is chosen for the whole batch so the keys are known before filtering
+    engine = pipeline.dispatcher.choose(stack.shape, FILTER_WINDOW_SIZE)
+    parameters = cache_parameters(
+        FILTER_WINDOW_SIZE, FILTER_SIGMA_D, PROCESSED_IMAGE_WIDTH, PROCESSED_IMAGE_HEIGHT,
+        pipeline.dispatcher.fast_statistics, engine
+    )
+    keys = {image.id: cache_key(digest, parameters) for image, digest, _ in pending_images}
+    encoded_images = lookup(list(keys.values()))
+    uncached_rows = [index for index, (image, _, _) in enumerate(pending_images) if keys[image.id] not in encoded_images]
+
+    if uncached_rows:
+        # Filter the whole batch with the fastest engine for this host
+        uncached_stack = stack if len(uncached_rows) == len(pending_images) else stack[uncached_rows]
+        filtered_stack = pipeline.filter(uncached_stack, engine)
+        new_images = {
+            keys[pending_images[index][0].id]: encoded_img
+            for index, encoded_img in zip(uncached_rows, pipeline.encode(filtered_stack))
+            if encoded_img is not None
+        }
+        store(new_images, parameters)
+        encoded_images.update(new_images)
+    logger.info("Prepared %d images: %s", len(pending_images), pipeline.formatTimings())
+
+    with transaction.atomic():
+        for image, _, _ in pending_images:
+            image_name = image.full_image.name.split('/')[-1]
+            encoded_img = encoded_images.get(keys[image.id])
+            if encoded_img is None:
+                errors[image.id] = f"Failed to save image {image_name}."
+                continue
+
+            # Save the processed image into the processed_image field
+            image_file = File(io.BytesIO(encoded_img), name=f"processed_{image_name}")
+            image.processed_image.save(
+                f"processed_{image_name}",
+                image_file, save=False
+            )
+            image.state = 'ready'
+            image.save()
+    return errors
+
+
+def build_nodules(image, outputs):
+    """
+    Returns the unsaved LungNodule records for the predictions of a workflow run on an
+    image. Raises ProcessingError when the outputs have no predictions.
+    """
+    if not outputs or 'detection_predictions' not in outputs[0]:
+        raise ProcessingError(f"Failed to get predictions for image {image.full_image.name.split('/')[-1]}.")
+
+    nodules = []
+    for prediction in outputs[0]['detection_predictions']['predictions']:
+        # Positions and sizes are stored relative to the processed image
+        nodules.append(LungNodule(
+            malignancy_type=prediction['class'],
+            x_position=prediction['x'] / PROCESSED_IMAGE_WIDTH,
+            y_position=prediction['y'] / PROCESSED_IMAGE_HEIGHT,
+            width=prediction['width'] / PROCESSED_IMAGE_WIDTH,
+            height=prediction['height'] / PROCESSED_IMAGE_HEIGHT,
+            medical_imaging=image,
+            confidence=prediction['confidence']
+        ))
+    return nodules
+
+
+def save_analyses(nodules, failed_ids=()):
+    """
+    Replaces the nodules of the analyzed images with the new ones and updates the image
+    states in one transaction, with one bulk insert. nodules is a dict of image id ->
+    list of unsaved LungNodule; failed_ids are moved to the error state.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        LungNodule.objects.filter(medical_imaging_id__in=nodules).delete()
+        LungNodule.objects.bulk_create(
+            [nodule for image_nodules in nodules.values() for nodule in image_nodules], batch_size=500
+        )
+        MedicalImaging.objects.filter(id__in=nodules).update(state='analyzed', updated_at=now)
+        MedicalImaging.objects.filter(id__in=failed_ids).update(state='error', updated_at=now)
+
+
+def analyze_images(images, dispatcher=None):
+    """
+    Runs the nodule detection workflow on the processed images concurrently, reusing
+    cached results of identical images, and stores the detected nodules of the whole
+    batch at once. Returns a dict of image id -> error message for the images that
+    failed, which are left in the error state.
+    """
+    from cases.inference import get_inference_dispatcher
+    from cases.inference_cache import image_hash, lookup as lookup_results, store as store_results
+
+    dispatcher = dispatcher or get_inference_dispatcher()
+    errors = {}
+    pending_images = {}
+    for image in images:
+        if not image.processed_image:
+            errors[image.id] = f"Image {image.id} does not have a processed image."
+            continue
+        with image.processed_image.open('rb') as image_file:
+            pending_images[image.id] = (image, image_file.read())
+    MedicalImaging.objects.filter(id__in=pending_images).update(state='processing', updated_at=timezone.now())
+
+    # Reuse the results of processed images already analyzed by this workflow version
+    hashes = {image_id: image_hash(image_bytes) for image_id, (_, image_bytes) in pending_images.items()}
+    cached = lookup_results(list(hashes.values()), dispatcher.workspace_name, dispatcher.workflow_id)
+    results = {image_id: cached[digest] for image_id, digest in hashes.items() if digest in cached}
+    results.update(dispatcher.run_many({
+        image_id: image_bytes for image_id, (_, image_bytes) in pending_images.items() if image_id not in results
+    }))
+
+    nodules = {}
+    for image_id, (image, _) in pending_images.items():
+        try:
+            if isinstance(results[image_id], Exception):
+                raise ProcessingError(str(results[image_id]))
+            nodules[image_id] = build_nodules(image, results[image_id])
+        except ProcessingError as e:
+            errors[image_id] = str(e)
+        except Exception as e:
+            logger.exception("Analysis of image %s failed", image_id)
+            errors[image_id] = str(e)
+
+    save_analyses(nodules, list(errors))
+    store_results(
+        {hashes[image_id]: results[image_id] for image_id in nodules if hashes[image_id] not in cached},
+        dispatcher.workspace_name, dispatcher.workflow_id
+    )
+    return errors
+
+
+def enqueue_jobs(images, new_state):
+    """
+    Creates a queued job for every image whose transition to new_state needs
+    processing. Images that already have an active job of the same kind reuse it.
+    Returns the list of jobs.
+    """
+    jobs = []
+    for image in images:
+        kind = job_kind(image, new_state)
+        if kind is None:
+            continue
+        job = image.processing_jobs.filter(kind=kind, state__in=ACTIVE_JOB_STATES).first()
+        if job is None:
+            job = ProcessingJob.objects.create(medical_imaging=image, kind=kind)
+        if kind == 'inference' and image.state != 'processing':
+            # Show the analysis as in progress while the job waits for a worker
+            image.state = 'processing'
+            image.save()
+        jobs.append(job)
+    return jobs
+
+
+def enqueue_volume_job(medical_image):
+    """
+    Queues the update of the volume store of a medical image's clinical case, unless
+    one is already waiting for a worker: it will also pick up the new slices. Returns
+    the job.
+    """
+    job = ProcessingJob.objects.filter(
+        kind='volume', state='queued', medical_imaging__clinical_case_id=medical_image.clinical_case_id
+    ).first()
+    if job is None:
+        job = ProcessingJob.objects.create(medical_imaging=medical_image, kind='volume')
+    return job
+
+
+def touch_jobs(jobs):
+    """
+    Marks the running jobs as alive, so requeue_stale_jobs leaves them to their worker.
+    """
+    ProcessingJob.objects.filter(
+        id__in=[job.id for job in jobs if job.state == 'running'], state='running'
+    ).update(updated_at=timezone.now())
+
+
+def finish_job(job, error=None):
+    """
+    Records the outcome of a job, unless it was taken from the caller in the meantime:
+    the update only applies while the job keeps the state and worker it was run with,
+    so a worker whose job was requeued as stale cannot overwrite the new run. Returns
+    whether the outcome was recorded.
+    """
+    now = timezone.now()
+    finished = ProcessingJob.objects.filter(id=job.id, state=job.state, worker=job.worker).update(
+        state='failed' if error else 'done', error=error or "", finished_at=now, updated_at=now
+    )
+    if not finished:
+        logger.warning("Job %s was requeued or taken by another worker, its outcome is discarded", job.id)
+    job.refresh_from_db(fields=['state', 'error', 'worker', 'finished_at', 'updated_at'])
+    return bool(finished)
+
+
+def job_report(job):
+    """
+    Returns the per-image outcome of a finished job.
+    """
+    return {
+        "job_id": job.id,
+        "image_id": job.medical_imaging_id,
+        "kind": job.kind,
+        "state": job.state,
+        "error": job.error,
+    }
+
+
+def run_jobs(jobs, workers=IMAGE_PROCESSING_WORKERS):
+    """
+    Runs jobs in the calling process: filter jobs are prepared together as one batch
+    across workers processes, inference jobs are sent to the workflow concurrently and
+    volume jobs build the volume of each of their clinical cases once.
+    Failures are recorded on the job instead of raised. Returns a job_report per job.
+    """
+    filter_jobs = [job for job in jobs if job.kind == 'filter']
+    if filter_jobs:
+        touch_jobs(filter_jobs)
+        try:
+            errors = prepare_images([job.medical_imaging for job in filter_jobs], workers)
+        except Exception as e:
+            logger.exception("Filter batch failed")
+            errors = {job.medical_imaging_id: str(e) for job in filter_jobs}
+        with transaction.atomic():
+            for job in filter_jobs:
+                finish_job(job, errors.get(job.medical_imaging_id))
+
+    inference_jobs = [job for job in jobs if job.kind == 'inference']
+    if inference_jobs:
+        touch_jobs(inference_jobs)
+        try:
+            errors = analyze_images([job.medical_imaging for job in inference_jobs])
+        except Exception as e:
+            logger.exception("Analysis batch failed")
+            errors = {job.medical_imaging_id: str(e) for job in inference_jobs}
+            MedicalImaging.objects.filter(id__in=errors).update(state='error', updated_at=timezone.now())
+        with transaction.atomic():
+            for job in inference_jobs:
+                finish_job(job, errors.get(job.medical_imaging_id))
+
+    volume_jobs = [job for job in jobs if job.kind == 'volume']
+    clinical_cases = {job.medical_imaging.clinical_case_id: job.medical_imaging.clinical_case for job in volume_jobs}
+    errors = {}
+    for clinical_case in clinical_cases.values():
+        touch_jobs(volume_jobs)
+        try:
+            build_volume(clinical_case, workers)
+        except Exception as e:
+            logger.exception("Volume build of case %s failed", clinical_case.id)
+            errors[clinical_case.id] = str(e)
+    for job in volume_jobs:
+        finish_job(job, errors.get(job.medical_imaging.clinical_case_id))
+    return [job_report(job) for job in jobs]
+
+
+def claim_jobs(worker_name, batch_size=1):
+    """
+    Atomically claims up to batch_size queued jobs of the same kind for a worker.
+    The claim is a conditional UPDATE on state='queued', so concurrent workers never
+    run the same job, on SQLite as on any other database.
+    """
+    oldest = ProcessingJob.objects.filter(state='queued').order_by('created_at').first()
+    if oldest is None:
+        return []
+    candidate_ids = list(
+        ProcessingJob.objects.filter(state='queued', kind=oldest.kind)
+        .order_by('created_at').values_list('id', flat=True)[:batch_size]
+    )
+    now = timezone.now()
+    ProcessingJob.objects.filter(id__in=candidate_ids, state='queued').update(
+        state='running', worker=worker_name, started_at=now, updated_at=now, attempts=F('attempts') + 1
+    )
+    return list(
+        ProcessingJob.objects.filter(id__in=candidate_ids, state='running', worker=worker_name)
+        .select_related('medical_imaging__clinical_case')
+    )
+
+
+def requeue_stale_jobs(timeout=PROCESSING_JOB_TIMEOUT, max_attempts=PROCESSING_JOB_MAX_ATTEMPTS):
+    """
+    Returns running jobs whose worker has not touched them for timeout seconds (it
+    died) to the queue, or fails them once they reach max_attempts. Workers touch
+    their jobs between stages (see touch_jobs), so slow batches are not run twice. The images of failed jobs still
+    shown as being analyzed are moved to the error state, so they can be analyzed again.
+    """
+    now = timezone.now()
+    stale = ProcessingJob.objects.filter(state='running', updated_at__lt=now - timezone.timedelta(seconds=timeout))
+    with transaction.atomic():
+        failed_ids = list(stale.filter(attempts__gte=max_attempts).values_list('id', flat=True))
+        ProcessingJob.objects.filter(id__in=failed_ids).update(
+            state='failed', error="Job timed out.", finished_at=now, updated_at=now
+        )
+        MedicalImaging.objects.filter(processing_jobs__id__in=failed_ids, state='processing').update(
+            state='error', updated_at=now
+        )
+    stale.filter(attempts__lt=max_attempts).update(state='queued', worker=None, updated_at=now)
+
+
+def work(worker_name, batch_size=PROCESSING_JOB_BATCH_SIZE, poll_interval=1.0, burst=False,
+         timeout=PROCESSING_JOB_TIMEOUT):
+    """
+    Worker loop: claims and runs jobs until the queue is empty (burst) or forever,
+    polling every poll_interval seconds when idle. Returns the number of jobs run.
+    """
+    processed = 0
+    while True:
+        try:
+            requeue_stale_jobs(timeout)
+            jobs = claim_jobs(worker_name, batch_size)
+        except OperationalError:
+            # The database is locked by another worker, try again shortly
+            logger.warning("Worker %s could not claim jobs, database busy", worker_name)
+            jobs = []
+            time.sleep(poll_interval)
+            continue
+
+        if jobs:
+            run_jobs(jobs)
+            processed += len(jobs)
+            continue
+        if burst:
+            return processed
+        time.sleep(poll_interval)
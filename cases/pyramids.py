@@ -0,0 +1,134 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+import logging
+import os
+
+from cases.models.medical_imaging import MedicalImaging
+from oncovision.settings import IMAGE_PYRAMID_LEVELS, IMAGE_PYRAMID_TILES, IMAGE_PYRAMID_TILES_MIN_SIZE, \
+    IMAGE_PYRAMID_TILE_SIZE, IMAGE_PROCESSING_WORKERS, PROCESSED_IMAGE_PNG_COMPRESSION
+
+logger = logging.getLogger(__name__)
+
+# Pyramid level -> MedicalImaging field holding it
+LEVEL_FIELDS = {"thumbnail": "thumbnail_image", "medium": "medium_image"}
+TILE_OVERLAP = 1
+
+DZI_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="png" Overlap="{overlap}" TileSize="{tile_size}">\n'
+    '  <Size Width="{width}" Height="{height}"/>\n'
+    '</Image>\n'
+)
+
+
+def _build_levels(task):
+    """
+    Builds the missing pyramid levels and tiles of one image in a pool worker.
+    """
+    from oncovision.utils.image_pipeline import pyramidLevels, deepZoomTiles
+
+    path, max_sides, tiles = task
+    levels = pyramidLevels(path, max_sides, PROCESSED_IMAGE_PNG_COMPRESSION) if max_sides else {}
+    if levels is None:
+        return None, None, []
+    size, tile_images = deepZoomTiles(path, IMAGE_PYRAMID_TILE_SIZE, TILE_OVERLAP, PROCESSED_IMAGE_PNG_COMPRESSION) \
+        if tiles else (None, [])
+    return levels, size, tile_images
+
+
+def missing_levels(image, tiles=IMAGE_PYRAMID_TILES):
+    """
+    Returns the levels an image still needs, as a dict of level -> longest side, and
+    whether it needs Deep Zoom tiles. Only the image header is read to skip the levels
+    the full image is already small enough for.
+    """
+    from oncovision.utils.image_pipeline import imageSize
+
+    if not image.full_image:
+        return {}, False
+    max_sides = {
+        level: max_side for level, max_side in IMAGE_PYRAMID_LEVELS.items()
+        if level in LEVEL_FIELDS and not getattr(image, LEVEL_FIELDS[level])
+    }
+    needs_tiles = tiles and not image.tiles
+    if not max_sides and not needs_tiles:
+        return {}, False
+    size = imageSize(image.full_image.path)
+    if size is None:
+        return {}, False
+    max_sides = {level: max_side for level, max_side in max_sides.items() if max_side < max(size)}
+    return max_sides, needs_tiles and max(size) > IMAGE_PYRAMID_TILES_MIN_SIZE
+
+
+def _save_tiles(image, size, tile_images):
+    """
+    Stores the Deep Zoom tiles of an image as <name>_files/<level>/<column>_<row>.png
+    next to its <name>.dzi descriptor, and sets the tiles field.
+    """
+    base_name = f"{image.id}_{os.path.splitext(os.path.basename(image.full_image.name))[0]}"
+    descriptor = image.tiles.field.generate_filename(image, f"{base_name}.dzi")
+    tiles_dir = f"{os.path.splitext(descriptor)[0]}_files"
+    for level, column, row, png_bytes in tile_images:
+        name = f"{tiles_dir}/{level}/{column}_{row}.png"
+        # Tile names are fixed by the format, replace the leftovers of a previous run
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(png_bytes))
+    if default_storage.exists(descriptor):
+        default_storage.delete(descriptor)
+    image.tiles.name = default_storage.save(descriptor, ContentFile(DZI_TEMPLATE.format(
+        overlap=TILE_OVERLAP, tile_size=IMAGE_PYRAMID_TILE_SIZE, width=size[0], height=size[1]
+    ).encode()))
+
+
+def build_pyramids(images, workers=IMAGE_PROCESSING_WORKERS, tiles=IMAGE_PYRAMID_TILES):
+    """
+    Creates the pyramid levels (IMAGE_PYRAMID_LEVELS) and, for large images and when
+    tiles is set, the Deep Zoom tiles that the given saved images do not have yet.
+    Levels that already exist are skipped, so it can be run again to fill in new
+    levels. The images are decoded and downscaled across the processing pool and the
+    records updated with one bulk update. Returns the number of images updated.
+    """
+    from oncovision.utils.image_pipeline import parallelMap
+
+    tasks = []
+    pending_images = []
+    for image in images:
+        max_sides, needs_tiles = missing_levels(image, tiles)
+        if max_sides or needs_tiles:
+            tasks.append((image.full_image.path, max_sides, needs_tiles))
+            pending_images.append(image)
+    if not tasks:
+        return 0
+
+    updated_images = []
+    for image, (levels, size, tile_images) in zip(pending_images, parallelMap(_build_levels, tasks, workers)):
+        if levels is None:
+            logger.warning("Could not build the pyramid of image %s", image.id)
+            continue
+        base_name = os.path.splitext(os.path.basename(image.full_image.name))[0]
+        for level, png_bytes in levels.items():
+            if png_bytes is not None:
+                getattr(image, LEVEL_FIELDS[level]).save(f"{level}_{base_name}.png", ContentFile(png_bytes), save=False)
+        if tile_images:
+            _save_tiles(image, size, tile_images)
+        updated_images.append(image)
+    MedicalImaging.objects.bulk_update(updated_images, ["thumbnail_image", "medium_image", "tiles"])
+    return len(updated_images)
+
+
+def pyramid_urls(image):
+    """
+    Returns the URL of every pyramid level of an image; the levels the full image is
+    small enough for, or not built yet, point to the full image.
+    """
+    full = image.full_image.url if image.full_image else None
+    return {
+        "thumbnail": image.thumbnail_image.url if image.thumbnail_image else (
+            image.medium_image.url if image.medium_image else full
+        ),
+        "medium": image.medium_image.url if image.medium_image else full,
+        "full": full,
+        "tiles": image.tiles.url if image.tiles else None,
+    }
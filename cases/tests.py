@@ -1,3 +1,927 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.core.files.base import ContentFile
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import tempfile
+import io
+import os
+import base64
+import shutil
+import datetime
+import zipfile
+import json
+import time
+import asyncio
+import cv2
 
-# Create your tests here.
+from oncovision.utils.filter_benchmark import BENCHMARK_ENGINES, runBenchmark, syntheticSlice
+from oncovision.utils.image_filters import vectorizedAdaptiveBilateralFilter, parallelAdaptiveBilateralFilter
+from oncovision.utils.filter_engines import FilterDispatcher
+from oncovision.utils.image_pipeline import PreprocessingPipeline, pixelDigest
+from oncovision.utils.windowing import applyWindow, windowDataset
+from cases.models.clinical_case import ClinicalCase
+from cases.models.medical_imaging import MedicalImaging
+from cases.models.processed_image_cache import ProcessedImageCache
+from cases.models.processing_job import ProcessingJob
+from cases.processing import enqueue_jobs, enqueue_volume_job, claim_jobs, run_jobs, get_pipeline, requeue_stale_jobs
+from cases.image_cache import cache_parameters, store, evict
+from cases.inference import InferenceDispatcher, InferenceError
+from cases.models.lung_nodule import LungNodule
+from cases.processing import analyze_images
+from cases.inference_cache import purge
+from cases.models.inference_result_cache import InferenceResultCache
+from cases.views.processing_events import case_events
+from cases.dicom import read_dicom, dicom_to_png, convert_dicom_slices
+from cases.models.upload_session import UploadSession
+from cases.upload_sessions import session_dir
+from oncovision.settings import UPLOAD_SESSION_MAX_FILES, UPLOAD_SESSION_MAX_FILE_SIZE, UPLOAD_SESSION_MAX_SIZE
+from cases.ingestion import ingest_archive, DuplicateIndex
+from patients.models.patient import Patient
+from cases.pyramids import build_pyramids
+from cases.volumes import build_volume, open_volume, volume_path, is_stale, case_lock
+from cases.models.case_volume import CaseVolume
+from cases.models.dicom_metadata import DicomMetadata
+from cases.management.commands.backfill_dicom_metadata import original_conversion
+
+
+class FilterEngineEquivalenceTests(SimpleTestCase):
+    """
+    Gates every adaptive bilateral filter engine on equivalence with the reference loop.
+    """
+
+    def test_engines_match_reference(self):
+        engines = [name for name in BENCHMARK_ENGINES if name != 'reference']
+        for result in runBenchmark(sizes=[48, 67], window_sizes=[3, 5, 9], engines=engines):
+            with self.subTest(engine=result['engine'], size=result['size'], window_size=result['window_size']):
+                self.assertTrue(result['equivalent'], result['comparison'])
+                self.assertGreater(result['megapixels_per_second'], 0)
+
+    def test_tiled_and_parallel_are_bit_identical(self):
+        stack = np.stack([syntheticSlice(96, seed) for seed in range(3)])
+        for fast_statistics in (False, True):
+            expected = np.stack([
+                vectorizedAdaptiveBilateralFilter(image, 5, fast_statistics=fast_statistics) for image in stack
+            ])
+            tiled = np.stack([
+                vectorizedAdaptiveBilateralFilter(image, 5, max_memory=200_000, fast_statistics=fast_statistics)
+                for image in stack
+            ])
+            parallel = parallelAdaptiveBilateralFilter(
+                stack, 5, workers=2, fast_statistics=fast_statistics, min_parallel_pixels=0
+            )
+            np.testing.assert_array_equal(tiled, expected)
+            np.testing.assert_array_equal(parallel, expected)
+
+    def test_dispatcher_uses_pinned_or_calibrated_engine(self):
+        image = syntheticSlice(64)
+        self.assertEqual(FilterDispatcher(pinned_engine='reference').choose(image.shape, 5), 'reference')
+        with self.assertRaises(ValueError):
+            FilterDispatcher(pinned_engine='missing')
+
+        dispatcher = FilterDispatcher(workers=1)
+        records = dispatcher.calibrate(sizes=[32], window_sizes=[5], repeats=1)
+        self.assertNotIn('reference', records[0]['seconds'])
+        self.assertIn(dispatcher.choose(image.shape, 5), records[0]['seconds'])
+        np.testing.assert_array_equal(dispatcher.filter(image, 5), vectorizedAdaptiveBilateralFilter(image, 5))
+
+        # With a memory budget the engines that ignore it are neither timed nor chosen
+        budgeted = FilterDispatcher(max_memory=1024 * 1024, workers=1)
+        records = budgeted.calibrate(sizes=[32], window_sizes=[5], repeats=1, batch_size=3)
+        self.assertNotIn('vectorized', records[0]['seconds'])
+        self.assertEqual(records[0]['pixels'], 3 * 32 * 32)
+        budgeted.calibration = [{'pixels': 3 * 32 * 32, 'window_size': 5, 'seconds': {'vectorized': 0.1, 'tiled': 1.0}}]
+        self.assertEqual(budgeted.choose((3, 32, 32), 5), 'tiled')
+
+
+class PreprocessingPipelineTests(SimpleTestCase):
+    """
+    Checks the decode -> resize -> filter -> encode pipeline.
+    """
+
+    def test_pool_and_in_process_runs_match(self):
+        large = cv2.imencode('.png', cv2.resize(syntheticSlice(64), (256, 256)))[1].tobytes()
+        small = cv2.imencode('.png', syntheticSlice(64, seed=1))[1].tobytes()
+        sources = [large, b'not an image', small]
+
+        outputs = []
+        for workers in (1, 2):
+            pipeline = PreprocessingPipeline(64, 64, dispatcher=FilterDispatcher(workers=1), workers=workers)
+            stack, digests = pipeline.load(sources)
+            self.assertEqual(stack.shape, (2, 64, 64))
+            self.assertIsNone(digests[1])
+            outputs.append(pipeline.run(sources))
+            self.assertGreater(pipeline.timings['filter'], 0)
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIsNone(outputs[0][1])
+        np.testing.assert_array_equal(
+            cv2.imdecode(np.frombuffer(outputs[0][2], np.uint8), cv2.IMREAD_GRAYSCALE),
+            vectorizedAdaptiveBilateralFilter(syntheticSlice(64, seed=1), 5)
+        )
+
+
+class WindowingTests(SimpleTestCase):
+    """
+    Checks the conversion of stored DICOM pixels to windowed 8-bit intensities.
+    """
+
+    def test_lookup_table_matches_float_windowing(self):
+        rng = np.random.default_rng(0)
+        for dtype, low, high in ((np.int16, -2048, 3000), (np.uint16, 0, 4096)):
+            pixels = rng.integers(low, high, (64, 64)).astype(dtype)
+            expected = np.clip(np.rint((pixels * 1.0 - 1024 - (-600 - 0.5 - 749.5)) * 255 / 1499), 0, 255)
+            np.testing.assert_array_equal(applyWindow(pixels, 1.0, -1024.0, -600.0, 1500.0), expected)
+            np.testing.assert_array_equal(
+                applyWindow(pixels.astype(np.float32), 1.0, -1024.0, -600.0, 1500.0), expected
+            )
+
+    def test_slices_share_the_same_intensities(self):
+        from pydicom import dcmread
+
+        # The same tissue gets the same intensity whatever else is in the slice
+        air_and_tissue = np.array([[0, 1064], [1064, 1064]], dtype=np.uint16)
+        tissue_and_bone = np.array([[1064, 3000], [1064, 1064]], dtype=np.uint16)
+        images = [
+            windowDataset(dcmread(io.BytesIO(make_dicom(
+                pixels, RescaleSlope=1, RescaleIntercept=-1024, PhotometricInterpretation='MONOCHROME2'
+            ))), 'mediastinal')
+            for pixels in (air_and_tissue, tissue_and_bone)
+        ]
+        self.assertEqual(images[0][1, 1], images[1][0, 0])
+        self.assertEqual((images[0][0, 0], images[1][0, 1]), (0, 255))
+
+        # Without rescale attributes the slices fall back to their own range
+        minmax = [
+            windowDataset(dcmread(io.BytesIO(make_dicom(pixels))), 'lung') for pixels in (air_and_tissue, tissue_and_bone)
+        ]
+        self.assertNotEqual(minmax[0][1, 1], minmax[1][0, 0])
+        # A blank slice has nothing to stretch
+        self.assertEqual(applyWindow(np.full((4, 4), 7, np.uint16)).max(), 0)
+
+
+class MediaTestCase(TestCase):
+    """
+    Keeps the files a test writes (media, upload sessions, volumes) in a temporary directory
+    and gives it a clinical case and a client authenticated as a user.
+    """
+
+    settings_overrides = {}
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            UPLOAD_SESSIONS_DIR=os.path.join(self.media_root, 'upload_sessions'),
+            VOLUME_STORE_DIR=os.path.join(self.media_root, 'volumes'),
+            **self.settings_overrides
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.clinical_case = ClinicalCase.objects.create()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('doctor', password='secret'))
+
+
+class ProcessingJobQueueTests(MediaTestCase):
+    """
+    Checks that medical images are queued, claimed once and processed by the workers.
+    """
+
+    def setUp(self):
+        super().setUp()
+        _, buffer = cv2.imencode('.png', syntheticSlice(64))
+        self.image = MedicalImaging(clinical_case=self.clinical_case, state='preview')
+        self.image.full_image.save('slice.png', ContentFile(buffer.tobytes()), save=True)
+
+    def test_jobs_are_claimed_once_and_processed(self):
+        jobs = enqueue_jobs(MedicalImaging.objects.all(), 'ready')
+        self.assertEqual([job.kind for job in jobs], ['filter'])
+        self.assertEqual(enqueue_jobs(MedicalImaging.objects.all(), 'ready'), jobs)
+
+        claimed = claim_jobs('worker-1', batch_size=4)
+        self.assertEqual(claimed, jobs)
+        self.assertEqual(claim_jobs('worker-2', batch_size=4), [])
+
+        run_jobs(claimed)
+        claimed[0].refresh_from_db()
+        self.image.refresh_from_db()
+        self.assertEqual(claimed[0].state, 'done')
+        self.assertEqual(claimed[0].attempts, 1)
+        self.assertEqual(self.image.state, 'ready')
+        self.assertTrue(self.image.processed_image)
+
+    def test_batch_reports_each_image_without_aborting(self):
+        broken = MedicalImaging(clinical_case=self.clinical_case, state='preview')
+        broken.full_image.save('broken.png', ContentFile(b'not an image'), save=True)
+        copy = MedicalImaging(clinical_case=self.clinical_case, state='preview')
+        copy.full_image.save('copy.png', ContentFile(self.image.full_image.read()), save=True)
+
+        results = run_jobs(enqueue_jobs(MedicalImaging.objects.all(), 'ready'), workers=2)
+        states = {result['image_id']: result['state'] for result in results}
+        self.assertEqual(states, {self.image.id: 'done', broken.id: 'failed', copy.id: 'done'})
+        self.assertEqual(
+            set(MedicalImaging.objects.filter(state='ready').values_list('id', flat=True)), {self.image.id, copy.id}
+        )
+
+    def test_pipelines_are_not_shared_between_threads(self):
+        pipelines = []
+        thread = threading.Thread(target=lambda: pipelines.append(get_pipeline(2)))
+        thread.start()
+        thread.join()
+        self.assertIs(get_pipeline(2), get_pipeline(2))
+        self.assertIsNot(get_pipeline(2), pipelines[0])
+        self.assertEqual((get_pipeline(1).workers, get_pipeline(2).workers), (1, 2))
+
+    def test_reuploaded_slices_reuse_the_cached_image(self):
+        run_jobs(enqueue_jobs(MedicalImaging.objects.all(), 'ready'))
+        entry = ProcessedImageCache.objects.get()
+        self.assertEqual(entry.hits, 0)
+
+        copy = MedicalImaging(clinical_case=self.clinical_case, state='preview')
+        copy.full_image.save('copy.png', ContentFile(self.image.full_image.read()), save=True)
+        results = run_jobs(enqueue_jobs(MedicalImaging.objects.filter(id=copy.id), 'ready'))
+        self.assertEqual(results[0]['state'], 'done')
+        entry.refresh_from_db()
+        self.assertEqual(entry.hits, 1)
+        copy.refresh_from_db()
+        self.image.refresh_from_db()
+        self.assertEqual(copy.processed_image.read(), self.image.processed_image.read())
+
+    def test_cache_entries_are_keyed_by_inexact_engines(self):
+        parameters = {engine: cache_parameters(5, 1.0, 512, 512, False, engine) for engine in ('tiled', 'parallel', 'cuda')}
+        self.assertEqual(parameters['tiled'], parameters['parallel'])
+        self.assertNotEqual(parameters['tiled'], parameters['cuda'])
+
+    def test_cache_evicts_stale_and_least_recently_used_images(self):
+        store({'old': b'x' * 10}, 'abf-v0')
+        store({'a': b'x' * 10, 'b': b'x' * 10}, 'abf-v1', max_size=100)
+        self.assertEqual(set(ProcessedImageCache.objects.values_list('key', flat=True)), {'a', 'b'})
+        ProcessedImageCache.objects.filter(key='a').update(last_used_at='2000-01-01T00:00:00Z')
+        evict('abf-v1', max_size=15)
+        self.assertEqual(list(ProcessedImageCache.objects.values_list('key', flat=True)), ['b'])
+
+    def test_timed_out_analyses_move_their_images_to_error(self):
+        MedicalImaging.objects.filter(id=self.image.id).update(state='ready')
+        job = enqueue_jobs(MedicalImaging.objects.all(), 'processing')[0]
+        claim_jobs('worker-1')
+        ProcessingJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timezone.timedelta(hours=1))
+
+        requeue_stale_jobs(timeout=60, max_attempts=2)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.worker), ('queued', None))
+        claim_jobs('worker-2')
+        ProcessingJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timezone.timedelta(hours=1))
+
+        requeue_stale_jobs(timeout=60, max_attempts=2)
+        job.refresh_from_db()
+        self.image.refresh_from_db()
+        self.assertEqual((job.state, job.attempts), ('failed', 2))
+        self.assertEqual(self.image.state, 'error')
+
+    def test_requeued_jobs_are_finished_by_their_new_worker(self):
+        enqueue_jobs(MedicalImaging.objects.all(), 'ready')
+        claimed = claim_jobs('worker-1')
+        requeue_stale_jobs(timeout=60)
+        self.assertEqual(ProcessingJob.objects.get().state, 'running')
+
+        # worker-1 stalls, its job is run again by worker-2 which fails it
+        ProcessingJob.objects.update(updated_at=timezone.now() - timezone.timedelta(hours=1))
+        requeue_stale_jobs(timeout=60)
+        MedicalImaging.objects.update(full_image='missing.png')
+        reclaimed = claim_jobs('worker-2')
+        self.assertEqual([job.id for job in reclaimed], [job.id for job in claimed])
+        self.assertEqual(run_jobs(reclaimed)[0]['state'], 'failed')
+
+        # worker-1 finishing late does not overwrite the outcome of worker-2
+        self.assertEqual(run_jobs(claimed)[0]['state'], 'failed')
+        job = ProcessingJob.objects.get()
+        self.assertEqual((job.state, job.worker, job.attempts), ('failed', 'worker-2', 2))
+
+    def test_failed_images_can_be_analyzed_again(self):
+        MedicalImaging.objects.filter(id=self.image.id).update(state='error')
+        jobs = enqueue_jobs(MedicalImaging.objects.all(), 'processing')
+        self.assertEqual([job.kind for job in jobs], ['inference'])
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.state, 'processing')
+
+
+class StandInWorkflowHandler(BaseHTTPRequestHandler):
+    """
+    Mimics the detect-and-classify-2 workflow endpoint. The image bytes select the
+    behaviour: b'flaky' fails once with 503, b'slow' answers after the client timeout.
+    """
+
+    in_flight = 0
+    max_in_flight = 0
+    calls = []
+    lock = threading.Lock()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        image = base64.b64decode(payload['inputs']['image']['value'])
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            cls.calls.append((self.path, image))
+            attempts = sum(call[1] == image for call in cls.calls)
+        time.sleep(0.5 if image == b'slow' else 0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+
+        if image == b'flaky' and attempts == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps({"outputs": [{"detection_predictions": {"image": {"width": 512, "height": 512}, "predictions": [
+            {"x": 256.0, "y": 128.0, "width": 51.2, "height": 25.6, "confidence": 0.9, "class": "3",
+             "class_id": 3, "detection_id": "a"},
+        ]}}]}).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on a slow call
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class InferenceDispatcherTests(TestCase):
+    """
+    Runs the inference dispatcher against a local stand-in of the Roboflow workflow.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInWorkflowHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StandInWorkflowHandler.calls = []
+        StandInWorkflowHandler.max_in_flight = 0
+        self.dispatcher = InferenceDispatcher(self.api_url, 'key', max_in_flight=3, timeout=0.3, retries=1, backoff=0)
+        self.addCleanup(self.dispatcher.close)
+
+    def test_calls_run_concurrently_within_the_in_flight_limit(self):
+        results = self.dispatcher.run_many({index: f"image {index}".encode() for index in range(9)})
+        self.assertEqual(len(results), 9)
+        self.assertEqual(StandInWorkflowHandler.max_in_flight, 3)
+        self.assertEqual(StandInWorkflowHandler.calls[0][0], '/oncovision/workflows/detect-and-classify-2')
+        self.assertEqual(results[0][0]['detection_predictions']['predictions'][0]['class'], '3')
+        self.assertEqual(len(self.dispatcher.latencies), 9)
+
+    def test_failed_calls_are_retried_within_bounds(self):
+        results = self.dispatcher.run_many({'flaky': b'flaky', 'slow': b'slow'})
+        self.assertIsInstance(results['flaky'], list)
+        self.assertIsInstance(results['slow'], InferenceError)
+        records = {record['key']: record for record in self.dispatcher.latencies}
+        self.assertEqual((records['flaky']['attempts'], records['flaky']['success']), (2, True))
+        self.assertEqual((records['slow']['attempts'], records['slow']['success']), (2, False))
+
+    def test_request_errors_fail_the_image_not_the_batch(self):
+        dispatcher = InferenceDispatcher('http://', 'key', retries=2, backoff=0)
+        self.addCleanup(dispatcher.close)
+        results = dispatcher.run_many({'first': b'image', 'second': b'image'})
+        self.assertIsInstance(results['first'], InferenceError)
+        self.assertIsInstance(results['second'], InferenceError)
+        # An invalid URL is not retried
+        self.assertEqual([record['attempts'] for record in dispatcher.latencies], [1, 1])
+
+    def test_analyzed_images_store_their_nodules(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            image = MedicalImaging(state='ready')
+            image.full_image.save('slice.png', ContentFile(b'full'), save=False)
+            image.processed_image.save('processed_slice.png', ContentFile(b'processed'), save=True)
+            missing = MedicalImaging.objects.create(state='ready')
+
+            errors = analyze_images([image, missing], self.dispatcher)
+            # Analyzing again replaces the nodules instead of duplicating them
+            analyze_images([image], self.dispatcher)
+        self.assertEqual(list(errors), [missing.id])
+        image.refresh_from_db()
+        self.assertEqual(image.state, 'analyzed')
+        nodule = LungNodule.objects.get(medical_imaging=image)
+        self.assertEqual((nodule.x_position, nodule.width, nodule.confidence), (0.5, 0.1, 0.9))
+        self.assertEqual(MedicalImaging.objects.get(id=missing.id).state, 'error')
+
+    def test_repeated_analyses_reuse_cached_results(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            images = []
+            for name in ('first', 'second'):
+                image = MedicalImaging(state='ready')
+                image.full_image.save(f'{name}.png', ContentFile(b'full'), save=False)
+                image.processed_image.save(f'processed_{name}.png', ContentFile(b'same slice'), save=True)
+                images.append(image)
+
+            self.assertEqual(analyze_images(images[:1], self.dispatcher), {})
+            self.assertEqual(analyze_images(images[1:], self.dispatcher), {})
+        self.assertEqual(len(StandInWorkflowHandler.calls), 1)
+        self.assertEqual(LungNodule.objects.filter(medical_imaging=images[1]).count(), 1)
+
+        InferenceResultCache.objects.update(workflow_version='0')
+        self.assertEqual(purge(), 1)
+        self.assertFalse(InferenceResultCache.objects.exists())
+
+
+class ClinicalCaseEventsTests(TestCase):
+    """
+    Checks the server-sent event stream of a case's processing progress.
+    """
+
+    def setUp(self):
+        self.clinical_case = ClinicalCase.objects.create()
+        self.image = MedicalImaging.objects.create(clinical_case=self.clinical_case, state='processing')
+
+    async def test_stream_pushes_state_and_nodule_changes(self):
+        events = case_events(self.clinical_case.id, poll_interval=0.01, heartbeat=60, max_duration=60)
+        self.assertTrue((await anext(events)).startswith('retry:'))
+        self.assertIn('"state": "processing", "nodule_count": 0', await anext(events))
+
+        await LungNodule.objects.acreate(
+            malignancy_type='1', x_position=0.5, y_position=0.5, width=0.1, height=0.1,
+            medical_imaging=self.image, confidence=0.9
+        )
+        await MedicalImaging.objects.filter(id=self.image.id).aupdate(state='analyzed')
+        self.assertIn('"state": "analyzed", "nodule_count": 1', await anext(events))
+
+        await MedicalImaging.objects.filter(id=self.image.id).adelete()
+        self.assertEqual(await anext(events), f'event: image_deleted\ndata: {{"id": {self.image.id}}}\n\n')
+        await events.aclose()
+
+    def test_stream_requires_a_valid_token(self):
+        url = f"/cases/clinical_case_events/{self.clinical_case.id}"
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        token = AccessToken.for_user(User.objects.create_user('doctor', password='secret'))
+        self.assertEqual(self.client.get(f"/cases/clinical_case_events/0?token={token}").status_code, 404)
+        response = self.client.get(f"{url}?token={token}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        # Under WSGI the events are sent one by one, not once the stream ends
+        events = iter(response.streaming_content)
+        self.assertTrue(next(events).startswith(b'retry:'))
+        self.assertIn(b'"state": "processing"', next(events))
+        response.close()
+
+    async def test_asgi_stream_sends_events_before_it_ends(self):
+        user = await sync_to_async(User.objects.create_user)('doctor', password='secret')
+        response = await self.async_client.get(
+            f"/cases/clinical_case_events/{self.clinical_case.id}?token={AccessToken.for_user(user)}"
+        )
+        events = aiter(response.streaming_content)
+        self.assertTrue((await asyncio.wait_for(anext(events), 5)).startswith(b'retry:'))
+        self.assertIn(b'"state": "processing"', await asyncio.wait_for(anext(events), 5))
+        await events.aclose()
+
+
+def make_dicom(pixels, **elements):
+    """
+    Returns the bytes of a minimal CT DICOM file holding a uint16 or int16 pixel array.
+    """
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    dataset = Dataset()
+    dataset.file_meta = meta
+    dataset.SOPClassUID = meta.MediaStorageSOPClassUID
+    dataset.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    dataset.Modality = 'CT'
+    dataset.Rows, dataset.Columns = pixels.shape
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = 'MONOCHROME2'
+    dataset.BitsAllocated = dataset.BitsStored = 16
+    dataset.HighBit = 15
+    dataset.PixelRepresentation = 1 if pixels.dtype == np.int16 else 0
+    dataset.PixelData = pixels.tobytes()
+    for keyword, value in elements.items():
+        setattr(dataset, keyword, value)
+
+    buffer = io.BytesIO()
+    dataset.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+class DicomUploadTests(MediaTestCase):
+    """
+    Checks that DICOM uploads are converted without leaving temporary files behind.
+    """
+
+    # Small enough that the larger test uploads go to temporary files
+    settings_overrides = {'FILE_UPLOAD_MAX_MEMORY_SIZE': 64 * 1024}
+
+    def upload(self, files):
+        return self.client.post('/cases/upload_images', {'case_id': self.clinical_case.id, 'files': files})
+
+    def test_small_and_large_uploads_leave_no_temporary_files(self):
+        pixels = (np.arange(256 * 256, dtype=np.uint16).reshape(256, 256) % 4096)
+        small = ContentFile(make_dicom(pixels[:64, :64]), name='small.dcm')
+        large = ContentFile(make_dicom(pixels), name='large.dcm')
+        temporary_files = set(os.listdir(tempfile.gettempdir()))
+
+        self.assertEqual(self.upload([small, large]).status_code, 201)
+        self.assertEqual(set(os.listdir(tempfile.gettempdir())) - temporary_files, set())
+        self.assertEqual(MedicalImaging.objects.filter(state='preview').count(), 2)
+        png = cv2.imread(MedicalImaging.objects.get(full_image__endswith='large.png').full_image.path, cv2.IMREAD_UNCHANGED)
+        np.testing.assert_array_equal(png, cv2.imdecode(np.frombuffer(dicom_to_png(make_dicom(pixels)), np.uint8), -1))
+
+    def test_invalid_dicom_is_rejected_without_leaking_files(self):
+        temporary_files = set(os.listdir(tempfile.gettempdir()))
+        response = self.upload([ContentFile(b'not a dicom' * 10000, name='broken.dcm')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['file'], 'broken.dcm')
+        self.assertEqual(set(os.listdir(tempfile.gettempdir())) - temporary_files, set())
+        self.assertEqual(read_dicom(make_dicom(np.zeros((4, 4), np.uint16)), stop_before_pixels=True).Rows, 4)
+
+    def test_bad_files_are_reported_without_aborting_the_upload(self):
+        pixels = np.arange(32 * 32, dtype=np.uint16).reshape(32, 32)
+        files = [
+            ContentFile(make_dicom(pixels), name='first.dcm'),
+            ContentFile(b'not a dicom', name='broken.dcm'),
+            ContentFile(cv2.imencode('.png', syntheticSlice(32))[1].tobytes(), name='middle.png'),
+            ContentFile(b'text', name='notes.txt'),
+            ContentFile(make_dicom(pixels * 2), name='second.dcm'),
+        ]
+        response = self.upload(files)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([error['file'] for error in response.data['errors']], ['notes.txt', 'broken.dcm'])
+        # The ids follow the order of the uploaded files, not their type
+        images = MedicalImaging.objects.in_bulk(response.data['image_ids'])
+        names = [os.path.basename(images[image_id].full_image.name) for image_id in response.data['image_ids']]
+        self.assertEqual(names, ['first.png', 'middle.png', 'second.png'])
+        self.assertEqual(MedicalImaging.objects.filter(clinical_case=self.clinical_case).count(), 3)
+
+        sources = [ContentFile(make_dicom(pixels)), ContentFile(b'broken'), ContentFile(make_dicom(pixels * 2))]
+        converted = convert_dicom_slices(sources, workers=2)
+        self.assertEqual([result[1] is None for result in converted], [True, False, True])
+        self.assertEqual(converted[0][0], dicom_to_png(make_dicom(pixels)))
+
+    def test_duplicates_are_skipped_in_the_case_and_linked_across_the_patient(self):
+        pixels = np.arange(64 * 64, dtype=np.uint16).reshape(64, 64)
+        dicom = make_dicom(pixels)
+        first = self.upload([ContentFile(dicom, name='slice.dcm')])
+        self.assertEqual(first.status_code, 201)
+        image = MedicalImaging.objects.get(id=first.data['image_ids'][0])
+
+        # The same slice again, re-identified with a new SOPInstanceUID, and a PNG sent twice
+        png = cv2.imencode('.png', np.eye(16, dtype=np.uint8) * 255)[1].tobytes()
+        again = self.upload([
+            ContentFile(dicom, name='copy.dcm'), ContentFile(make_dicom(pixels), name='anonymized.dcm'),
+            ContentFile(png, name='photo.png'), ContentFile(png, name='photo copy.png'),
+        ])
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(len(again.data['image_ids']), 1)
+        photo = MedicalImaging.objects.get(id=again.data['image_ids'][0])
+        self.assertEqual(
+            sorted((duplicate['file'], duplicate['action'], duplicate['duplicate_of']) for duplicate in again.data['duplicates']),
+            [('anonymized.dcm', 'skipped', image.id), ('copy.dcm', 'skipped', image.id), ('photo copy.png', 'skipped', photo.id)]
+        )
+        self.assertEqual(self.upload([ContentFile(png, name='photo.png')]).status_code, 200)
+
+        # Another case of the same patient reuses the analyzed image
+        patient = Patient.objects.create(id_number='123')
+        ClinicalCase.objects.filter(id=self.clinical_case.id).update(patient=patient)
+        MedicalImaging.objects.filter(id=image.id).update(state='analyzed', processed_image=image.full_image.name)
+        LungNodule.objects.create(medical_imaging=image, malignancy_type='2', x_position=1, y_position=2, width=3, height=4)
+        other_case = ClinicalCase.objects.create(patient=patient)
+        response = self.client.post('/cases/upload_images', {
+            'case_id': other_case.id, 'files': [ContentFile(dicom, name='slice.dcm')], 'duplicate_scope': 'patient'
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['duplicates'][0]['action'], 'linked')
+        linked = MedicalImaging.objects.get(id=response.data['image_ids'][0])
+        self.assertEqual((linked.clinical_case_id, linked.state, linked.full_image.name), (other_case.id, 'analyzed', image.full_image.name))
+        self.assertEqual(LungNodule.objects.filter(medical_imaging=linked).count(), 1)
+
+    def test_zip_series_is_ingested_in_slice_order(self):
+        slices = [np.arange(32 * 32, dtype=np.uint16).reshape(32, 32) % (50 * (index + 1)) for index in range(5)]
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            # DICOMDIR-style names that do not sort like the slices, positions without instance numbers
+            for index in (3, 0, 4, 2):
+                archive.writestr(f'DICOM/S1/IM{7 - index}', make_dicom(
+                    slices[index], SeriesInstanceUID='1.2.3', ImagePositionPatient=[0, 0, -10.0 * index],
+                    ImageOrientationPatient=[1, 0, 0, 0, -1, 0]
+                ))
+            archive.writestr('DICOM/S1/IM9', make_dicom(slices[1], SeriesInstanceUID='1.2.3', ImagePositionPatient=[0, 0, -10.0],
+                                                        ImageOrientationPatient=[1, 0, 0, 0, -1, 0]))
+            archive.writestr('DICOMDIR', b'index')
+            archive.writestr('README.txt', b'notes')
+
+        response = self.client.post('/cases/upload_images', {
+            'case_id': self.clinical_case.id, 'files': [ContentFile(buffer.getvalue(), name='series.zip')]
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['errors'], [{'file': 'series.zip/README.txt', 'error': 'Not a DICOM file.'}])
+        images = MedicalImaging.objects.filter(id__in=response.data['image_ids']).order_by('id')
+        self.assertEqual([image.id for image in images], response.data['image_ids'])
+        self.assertEqual(
+            [image.full_image.read() for image in images],
+            [dicom_to_png(make_dicom(pixels)) for pixels in slices]
+        )
+
+        # Smaller batches than the series give the same records
+        batched, _ = ingest_archive(
+            self.clinical_case, ContentFile(buffer.getvalue(), name='series.zip'), batch_size=2,
+            duplicates=DuplicateIndex(self.clinical_case, 'off')
+        )
+        self.assertEqual(
+            [image.full_image.read() for image in batched],
+            [dicom_to_png(make_dicom(pixels)) for pixels in slices]
+        )
+
+
+class UploadSessionTests(MediaTestCase):
+    """
+    Checks that chunked uploads can arrive out of order, report their received ranges
+    and are ingested on finalize.
+    """
+
+    def test_out_of_order_chunks_are_ingested_on_finalize(self):
+        dicom = make_dicom(np.arange(128 * 128, dtype=np.uint16).reshape(128, 128))
+        png = cv2.imencode('.png', np.full((16, 16), 200, np.uint8))[1].tobytes()
+        response = self.client.post('/cases/upload_sessions', {
+            'case_id': self.clinical_case.id,
+            'files': [{'name': 'slice.dcm', 'size': len(dicom)}, {'name': 'photo.png', 'size': len(png)}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        key = response.data['key']
+        self.assertTrue(session_dir(UploadSession.objects.get(key=key)).startswith(self.media_root))
+
+        def put(index, data, offset=None, content_range=None):
+            url = f'/cases/upload_sessions/{key}/{index}' + (f'?offset={offset}' if offset is not None else '')
+            headers = {'HTTP_CONTENT_RANGE': content_range} if content_range else {}
+            return self.client.put(url, data, content_type='application/octet-stream', **headers)
+
+        chunk = len(dicom) // 3
+        self.assertEqual(put(0, dicom[2 * chunk:], offset=2 * chunk).status_code, 200)
+        self.assertEqual(put(0, dicom[:chunk], content_range=f'bytes 0-{chunk - 1}/{len(dicom)}').status_code, 200)
+        self.assertEqual(put(1, png, offset=0).status_code, 200)
+        self.assertEqual(put(1, png, offset=1).status_code, 400)
+
+        report = self.client.get(f'/cases/upload_sessions/{key}').data
+        self.assertEqual(report['files'][0]['ranges'], [[0, chunk], [2 * chunk, len(dicom)]])
+        self.assertEqual(report['files'][1]['ranges'], [[0, len(png)]])
+        self.assertEqual(self.client.post(f'/cases/upload_sessions/{key}/finalize').status_code, 409)
+
+        self.assertEqual(put(0, dicom[chunk:2 * chunk], offset=chunk).status_code, 200)
+        response = self.client.post(f'/cases/upload_sessions/{key}/finalize')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['image_ids']), 2)
+        self.assertFalse(os.path.exists(session_dir(UploadSession.objects.get(key=key))))
+        converted = MedicalImaging.objects.get(full_image__endswith='slice.png')
+        self.assertEqual(converted.full_image.read(), dicom_to_png(dicom))
+        self.assertEqual(self.client.get(f'/cases/upload_sessions/{key}').status_code, 404)
+
+    def test_sessions_over_the_limits_are_rejected_before_preallocation(self):
+        def create(files):
+            return self.client.post(
+                '/cases/upload_sessions', {'case_id': self.clinical_case.id, 'files': files}, format='json'
+            ).status_code
+
+        self.assertEqual(create([{'name': f'{index}.dcm', 'size': 1} for index in range(UPLOAD_SESSION_MAX_FILES + 1)]), 400)
+        self.assertEqual(create([{'name': 'huge.zip', 'size': UPLOAD_SESSION_MAX_FILE_SIZE + 1}]), 413)
+        files = [{'name': f'{index}.zip', 'size': UPLOAD_SESSION_MAX_FILE_SIZE} for index in range(
+            UPLOAD_SESSION_MAX_SIZE // UPLOAD_SESSION_MAX_FILE_SIZE + 1
+        )]
+        self.assertEqual(create(files), 413)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'upload_sessions')))
+
+
+class ImagePyramidTests(MediaTestCase):
+    """
+    Checks that uploads get their pyramid levels and that missing levels are built incrementally.
+    """
+
+    def test_levels_are_built_on_upload_and_exposed(self):
+        large = cv2.imencode('.png', np.tile(np.arange(1024, dtype=np.uint16) % 256, (600, 1)).astype(np.uint8))[1].tobytes()
+        small = cv2.imencode('.png', np.zeros((100, 100), np.uint8))[1].tobytes()
+        response = self.client.post('/cases/upload_images', {
+            'case_id': self.clinical_case.id,
+            'files': [ContentFile(large, name='large.png'), ContentFile(small, name='small.png')],
+        })
+        self.assertEqual(response.status_code, 201)
+        large_image, small_image = MedicalImaging.objects.filter(id__in=response.data['image_ids']).order_by('id')
+        self.assertEqual(cv2.imread(large_image.thumbnail_image.path, cv2.IMREAD_UNCHANGED).shape, (75, 128))
+        self.assertEqual(cv2.imread(large_image.medium_image.path, cv2.IMREAD_UNCHANGED).shape, (300, 512))
+        self.assertFalse(small_image.thumbnail_image or small_image.medium_image)
+
+        detail = self.client.get(f'/cases/clinical_case_detail/{self.clinical_case.id}').data
+        levels = {image['id']: image['levels'] for image in detail['medical_images']}
+        self.assertEqual(levels[large_image.id]['thumbnail'], large_image.thumbnail_image.url)
+        self.assertEqual(levels[small_image.id]['medium'], small_image.full_image.url)
+        self.assertIsNone(levels[small_image.id]['tiles'])
+
+    def test_missing_levels_and_tiles_are_built_incrementally(self):
+        image = MedicalImaging(clinical_case=self.clinical_case)
+        image.full_image.save('wide.png', ContentFile(cv2.imencode('.png', np.zeros((64, 2100), np.uint8))[1].tobytes()))
+        self.assertEqual(build_pyramids([image], workers=1, tiles=True), 1)
+        image.refresh_from_db()
+        self.assertTrue(image.thumbnail_image and image.medium_image and image.tiles.name.endswith('.dzi'))
+        self.assertIn('Width="2100" Height="64"', image.tiles.read().decode())
+        tiles_dir = os.path.splitext(image.tiles.path)[0] + '_files'
+        # 2100 px wide: 12 is the full resolution level, 9 tiles of 256 px
+        self.assertEqual(len(os.listdir(os.path.join(tiles_dir, '12'))), 9)
+        self.assertEqual(os.listdir(os.path.join(tiles_dir, '0')), ['0_0.png'])
+
+        # Only the missing level is built again
+        thumbnail = image.thumbnail_image.name
+        MedicalImaging.objects.filter(id=image.id).update(medium_image=None)
+        image.refresh_from_db()
+        self.assertEqual(build_pyramids([image], workers=1, tiles=True), 1)
+        image.refresh_from_db()
+        self.assertEqual(image.thumbnail_image.name, thumbnail)
+        self.assertTrue(image.medium_image)
+        self.assertEqual(build_pyramids([image], workers=1, tiles=True), 0)
+
+
+class VolumeStoreTests(MediaTestCase):
+    """
+    Checks that the volume store appends new slices and serves slice ranges with HTTP Range support.
+    """
+
+    def add_image(self, seed):
+        pixels = (np.add.outer(np.arange(600), np.arange(700) * seed) % 256).astype(np.uint8)
+        image = MedicalImaging(clinical_case=self.clinical_case)
+        image.full_image.save(f'slice_{seed}.png', ContentFile(cv2.imencode('.png', pixels)[1].tobytes()))
+        return image
+
+    def fetch(self, query, **headers):
+        response = self.client.get(f'/cases/clinical_case_volume/{self.clinical_case.id}{query}', **headers)
+        return response, b''.join(response.streaming_content) if response.streaming else None
+
+    def test_slices_are_appended_and_served_by_range(self):
+        first, second = self.add_image(1), self.add_image(2)
+        volume = build_volume(self.clinical_case, workers=1)
+        self.assertTrue(volume_path(volume).startswith(self.media_root))
+        pipeline = PreprocessingPipeline(512, 512)
+        np.testing.assert_array_equal(open_volume(volume)[1], pipeline.load([second.full_image.path])[0][0])
+
+        # A new slice is appended without rewriting the earlier ones
+        before = open_volume(volume)[:2].copy()
+        third = self.add_image(3)
+        volume = build_volume(self.clinical_case, workers=1)
+        self.assertEqual(volume.image_ids, [first.id, second.id, third.id])
+        slices = open_volume(volume)
+        np.testing.assert_array_equal(slices[:2], before)
+
+        response, body = self.fetch('?slice=2')
+        self.assertEqual((response.status_code, response['X-Volume-Shape']), (200, '1,512,512'))
+        self.assertEqual(body, slices[2].tobytes())
+        response, body = self.fetch('?start=1&stop=3', HTTP_RANGE='bytes=10-19')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, f'bytes 10-19/{2 * 512 * 512}'))
+        self.assertEqual(body, slices[1:3].tobytes()[10:20])
+        self.assertEqual(self.fetch('', HTTP_RANGE='bytes=-5')[1], slices.tobytes()[-5:])
+        self.assertEqual(self.fetch('', HTTP_RANGE=f'bytes={3 * 512 * 512}-')[0].status_code, 416)
+        self.assertEqual(self.fetch('?start=2&stop=5')[0].status_code, 400)
+
+        # Removing an image makes the volume stale until it is rebuilt
+        index_url = f'/cases/clinical_case_volume/{self.clinical_case.id}/index'
+        self.assertFalse(self.client.get(index_url).data['stale'])
+        second.delete()
+        self.assertTrue(self.client.get(index_url).data['stale'])
+        volume = build_volume(self.clinical_case, workers=1)
+        np.testing.assert_array_equal(open_volume(volume), slices[[0, 2]])
+
+    def test_slices_follow_their_position_and_failures_are_recorded(self):
+        first, second = self.add_image(1), self.add_image(2)
+        DicomMetadata.objects.create(medical_imaging=first, instance_number=2)
+        DicomMetadata.objects.create(medical_imaging=second, instance_number=1)
+        broken = MedicalImaging(clinical_case=self.clinical_case)
+        broken.full_image.save('broken.png', ContentFile(b'not an image'))
+
+        volume = build_volume(self.clinical_case, workers=1)
+        self.assertEqual((volume.image_ids, volume.failed_image_ids), ([second.id, first.id], [broken.id]))
+        self.assertFalse(is_stale(volume))
+
+        # A slice that goes before the built ones rewrites the volume in order
+        third = self.add_image(3)
+        DicomMetadata.objects.create(medical_imaging=third, instance_number=0)
+        volume = build_volume(self.clinical_case, workers=1)
+        self.assertEqual(volume.image_ids, [third.id, second.id, first.id])
+        self.assertEqual(os.path.getsize(volume_path(volume)), 3 * volume.slice_size)
+
+    def test_builds_of_a_case_wait_for_each_other(self):
+        acquired = threading.Event()
+
+        def build():
+            with case_lock(self.clinical_case.id):
+                acquired.set()
+
+        with case_lock(self.clinical_case.id):
+            thread = threading.Thread(target=build)
+            thread.start()
+            self.assertFalse(acquired.wait(0.2))
+        thread.join()
+        self.assertTrue(acquired.is_set())
+
+    def test_volume_jobs_build_each_case_once(self):
+        first, second = self.add_image(1), self.add_image(2)
+        job = enqueue_volume_job(first)
+        self.assertEqual(enqueue_volume_job(second), job)
+        self.assertFalse(CaseVolume.objects.filter(clinical_case=self.clinical_case).exists())
+
+        results = run_jobs(claim_jobs('worker-1', batch_size=4), workers=1)
+        self.assertEqual([result['state'] for result in results], ['done'])
+        volume = CaseVolume.objects.get(clinical_case=self.clinical_case)
+        self.assertEqual(volume.image_ids, [first.id, second.id])
+
+
+class DicomMetadataTests(MediaTestCase):
+    """
+    Checks that DICOM headers are indexed on upload, searchable and backfilled from the original files.
+    """
+
+    def slice(self, index, **elements):
+        return make_dicom(
+            np.arange(16 * 16, dtype=np.uint16).reshape(16, 16) * (index + 1), SeriesInstanceUID='1.2.3',
+            StudyDate='20240131', InstanceNumber=index + 1, SliceLocation=-2.5 * index, KVP=120,
+            ConvolutionKernel=['B', '30f'], **elements
+        )
+
+    def test_headers_are_indexed_and_searchable(self):
+        files = [ContentFile(self.slice(index), name=f'{index}.dcm') for index in range(3)]
+        image_ids = self.client.post('/cases/upload_images', {'case_id': self.clinical_case.id, 'files': files}).data['image_ids']
+
+        metadata = DicomMetadata.objects.get(medical_imaging_id=image_ids[1])
+        self.assertEqual((metadata.modality, metadata.study_date, metadata.slice_location), ('CT', datetime.date(2024, 1, 31), -2.5))
+        self.assertEqual((metadata.kvp, metadata.convolution_kernel, metadata.rows), (120.0, 'B\\30f', 16))
+        self.assertEqual(metadata.attributes['SOPClassUID'], '1.2.840.10008.5.1.4.1.1.2')
+        self.assertNotIn('PixelData', metadata.attributes)
+
+        response = self.client.get('/cases/dicom_metadata', {
+            'modality': 'ct', 'series_instance_uid': '1.2.3', 'slice_location_max': -1, 'study_date_from': '2024-01-01'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['image_id'] for result in response.data['results']], image_ids[1:])
+        self.assertEqual(response.data['results'][0]['instance_number'], 2)
+        self.assertEqual(self.client.get('/cases/dicom_metadata', {'study_date_to': '2023-12-31'}).data['count'], 0)
+        self.assertEqual(self.client.get('/cases/dicom_metadata', {'kvp_min': 'high'}).status_code, 400)
+
+    def test_backfill_reads_headers_of_the_original_files(self):
+        dicom = self.slice(0, SOPInstanceUID='1.2.3.4')
+        image = MedicalImaging.objects.create(clinical_case=self.clinical_case, sop_instance_uid='1.2.3.4')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with zipfile.ZipFile(os.path.join(directory, 'export.zip'), 'w') as archive:
+            archive.writestr('DICOM/IM1', dicom)
+            archive.writestr('README.txt', b'notes')
+
+        call_command('backfill_dicom_metadata', directory, stdout=io.StringIO())
+        self.assertEqual(DicomMetadata.objects.get(medical_imaging=image).series_instance_uid, '1.2.3')
+
+    def test_backfill_matches_images_without_uid_by_content(self):
+        # Converted before windowing (min-max stretch) and with the current window
+        first = self.slice(1)
+        second = make_dicom(np.eye(16, dtype=np.uint16) * 1000 + 5, InstanceNumber=3)
+        legacy = MedicalImaging(clinical_case=self.clinical_case)
+        legacy_png = cv2.imencode('.png', original_conversion(read_dicom(first).pixel_array))[1].tobytes()
+        legacy.full_image.save('IM1.png', ContentFile(legacy_png))
+        windowed = MedicalImaging(clinical_case=self.clinical_case)
+        windowed.full_image.save('IM2.png', ContentFile(dicom_to_png(second)))
+        unrelated = MedicalImaging(clinical_case=self.clinical_case)
+        unrelated.full_image.save('photo.png', ContentFile(cv2.imencode('.png', np.eye(16, dtype=np.uint8))[1].tobytes()))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for name, dicom in (('IM1', first), ('IM2', second)):
+            with open(os.path.join(directory, name), 'wb') as dicom_file:
+                dicom_file.write(dicom)
+
+        call_command('backfill_dicom_metadata', directory, workers=1, stdout=io.StringIO())
+        for image, dicom, instance_number in ((legacy, first, 2), (windowed, second, 3)):
+            image.refresh_from_db()
+            dataset = read_dicom(dicom)
+            self.assertEqual(image.dicom_metadata.instance_number, instance_number)
+            self.assertEqual(image.sop_instance_uid, dataset.SOPInstanceUID)
+            self.assertEqual(image.content_hash, pixelDigest(dataset.pixel_array))
+        self.assertFalse(DicomMetadata.objects.filter(medical_imaging=unrelated).exists())
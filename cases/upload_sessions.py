@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+import datetime
+import os
+import shutil
+
+from cases.ingestion import ingest_files
+from cases.models.upload_session import UploadSession, UploadChunk
+from oncovision.settings import UPLOAD_SESSION_TTL
+
+# Bytes read from the request and written to the part file at a time
+CHUNK_COPY_SIZE = 64 * 1024
+
+
+class UploadSessionError(Exception):
+    """
+    Raised when a chunk or a finalize request does not fit its upload session.
+    """
+
+
+def session_dir(session):
+    # Read at call time so the directory follows settings overrides
+    return os.path.join(settings.UPLOAD_SESSIONS_DIR, str(session.key))
+
+
+def part_path(session, file_index):
+    return os.path.join(session_dir(session), f"{file_index}.part")
+
+
+def create_session(clinical_case, files):
+    """
+    Creates an upload session for a list of {"name", "size"} and preallocates one part
+    file per file, so chunks can be written at any offset and in any order.
+    """
+    purge_expired_sessions()
+    session = UploadSession.objects.create(
+        clinical_case=clinical_case,
+        files=[{"name": os.path.basename(file["name"]), "size": int(file["size"])} for file in files]
+    )
+    os.makedirs(session_dir(session), exist_ok=True)
+    for index, file in enumerate(session.files):
+        with open(part_path(session, index), 'wb') as part:
+            part.truncate(file["size"])
+    return session
+
+
+def get_open_session(key):
+    """
+    Returns the open, unexpired upload session with the given key, or None.
+    """
+    expiry = timezone.now() - datetime.timedelta(seconds=UPLOAD_SESSION_TTL)
+    return UploadSession.objects.filter(key=key, state='open', created_at__gte=expiry) \
+        .select_related('clinical_case').first()
+
+
+def write_chunk(session, file_index, offset, length, stream):
+    """
+    Streams length bytes from stream into a file of the session at offset and records
+    the received range. Chunks of different ranges can be written concurrently, each
+    request writes its own region of the preallocated part file.
+    """
+    if file_index >= len(session.files):
+        raise UploadSessionError("File index out of range.")
+    if offset + length > session.files[file_index]["size"]:
+        raise UploadSessionError("Chunk exceeds the file size.")
+
+    written = 0
+    with open(part_path(session, file_index), 'r+b') as part:
+        part.seek(offset)
+        while written < length:
+            data = stream.read(min(CHUNK_COPY_SIZE, length - written))
+            if not data:
+                break
+            part.write(data)
+            written += len(data)
+    if written != length:
+        # Interrupted upload, the client resends the whole chunk
+        raise UploadSessionError("Incomplete chunk.")
+    return UploadChunk.objects.create(session=session, file_index=file_index, offset=offset, size=length)
+
+
+def received_ranges(session):
+    """
+    Returns, for each file of the session, the merged [start, end) byte ranges received.
+    """
+    ranges = [[] for _ in session.files]
+    chunks = UploadChunk.objects.filter(session=session).order_by('file_index', 'offset') \
+        .values_list('file_index', 'offset', 'size')
+    for file_index, offset, size in chunks:
+        merged = ranges[file_index]
+        if merged and offset <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], offset + size)
+        else:
+            merged.append([offset, offset + size])
+    return ranges
+
+
+def missing_files(session):
+    """
+    Returns the indexes of the files of the session that have not been fully received.
+    """
+    return [
+        index for index, (file, merged) in enumerate(zip(session.files, received_ranges(session)))
+        if file["size"] and merged != [[0, file["size"]]]
+    ]
+
+
+def finalize_session(session):
+    """
+    Ingests the files of a complete session into its clinical case and removes the
+    part files. Returns the created MedicalImaging records, the ingestion errors and
+    the deduplicated files (see ingest_files).
+    Raises UploadSessionError when files are missing or the session is already being
+    finalized.
+    """
+    missing = missing_files(session)
+    if missing:
+        raise UploadSessionError(f"Files not fully received: {missing}.")
+    # Only one finalize request ingests the files
+    claimed = UploadSession.objects.filter(id=session.id, state='open') \
+        .update(state='finalizing', updated_at=timezone.now())
+    if not claimed:
+        raise UploadSessionError("Upload session is already being finalized.")
+
+    files = [File(open(part_path(session, index), 'rb'), name=file["name"]) for index, file in enumerate(session.files)]
+    try:
+        medical_images, errors, duplicates = ingest_files(session.clinical_case, files)
+    except Exception:
+        UploadSession.objects.filter(id=session.id).update(state='open', updated_at=timezone.now())
+        raise
+    finally:
+        for file in files:
+            file.close()
+
+    with transaction.atomic():
+        UploadChunk.objects.filter(session=session).delete()
+        UploadSession.objects.filter(id=session.id).update(state='finalized', updated_at=timezone.now())
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+    return medical_images, errors, duplicates
+
+
+def purge_expired_sessions():
+    """
+    Deletes the unfinished sessions older than UPLOAD_SESSION_TTL and their part files.
+    """
+    expiry = timezone.now() - datetime.timedelta(seconds=UPLOAD_SESSION_TTL)
+    expired = UploadSession.objects.exclude(state='finalized').filter(created_at__lt=expiry)
+    for session in expired:
+        shutil.rmtree(session_dir(session), ignore_errors=True)
+    expired.delete()
@@ -4,6 +4,12 @@ from .views.clinical_cases import ClinicalCaseListView, ClinicalCaseCreateView,
     ClinicalCaseViewSet, ClinicalCaseUploadImagesView
 from .views.clinical_cases_pdf import ClinicalCasePDFView
 from .views.medical_imaging import MedicalImagingViewSet, MedicalImagingID
+from .views.processing_jobs import ProcessingJobStatusView
+from .views.processing_events import ClinicalCaseEventsView
+from .views.upload_sessions import UploadSessionCreateView, UploadSessionView, UploadSessionChunkView, \
+    UploadSessionFinalizeView
+from .views.volumes import ClinicalCaseVolumeView, ClinicalCaseVolumeIndexView
+from .views.dicom_metadata import DicomMetadataSearchView
 
 urlpatterns = [
     path("clinical_case_list", ClinicalCaseListView.as_view(), name="clinical_case_list"),
@@ -13,4 +19,13 @@ urlpatterns = [
     path("upload_images", ClinicalCaseUploadImagesView.as_view(), name="upload_images"),
     path("medical_imaging", MedicalImagingViewSet.as_view(), name="medical_imaging"),
     path("medical_imaging/<str:pk>", MedicalImagingID.as_view(), name="medical_imaging_id"),
+    path("processing_jobs", ProcessingJobStatusView.as_view(), name="processing_jobs"),
+    path("clinical_case_events/<int:pk>", ClinicalCaseEventsView.as_view(), name="clinical_case_events"),
+    path("upload_sessions", UploadSessionCreateView.as_view(), name="upload_session_create"),
+    path("upload_sessions/<uuid:key>", UploadSessionView.as_view(), name="upload_session"),
+    path("upload_sessions/<uuid:key>/finalize", UploadSessionFinalizeView.as_view(), name="upload_session_finalize"),
+    path("upload_sessions/<uuid:key>/<int:index>", UploadSessionChunkView.as_view(), name="upload_session_chunk"),
+    path("clinical_case_volume/<int:pk>", ClinicalCaseVolumeView.as_view(), name="clinical_case_volume"),
+    path("clinical_case_volume/<int:pk>/index", ClinicalCaseVolumeIndexView.as_view(), name="clinical_case_volume_index"),
+    path("dicom_metadata", DicomMetadataSearchView.as_view(), name="dicom_metadata"),
 ]
\ No newline at end of file
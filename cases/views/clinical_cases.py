@@ -2,18 +2,13 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from django.core.files.base import ContentFile
-
-from pydicom import dcmread
-import numpy as np
-import tempfile
-import cv2
-import os
-
+from cases.ingestion import DUPLICATE_SCOPES, ingest_files
+from cases.pyramids import pyramid_urls
 from cases.models.clinical_case import ClinicalCase
 from cases.models.medical_imaging import MedicalImaging
 from cases.models.lung_nodule import LungNodule
 from patients.models.patient import Patient 
+from oncovision.settings import DUPLICATE_UPLOAD_SCOPE
 
 
 class ClinicalCaseListView(APIView):
@@ -160,6 +155,7 @@ class ClinicalCaseViewSet(APIView):
                     'state': medical_image.state,
                     'full_image': medical_image.full_image.url if medical_image.full_image else None,
                     'processed_image': medical_image.processed_image.url if medical_image.processed_image else None,
+                    'levels': pyramid_urls(medical_image),
                     'lung_nodules': nodule_data
                 })
                 
@@ -175,6 +171,29 @@ class ClinicalCaseViewSet(APIView):
             )
 
 
+def upload_response(clinical_case_id, medical_images, errors, duplicates):
+    """
+    Returns the response to an upload: 201 with the created images, 200 when every
+    image was already stored, or 400 when none could be uploaded.
+    """
+    if not medical_images and not duplicates:
+        return Response(
+            {"error": "None of the images could be uploaded.", "errors": errors},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response(
+        {
+            "message": "Images uploaded successfully" if medical_images else "All images were already uploaded",
+            "clinical_case_id": clinical_case_id,
+            "image_ids": [medical_image.id for medical_image in medical_images],
+            "errors": errors,
+            "duplicates": duplicates,
+        },
+        status=status.HTTP_201_CREATED if medical_images else status.HTTP_200_OK
+    )
+
+
 class ClinicalCaseUploadImagesView(APIView):
     """
     API view to upload images for a clinical case.
@@ -202,80 +221,16 @@ class ClinicalCaseUploadImagesView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            for image in images:
-                # Check if it's in a correct format
-                if not image.name.lower().endswith(('.png', '.jpg', '.jpeg', '.dcm')):
-                    return Response(
-                        {"error": "Invalid file type. Only PNG, JPG, JPEG, and DICOM files are allowed."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-                # Handling DICOMS
-                if image.name.lower().endswith('.dcm'):
-                    try:
-                        # Create a temporary file to store the uploaded DICOM
-                        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                            for chunk in image.chunks():
-                                temp_file.write(chunk)
-                            temp_file_path = temp_file.name
-                        
-                        # Read DICOM file
-                        dicom_data = dcmread(temp_file_path)
-                        
-                        # Convert DICOM to image array
-                        pixel_array = dicom_data.pixel_array
-                        
-                        # Normalize the pixel values
-                        if pixel_array.dtype != np.uint8:
-                            # Scale to 8-bit (0-255)
-                            pixel_min = pixel_array.min()
-                            pixel_max = pixel_array.max()
-                            if pixel_max != pixel_min:  # Avoid division by zero
-                                pixel_array = ((pixel_array - pixel_min) * 255.0 / (pixel_max - pixel_min))
-                            pixel_array = pixel_array.astype(np.uint8)
+            # Where to look for slices already uploaded: 'case', 'patient' or 'off'
+            duplicate_scope = data.get('duplicate_scope', None) or DUPLICATE_UPLOAD_SCOPE
+            if duplicate_scope not in DUPLICATE_SCOPES:
+                return Response(
+                    {"error": f"duplicate_scope must be one of {', '.join(DUPLICATE_SCOPES)}."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
-                        # Encode as PNG
-                        success, encoded_image = cv2.imencode('.png', pixel_array)
-                        if not success:
-                            return Response(
-                                {"error": f"Failed to convert DICOM image {image.name} to PNG format."},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                            )
-                        
-                        # Create a PNG file from the encoded image
-                        png_file = ContentFile(encoded_image.tobytes())
-                        
-                        # Create MedicalImaging instance
-                        medical_image = MedicalImaging(
-                            clinical_case=clinical_case,
-                            state='preview'
-                        )
-                        
-                        # Use original filename but change extension to .png
-                        base_filename = os.path.splitext(image.name)[0]
-                        medical_image.full_image.save(f"{base_filename}.png", png_file, save=True)
-                        
-                        # Clean up the temp file
-                        os.unlink(temp_file_path)
-                        
-                    except Exception as e:
-                        return Response(
-                            {"error": f"Error processing DICOM file {image.name}: {str(e)}"},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                        )
-                else:
-                    # Handle regular image files (PNG, JPG, JPEG)
-                    medical_image = MedicalImaging.objects.create(
-                        clinical_case=clinical_case,
-                        full_image=image,
-                        state='preview'
-                    )
-                    medical_image.save()
-            
-            return Response(
-                {"message": "Images uploaded successfully", "clinical_case_id": clinical_case.id},
-                status=status.HTTP_201_CREATED
-            )
+            medical_images, errors, duplicates = ingest_files(clinical_case, images, duplicate_scope)
+            return upload_response(clinical_case.id, medical_images, errors, duplicates)
         except ClinicalCase.DoesNotExist:
             return Response(
                 {"error": "Clinical case not found."},
@@ -2,17 +2,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-
 from django.http import FileResponse
 from io import BytesIO
 
-from PIL import Image as PILImage
-from PIL import ImageDraw
-
 import urllib.request
 import tempfile
 import datetime
@@ -29,6 +21,14 @@ class ClinicalCasePDFView(APIView):
     """
 
     def get(self, request, *args, **kwargs):
+        # Report libraries are imported on first use so loading the URLconf stays cheap
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib import colors
+        from PIL import Image as PILImage
+        from PIL import ImageDraw
+
         pk = kwargs['pk']
         if not pk:
             return Response(
@@ -0,0 +1,93 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+import datetime
+
+from cases.models.dicom_metadata import DicomMetadata
+
+# Query parameter -> (lookup, conversion of the value) of the search filters
+METADATA_FILTERS = {
+    'case_id': ('medical_imaging__clinical_case_id', int),
+    'patient_id': ('medical_imaging__clinical_case__patient__id_number', str),
+    'modality': ('modality', str.upper),
+    'study_instance_uid': ('study_instance_uid', str),
+    'series_instance_uid': ('series_instance_uid', str),
+    'study_date_from': ('study_date__gte', datetime.date.fromisoformat),
+    'study_date_to': ('study_date__lte', datetime.date.fromisoformat),
+    'slice_location_min': ('slice_location__gte', float),
+    'slice_location_max': ('slice_location__lte', float),
+    'instance_number': ('instance_number', int),
+    'body_part_examined': ('body_part_examined', str),
+    'manufacturer': ('manufacturer', str),
+    'convolution_kernel': ('convolution_kernel', str),
+    'slice_thickness_min': ('slice_thickness__gte', float),
+    'slice_thickness_max': ('slice_thickness__lte', float),
+    'kvp_min': ('kvp__gte', float),
+    'kvp_max': ('kvp__lte', float),
+}
+METADATA_FIELDS = (
+    'modality', 'study_instance_uid', 'series_instance_uid', 'study_date', 'series_description', 'manufacturer',
+    'body_part_examined', 'instance_number', 'slice_location', 'slice_thickness', 'kvp', 'exposure',
+    'convolution_kernel', 'rows', 'columns', 'pixel_spacing_row', 'pixel_spacing_column',
+)
+MAX_LIMIT = 1000
+
+
+class DicomMetadataSearchView(APIView):
+    """
+    API view to search medical images by their DICOM header, from the indexed
+    DicomMetadata columns instead of the files.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """
+        Get the images matching every filter of METADATA_FILTERS given as a query
+        parameter, ordered by series and instance number. limit and offset page the
+        results; attributes=true includes the rest of each header.
+        """
+        filters = {}
+        for parameter, (lookup, kind) in METADATA_FILTERS.items():
+            value = request.query_params.get(parameter, None)
+            if value is None or value == '':
+                continue
+            try:
+                filters[lookup] = kind(value)
+            except ValueError:
+                return Response(
+                    {"error": f"Invalid value for {parameter}: {value}."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        try:
+            limit = min(int(request.query_params.get('limit', 100)), MAX_LIMIT)
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            return Response(
+                {"error": "limit and offset must be integers."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if limit < 1 or offset < 0:
+            return Response(
+                {"error": "limit must be positive and offset cannot be negative."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        include_attributes = request.query_params.get('attributes', '').lower() in ('1', 'true', 'yes')
+
+        fields = ('medical_imaging_id', 'medical_imaging__clinical_case_id', 'medical_imaging__state') + METADATA_FIELDS
+        metadata = DicomMetadata.objects.filter(**filters).order_by(
+            'series_instance_uid', 'instance_number', 'slice_location', 'medical_imaging_id'
+        )
+        count = metadata.count()
+        results = []
+        for row in metadata.values(*fields, *(('attributes',) if include_attributes else ()))[offset:offset + limit]:
+            results.append({
+                "image_id": row.pop('medical_imaging_id'),
+                "clinical_case_id": row.pop('medical_imaging__clinical_case_id'),
+                "state": row.pop('medical_imaging__state'),
+                **row,
+            })
+
+        return Response(
+            {"count": count, "limit": limit, "offset": offset, "results": results},
+            status=status.HTTP_200_OK
+        )
@@ -0,0 +1,150 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+import asyncio
+import json
+import time
+
+from cases.models.clinical_case import ClinicalCase
+from cases.models.medical_imaging import MedicalImaging
+from oncovision.settings import PROCESSING_EVENTS_POLL_INTERVAL, PROCESSING_EVENTS_HEARTBEAT, \
+    PROCESSING_EVENTS_MAX_DURATION
+
+
+def authenticate(request):
+    """
+    Returns the user of the JWT access token in the Authorization header or, since
+    EventSource cannot send headers, in the token query parameter. None if invalid.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def case_snapshot(case_id):
+    """
+    Returns a dict of image id -> (state, nodule count) for the images of a case.
+    """
+    images = MedicalImaging.objects.filter(clinical_case_id=case_id).values('id', 'state') \
+        .annotate(nodule_count=Count('lung_nodules')).order_by()
+    return {image['id']: (image['state'], image['nodule_count']) for image in images}
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class CaseEventStream:
+    """
+    State of a case's event stream: compares each snapshot (see case_snapshot) with
+    the previous one and returns the events to send.
+    """
+
+    def __init__(self, poll_interval, heartbeat, max_duration):
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.max_duration = max_duration
+        self.previous = {}
+        self.started = self.last_event = time.monotonic()
+
+    def retry(self):
+        return f"retry: {int(self.poll_interval * 1000) * 3}\n\n"
+
+    def expired(self):
+        return time.monotonic() - self.started >= self.max_duration
+
+    def update(self, current):
+        """
+        Returns the events of the changes since the previous snapshot, a keep-alive
+        comment once heartbeat seconds pass without events, or None.
+        """
+        events = []
+        for image_id, (state, nodule_count) in current.items():
+            if self.previous.get(image_id) != (state, nodule_count):
+                events.append(format_event('image', {
+                    'id': image_id, 'state': state, 'nodule_count': nodule_count
+                }))
+        for image_id in self.previous.keys() - current.keys():
+            events.append(format_event('image_deleted', {'id': image_id}))
+        self.previous = current
+
+        now = time.monotonic()
+        if events:
+            self.last_event = now
+            return "".join(events)
+        if now - self.last_event >= self.heartbeat:
+            # Comment line that keeps proxies from closing an idle connection
+            self.last_event = now
+            return ": keep-alive\n\n"
+        return None
+
+
+async def case_events(case_id, poll_interval=PROCESSING_EVENTS_POLL_INTERVAL,
+                      heartbeat=PROCESSING_EVENTS_HEARTBEAT, max_duration=PROCESSING_EVENTS_MAX_DURATION):
+    """
+    Yields server-sent events for the images of a case: the current state of every
+    image first, then an image event whenever an image changes state or nodule count
+    and an image_deleted event when it is removed. The stream ends after max_duration
+    seconds; EventSource reconnects on its own.
+    """
+    snapshot = sync_to_async(case_snapshot)
+    stream = CaseEventStream(poll_interval, heartbeat, max_duration)
+    yield stream.retry()
+    while not stream.expired():
+        events = stream.update(await snapshot(case_id))
+        if events:
+            yield events
+        await asyncio.sleep(poll_interval)
+
+
+def sync_case_events(case_id, poll_interval=PROCESSING_EVENTS_POLL_INTERVAL,
+                     heartbeat=PROCESSING_EVENTS_HEARTBEAT, max_duration=PROCESSING_EVENTS_MAX_DURATION):
+    """
+    Same events as case_events for WSGI servers, which collect async streaming
+    responses before sending them. The stream holds a worker thread while open.
+    """
+    stream = CaseEventStream(poll_interval, heartbeat, max_duration)
+    yield stream.retry()
+    while not stream.expired():
+        events = stream.update(case_snapshot(case_id))
+        if events:
+            yield events
+        time.sleep(poll_interval)
+
+
+class ClinicalCaseEventsView(View):
+    """
+    Streams the processing progress of a clinical case's medical images as
+    server-sent events. It is an async view, so under the ASGI application (see
+    run_backend.bat) an open stream does not hold a worker thread. WSGI servers get
+    the sync_case_events stream instead.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        pk = kwargs['pk']
+        user = await sync_to_async(authenticate)(request)
+        if user is None or not user.is_active:
+            return JsonResponse(
+                {"error": "Authentication credentials were not provided or are invalid."},
+                status=401
+            )
+        if not await ClinicalCase.objects.filter(id=pk).aexists():
+            return JsonResponse({"error": "Clinical case not found."}, status=404)
+
+        events = case_events(pk) if isinstance(request, ASGIRequest) else sync_case_events(pk)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Disable response buffering in nginx
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,58 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+from cases.models.processing_job import ProcessingJob
+from oncovision.utils.options import PROCESSING_JOB_STATES
+
+
+class ProcessingJobStatusView(APIView):
+    """
+    API view to follow the progress of the processing jobs queued by
+    MedicalImagingViewSet.
+    """
+
+    def get(self, request, *args, **kwargs):
+        """
+        Get the jobs filtered by job_ids, image_ids or case_id (comma separated query
+        parameters), with the state of their medical images.
+        """
+        job_ids = [value for value in request.query_params.get('job_ids', '').split(',') if value]
+        image_ids = [value for value in request.query_params.get('image_ids', '').split(',') if value]
+        case_id = request.query_params.get('case_id', None)
+
+        if not job_ids and not image_ids and case_id is None:
+            return Response(
+                {"error": "job_ids, image_ids or case_id is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        jobs = ProcessingJob.objects.select_related('medical_imaging')
+        if job_ids:
+            jobs = jobs.filter(id__in=job_ids)
+        if image_ids:
+            jobs = jobs.filter(medical_imaging_id__in=image_ids)
+        if case_id is not None:
+            jobs = jobs.filter(medical_imaging__clinical_case_id=case_id)
+
+        summary = {state: 0 for state, _ in PROCESSING_JOB_STATES}
+        jobs_data = []
+        for job in jobs:
+            summary[job.state] += 1
+            jobs_data.append({
+                "job_id": job.id,
+                "image_id": job.medical_imaging_id,
+                "image_state": job.medical_imaging.state,
+                "kind": job.kind,
+                "state": job.state,
+                "error": job.error,
+                "attempts": job.attempts,
+                "created_at": job.created_at,
+                "started_at": job.started_at,
+                "finished_at": job.finished_at,
+            })
+
+        return Response(
+            {"jobs": jobs_data, "summary": summary},
+            status=status.HTTP_200_OK
+        )
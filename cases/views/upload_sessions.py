@@ -0,0 +1,205 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+import re
+
+from cases.models.clinical_case import ClinicalCase
+from cases.views.clinical_cases import upload_response
+from cases.upload_sessions import UploadSessionError, create_session, get_open_session, write_chunk, \
+    received_ranges, finalize_session
+from oncovision.settings import UPLOAD_CHUNK_MAX_SIZE, UPLOAD_SESSION_MAX_FILES, UPLOAD_SESSION_MAX_FILE_SIZE, \
+    UPLOAD_SESSION_MAX_SIZE
+
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+def session_report(session):
+    ranges = received_ranges(session)
+    return {
+        "key": session.key,
+        "clinical_case_id": session.clinical_case_id,
+        "state": session.state,
+        "files": [
+            {
+                "index": index,
+                "name": file["name"],
+                "size": file["size"],
+                "received": sum(end - start for start, end in ranges[index]),
+                "ranges": ranges[index],
+            }
+            for index, file in enumerate(session.files)
+        ],
+    }
+
+
+class UploadSessionCreateView(APIView):
+    """
+    API view to start a resumable chunked upload of images for a clinical case.
+    """
+
+    def post(self, request, *args, **kwargs):
+        """
+        Create an upload session from case_id and files, a list of {"name", "size"}.
+        The files are then sent with UploadSessionChunkView and ingested with
+        UploadSessionFinalizeView.
+        """
+        clinical_case_id = request.data.get('case_id', None)
+        files = request.data.get('files', None)
+        if not clinical_case_id:
+            return Response(
+                {"error": "Clinical case ID is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not isinstance(files, list) or not files:
+            return Response(
+                {"error": "files must be a non-empty list of {name, size}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            files = [{"name": str(file["name"]), "size": int(file["size"])} for file in files]
+        except (TypeError, KeyError, ValueError):
+            return Response(
+                {"error": "files must be a non-empty list of {name, size}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if any(file["size"] < 0 for file in files):
+            return Response(
+                {"error": "File sizes cannot be negative."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # Checked before the part files are preallocated
+        if len(files) > UPLOAD_SESSION_MAX_FILES:
+            return Response(
+                {"error": f"An upload session cannot have more than {UPLOAD_SESSION_MAX_FILES} files."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if any(file["size"] > UPLOAD_SESSION_MAX_FILE_SIZE for file in files):
+            return Response(
+                {"error": f"Files cannot be larger than {UPLOAD_SESSION_MAX_FILE_SIZE} bytes."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        if sum(file["size"] for file in files) > UPLOAD_SESSION_MAX_SIZE:
+            return Response(
+                {"error": f"An upload session cannot be larger than {UPLOAD_SESSION_MAX_SIZE} bytes."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
+        try:
+            clinical_case = ClinicalCase.objects.get(id=clinical_case_id)
+        except ClinicalCase.DoesNotExist:
+            return Response(
+                {"error": "Clinical case not found."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        session = create_session(clinical_case, files)
+        return Response(
+            {**session_report(session), "chunk_max_size": UPLOAD_CHUNK_MAX_SIZE},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class UploadSessionView(APIView):
+    """
+    API view to get the byte ranges received by an upload session, so an interrupted
+    upload can resume with the missing chunks.
+    """
+
+    def get(self, request, *args, **kwargs):
+        session = get_open_session(kwargs['key'])
+        if session is None:
+            return Response(
+                {"error": "Upload session not found or expired."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(session_report(session), status=status.HTTP_200_OK)
+
+
+class UploadSessionChunkView(APIView):
+    """
+    API view to upload one chunk of a file of an upload session. The body is the raw
+    chunk and is streamed to disk; its position comes from the offset query parameter
+    or a Content-Range header. Chunks can be sent in any order and concurrently.
+    """
+
+    def put(self, request, *args, **kwargs):
+        session = get_open_session(kwargs['key'])
+        if session is None:
+            return Response(
+                {"error": "Upload session not found or expired."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        offset = request.query_params.get('offset', None)
+        content_range = request.headers.get('Content-Range', None)
+        if offset is None and content_range:
+            match = CONTENT_RANGE_PATTERN.fullmatch(content_range.strip())
+            if match is None or int(match.group(2)) - int(match.group(1)) + 1 != length:
+                return Response(
+                    {"error": "Invalid Content-Range header."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            offset = match.group(1)
+        if offset is None or not str(offset).isdigit():
+            return Response(
+                {"error": "A non-negative offset is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if length <= 0:
+            return Response(
+                {"error": "Content-Length is required."},
+                status=status.HTTP_411_LENGTH_REQUIRED
+            )
+        if length > UPLOAD_CHUNK_MAX_SIZE:
+            return Response(
+                {"error": f"Chunks cannot be larger than {UPLOAD_CHUNK_MAX_SIZE} bytes."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
+        try:
+            # request.stream is read directly so the body is never buffered in memory
+            chunk = write_chunk(session, kwargs['index'], int(offset), length, request.stream)
+        except UploadSessionError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {"file_index": chunk.file_index, "offset": chunk.offset, "size": chunk.size},
+            status=status.HTTP_200_OK
+        )
+
+
+class UploadSessionFinalizeView(APIView):
+    """
+    API view to finish an upload session: its files are ingested into the clinical
+    case like the ones sent to ClinicalCaseUploadImagesView.
+    """
+
+    def post(self, request, *args, **kwargs):
+        session = get_open_session(kwargs['key'])
+        if session is None:
+            return Response(
+                {"error": "Upload session not found or expired."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            medical_images, errors, duplicates = finalize_session(session)
+        except UploadSessionError as e:
+            return Response(
+                {"error": str(e), **session_report(session)},
+                status=status.HTTP_409_CONFLICT
+            )
+        except Exception as e:
+            return Response(
+                {"error": f"An error occurred while processing the upload: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return upload_response(session.clinical_case_id, medical_images, errors, duplicates)
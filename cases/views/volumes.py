@@ -0,0 +1,136 @@
+from django.http import StreamingHttpResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+
+import mmap
+import re
+
+from cases.models.case_volume import CaseVolume
+from cases.volumes import volume_path, is_stale
+
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)')
+# Bytes of the mapping sent per chunk of the response
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def parse_range(header, length):
+    """
+    Returns the [start, end) bytes of a single-range Range header within a body of
+    length bytes, None when the header is absent or not a single byte range (the whole
+    body is sent), or False when the range cannot be satisfied.
+    """
+    match = RANGE_PATTERN.fullmatch(header.strip()) if header else None
+    if match is None or match.group(1) == match.group(2) == '':
+        return None
+    if match.group(1) == '':
+        # Suffix range: the last N bytes
+        suffix = int(match.group(2))
+        return (max(length - suffix, 0), length) if suffix else False
+    start = int(match.group(1))
+    end = min(int(match.group(2)) + 1, length) if match.group(2) else length
+    if start >= length or end <= start:
+        return False
+    return start, end
+
+
+def stream_mapping(path, start, end):
+    """
+    Yields the [start, end) bytes of a file from a read-only memory mapping of it.
+    """
+    with open(path, 'rb') as volume_file, mmap.mmap(volume_file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+        view = memoryview(mapping)
+        try:
+            for offset in range(start, end, STREAM_CHUNK_SIZE):
+                yield bytes(view[offset:min(offset + STREAM_CHUNK_SIZE, end)])
+        finally:
+            view.release()
+
+
+class ClinicalCaseVolumeIndexView(APIView):
+    """
+    API view to get the index of a clinical case's volume store: the slice size, the
+    medical image of every slice and the images that could not be decoded.
+    """
+
+    def get(self, request, *args, **kwargs):
+        volume = CaseVolume.objects.filter(clinical_case_id=kwargs['pk']).first()
+        if volume is None:
+            return Response(
+                {"error": "The clinical case has no volume. Build it with the build_volumes command."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(
+            {
+                "clinical_case_id": volume.clinical_case_id,
+                "dtype": "uint8",
+                "shape": [volume.slice_count, volume.height, volume.width],
+                "slice_bytes": volume.slice_size,
+                "image_ids": volume.image_ids,
+                "failed_image_ids": volume.failed_image_ids,
+                "stale": is_stale(volume),
+                "updated_at": volume.updated_at,
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class ClinicalCaseVolumeView(APIView):
+    """
+    API view to fetch raw slices from a clinical case's volume store. slice selects
+    one slice, start and stop a range of slices (all of them by default). The body is
+    the (slices, height, width) uint8 array, streamed from the memory-mapped volume;
+    a Range header selects bytes within it.
+    """
+
+    def get(self, request, *args, **kwargs):
+        volume = CaseVolume.objects.filter(clinical_case_id=kwargs['pk']).first()
+        if volume is None:
+            return Response(
+                {"error": "The clinical case has no volume. Build it with the build_volumes command."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            if 'slice' in request.query_params:
+                start = int(request.query_params['slice'])
+                stop = start + 1
+            else:
+                start = int(request.query_params.get('start', 0))
+                stop = int(request.query_params.get('stop', volume.slice_count))
+        except ValueError:
+            return Response(
+                {"error": "slice, start and stop must be integers."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 <= start < stop <= volume.slice_count:
+            return Response(
+                {"error": f"The slice range must be within 0 and {volume.slice_count}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Bytes of the selected slices in the volume file
+        offset, length = start * volume.slice_size, (stop - start) * volume.slice_size
+        byte_range = parse_range(request.headers.get('Range'), length)
+        if byte_range is False:
+            response = Response(
+                {"error": "Requested range not satisfiable."},
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response['Content-Range'] = f"bytes */{length}"
+            return response
+        first, end = byte_range or (0, length)
+
+        response = StreamingHttpResponse(
+            stream_mapping(volume_path(volume), offset + first, offset + end),
+            content_type='application/octet-stream',
+            status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+        )
+        response['Content-Length'] = end - first
+        response['Accept-Ranges'] = 'bytes'
+        if byte_range:
+            response['Content-Range'] = f"bytes {first}-{end - 1}/{length}"
+        response['X-Volume-Shape'] = f"{stop - start},{volume.height},{volume.width}"
+        response['X-Volume-Dtype'] = 'uint8'
+        response['X-Volume-Image-Ids'] = ",".join(str(image_id) for image_id in volume.image_ids[start:stop])
+        return response
@@ -0,0 +1,164 @@
+from django.conf import settings
+from django.db.models import F
+
+from contextlib import contextmanager
+import logging
+import os
+
+from cases.models.case_volume import CaseVolume
+from cases.models.medical_imaging import MedicalImaging
+from oncovision.settings import VOLUME_SLICE_WIDTH, VOLUME_SLICE_HEIGHT, IMAGE_PROCESSING_WORKERS, \
+    PROCESSING_JOB_BATCH_SIZE, PROCESSED_IMAGE_REDUCED_DECODE
+
+logger = logging.getLogger(__name__)
+
+
+def volume_path(volume):
+    # Read at call time so the directory follows settings overrides
+    return os.path.join(settings.VOLUME_STORE_DIR, volume.file_name)
+
+
+def case_images(clinical_case_id):
+    """
+    Returns the images of a case that have a full image, in slice order: by series,
+    InstanceNumber and SliceLocation from their DICOM metadata when available, then by id.
+    """
+    return MedicalImaging.objects.filter(clinical_case_id=clinical_case_id).exclude(full_image='') \
+        .exclude(full_image=None).order_by(
+            F('dicom_metadata__series_instance_uid').asc(nulls_last=True),
+            F('dicom_metadata__instance_number').asc(nulls_last=True),
+            F('dicom_metadata__slice_location').asc(nulls_last=True),
+            'id',
+        )
+
+
+def is_stale(volume):
+    """
+    Whether images were added to or removed from the case since its volume was built.
+    The images that failed to decode are not in the volume, nor missing from it.
+    """
+    built_ids = set(volume.image_ids) | set(volume.failed_image_ids)
+    return built_ids != set(case_images(volume.clinical_case_id).values_list('id', flat=True))
+
+
+@contextmanager
+def case_lock(clinical_case_id):
+    """
+    Holds an exclusive lock on the volume of a clinical case, shared by every process
+    on the host, so uploads and build_volumes runs of the same case build it one at a
+    time. The database cannot provide it: SQLite ignores select_for_update.
+    """
+    os.makedirs(settings.VOLUME_STORE_DIR, exist_ok=True)
+    with open(os.path.join(settings.VOLUME_STORE_DIR, f"case_{clinical_case_id}.lock"), 'a+b') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 seconds, keep waiting for the other build
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_slices(volume_file, images, width, height, workers, batch_size):
+    """
+    Decodes and normalizes the slices batch by batch and appends them to volume_file.
+    Returns the ids of the images written and of the ones that could not be decoded,
+    which are left out.
+    """
+    from oncovision.utils.image_pipeline import PreprocessingPipeline
+
+    pipeline = PreprocessingPipeline(width, height, reduced_decode=PROCESSED_IMAGE_REDUCED_DECODE, workers=workers)
+    written_ids = []
+    failed_ids = []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        stack, digests = pipeline.load([image.full_image.path for image in batch])
+        # The loaded rows of the working stack are contiguous, they are written without a copy
+        volume_file.write(memoryview(stack))
+        for image, digest in zip(batch, digests):
+            (written_ids if digest is not None else failed_ids).append(image.id)
+    return written_ids, failed_ids
+
+
+def build_volume(clinical_case, workers=IMAGE_PROCESSING_WORKERS, batch_size=PROCESSING_JOB_BATCH_SIZE,
+                 rebuild=False, width=VOLUME_SLICE_WIDTH, height=VOLUME_SLICE_HEIGHT):
+    """
+    Packs the slices of a clinical case into its volume file, in slice order (see
+    case_images). When the case only gained images that come after the slices already
+    built, they are appended; otherwise (images removed or inserted between slices,
+    the slice size changed or rebuild set) the file is rewritten to a temporary file
+    that then replaces it, so readers never see a partial volume. Slices that cannot be
+    decoded are recorded in failed_image_ids and only retried on a rebuild. Builds of
+    the same case wait for each other (see case_lock). Returns the CaseVolume.
+    """
+    with case_lock(clinical_case.id):
+        volume = CaseVolume.objects.filter(clinical_case=clinical_case).first()
+        images = list(case_images(clinical_case.id))
+        order = [image.id for image in images]
+
+        built_ids = set()
+        if volume is not None and not rebuild:
+            built_ids = set(volume.image_ids) | set(volume.failed_image_ids)
+        new_images = [image for image in images if image.id not in built_ids]
+        built_order = [image_id for image_id in order if image_id in built_ids]
+        appendable = (
+            volume is not None and not rebuild and (volume.width, volume.height) == (width, height)
+            and built_ids <= set(order) and os.path.exists(volume_path(volume))
+            and os.path.getsize(volume_path(volume)) == volume.slice_count * volume.slice_size
+            # The built slices are still in slice order and the new ones all come after them
+            and order[:len(built_order)] == built_order
+            and [image_id for image_id in built_order if image_id in set(volume.image_ids)] == volume.image_ids
+        )
+        if appendable:
+            if new_images:
+                with open(volume_path(volume), 'ab') as volume_file:
+                    written_ids, failed_ids = _write_slices(volume_file, new_images, width, height, workers, batch_size)
+                volume.image_ids = volume.image_ids + written_ids
+                volume.failed_image_ids = volume.failed_image_ids + failed_ids
+                volume.save()
+            return volume
+
+        if volume is None:
+            volume = CaseVolume(clinical_case=clinical_case, file_name=f"case_{clinical_case.id}.vol")
+        temporary_path = f"{volume_path(volume)}.tmp"
+        with open(temporary_path, 'wb') as volume_file:
+            written_ids, failed_ids = _write_slices(volume_file, images, width, height, workers, batch_size)
+        os.replace(temporary_path, volume_path(volume))
+        volume.width, volume.height = width, height
+        volume.image_ids, volume.failed_image_ids = written_ids, failed_ids
+        volume.save()
+        logger.info(
+            "Built the volume of case %s: %d slices, %d failed", clinical_case.id, len(written_ids), len(failed_ids)
+        )
+        return volume
+
+
+def open_volume(volume):
+    """
+    Returns the slices of a volume as a read-only (slices, height, width) uint8 memory
+    map. Slicing it reads only the pages of the slices used, without decoding or
+    copying, so whole-series operations can work on it directly.
+    """
+    import numpy as np
+
+    if volume.slice_count == 0:
+        return np.empty((0, volume.height, volume.width), dtype=np.uint8)
+    return np.memmap(volume_path(volume), dtype=np.uint8, mode='r', shape=(volume.slice_count, volume.height, volume.width))
+
@@ -0,0 +1,17 @@
+import os
+
+
+def run_worker(worker_name, batch_size, poll_interval, burst, timeout):
+    """
+    Entry point of a process_jobs worker process. Django is set up here so the worker
+    also starts on platforms that spawn processes instead of forking them.
+    """
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "oncovision.settings")
+    django.setup()
+
+    # Imported after setup because it loads the models
+    from cases.processing import work
+
+    return work(worker_name, batch_size, poll_interval, burst, timeout)
@@ -2,6 +2,9 @@
 ASGI config for oncovision project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn oncovision.asgi:application``) so the
+server-sent event streams of ``cases/clinical_case_events/<pk>`` do not each hold a
+worker thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
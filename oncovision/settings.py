@@ -120,6 +120,11 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # WAL and a longer lock timeout let the process_jobs workers write concurrently
+        "OPTIONS": {
+            "timeout": 20,
+            "init_command": "PRAGMA journal_mode=WAL;",
+        },
     }
 }
 
@@ -166,4 +171,106 @@ MEDIA_ROOT = BASE_DIR / 'media/'
 PROCESSED_IMAGE_WIDTH = 512
 PROCESSED_IMAGE_HEIGHT = 512
 
-DATA_UPLOAD_MAX_NUMBER_FILES = 200
\ No newline at end of file
+DATA_UPLOAD_MAX_NUMBER_FILES = 200
+
+# Resumable chunked uploads: directory of the part files being received, largest chunk
+# accepted per request, and seconds after which an unfinished session is discarded
+UPLOAD_SESSIONS_DIR = Path(os.environ.get("UPLOAD_SESSIONS_DIR", BASE_DIR / "upload_sessions"))
+UPLOAD_CHUNK_MAX_SIZE = int(os.environ.get("UPLOAD_CHUNK_MAX_SIZE", 16 * 1024 * 1024))
+UPLOAD_SESSION_TTL = int(os.environ.get("UPLOAD_SESSION_TTL", 24 * 60 * 60))
+# Limits of an upload session, checked before its part files are preallocated: number
+# of files, size of each file and total size of the session
+UPLOAD_SESSION_MAX_FILES = int(os.environ.get("UPLOAD_SESSION_MAX_FILES", DATA_UPLOAD_MAX_NUMBER_FILES))
+UPLOAD_SESSION_MAX_FILE_SIZE = int(os.environ.get("UPLOAD_SESSION_MAX_FILE_SIZE", 2 * 1024 * 1024 * 1024))
+UPLOAD_SESSION_MAX_SIZE = int(os.environ.get("UPLOAD_SESSION_MAX_SIZE", 4 * 1024 * 1024 * 1024))
+
+# Peak bytes of temporaries the adaptive bilateral filter may allocate; larger
+# images are filtered in halo-padded tiles. None filters the whole image at once.
+IMAGE_FILTER_MAX_MEMORY = 256 * 1024 * 1024
+
+# Worker processes used to filter image bands in parallel on CPU-only hosts
+IMAGE_FILTER_WORKERS = int(os.environ.get("IMAGE_FILTER_WORKERS", os.cpu_count() or 1))
+
+# Compute the filter's local mean, std, min and max with O(1)-per-pixel box filters
+# instead of the full window. Faster for large windows, not bit-identical to the reference.
+IMAGE_FILTER_FAST_STATISTICS = False
+
+# Filter engine to always use ('reference', 'vectorized', 'tiled', 'parallel' or 'cuda').
+# When unset, the fastest engine per image and window size is picked from the saved
+# calibration (see the calibrate_filters command) or a built-in heuristic.
+IMAGE_FILTER_ENGINE = os.environ.get("IMAGE_FILTER_ENGINE") or None
+IMAGE_FILTER_CALIBRATION_FILE = BASE_DIR / "filter_calibration.json"
+IMAGE_FILTER_CALIBRATE_ON_STARTUP = False
+
+# Run image filtering and analysis in the process_jobs workers instead of inside the
+# request. When disabled, MedicalImagingViewSet.put processes the images synchronously.
+IMAGE_PROCESSING_ASYNC = os.environ.get("IMAGE_PROCESSING_ASYNC", "true").lower() in ("1", "true", "yes")
+# Filter jobs a worker claims at once, so their images are filtered as one batch
+PROCESSING_JOB_BATCH_SIZE = 16
+# Seconds without progress after which a running job is considered abandoned by a crashed worker
+PROCESSING_JOB_TIMEOUT = 600
+PROCESSING_JOB_MAX_ATTEMPTS = 3
+# Processes that decode, resize and encode the slices of a batch in parallel
+IMAGE_PROCESSING_WORKERS = int(os.environ.get("IMAGE_PROCESSING_WORKERS", os.cpu_count() or 1))
+# zlib level (0-9) of the processed PNGs: lower is faster to write, higher is smaller.
+# None keeps OpenCV's default.
+PROCESSED_IMAGE_PNG_COMPRESSION = (
+    int(os.environ["PROCESSED_IMAGE_PNG_COMPRESSION"]) if os.environ.get("PROCESSED_IMAGE_PNG_COMPRESSION") else None
+)
+# Decode sources much larger than the processed size at a reduced resolution
+PROCESSED_IMAGE_REDUCED_DECODE = True
+# Size cap in bytes of the processed image cache, least recently used images are evicted
+# first. Set to 0 to disable the cache.
+PROCESSED_IMAGE_CACHE_MAX_SIZE = int(os.environ.get("PROCESSED_IMAGE_CACHE_MAX_SIZE", 512 * 1024 * 1024))
+
+# Roboflow workflow that detects and classifies the lung nodules
+ROBOFLOW_API_URL = os.environ.get("ROBOFLOW_API_URL", "https://serverless.roboflow.com")
+ROBOFLOW_API_KEY = os.environ.get("ROBOFLOW_API_KEY")
+INFERENCE_WORKSPACE = "oncovision"
+INFERENCE_WORKFLOW_ID = "detect-and-classify-2"
+# Workflow calls running at once, per-call timeout in seconds and retries of failed calls
+INFERENCE_MAX_IN_FLIGHT = int(os.environ.get("INFERENCE_MAX_IN_FLIGHT", 8))
+INFERENCE_TIMEOUT = 60
+INFERENCE_RETRIES = 2
+# Seconds workflow results are reused for the same processed image (0 disables the
+# cache). Change INFERENCE_WORKFLOW_VERSION when the workflow is updated in Roboflow so
+# older results are no longer used, then run purge_inference_cache.
+INFERENCE_CACHE_TTL = int(os.environ.get("INFERENCE_CACHE_TTL", 30 * 24 * 60 * 60))
+INFERENCE_WORKFLOW_VERSION = os.environ.get("INFERENCE_WORKFLOW_VERSION", "1")
+
+# Server-sent events of the processing progress: seconds between database polls, between
+# keep-alive comments, and before a stream is closed (the browser reconnects).
+PROCESSING_EVENTS_POLL_INTERVAL = 1.0
+PROCESSING_EVENTS_HEARTBEAT = 15
+PROCESSING_EVENTS_MAX_DURATION = 10 * 60
+
+# Window applied when converting DICOM slices to 8-bit images: 'lung' or 'mediastinal'
+# (standard CT windows, in Hounsfield units), 'file' (the file's WindowCenter/Width) or
+# 'minmax' (each slice stretched to its own range)
+DICOM_WINDOW = os.environ.get("DICOM_WINDOW", "lung")
+# Slices of an uploaded ZIP series read, converted and saved at a time, which bounds the
+# memory used by an archive upload regardless of its size
+DICOM_ARCHIVE_BATCH_SIZE = 32
+
+# Longest side in pixels of the downscaled pyramid levels created for the viewer at
+# upload time (see the build_pyramids command). Images larger than
+# IMAGE_PYRAMID_TILES_MIN_SIZE are also cut into Deep Zoom tiles when IMAGE_PYRAMID_TILES is set.
+IMAGE_PYRAMID_LEVELS = {"thumbnail": 128, "medium": 512}
+IMAGE_PYRAMID_TILES = os.environ.get("IMAGE_PYRAMID_TILES", "false").lower() in ("1", "true", "yes")
+IMAGE_PYRAMID_TILES_MIN_SIZE = 2048
+IMAGE_PYRAMID_TILE_SIZE = 256
+
+# Per-case volume store: the slices of a case normalized to VOLUME_SLICE_WIDTH x
+# VOLUME_SLICE_HEIGHT and packed into one memory-mapped file in VOLUME_STORE_DIR (see the
+# build_volumes command). When VOLUME_STORE_ENABLED, uploads queue a job for the
+# process_jobs workers that appends their slices to it.
+VOLUME_STORE_ENABLED = os.environ.get("VOLUME_STORE_ENABLED", "false").lower() in ("1", "true", "yes")
+VOLUME_STORE_DIR = Path(os.environ.get("VOLUME_STORE_DIR", BASE_DIR / "volumes"))
+VOLUME_SLICE_WIDTH = PROCESSED_IMAGE_WIDTH
+VOLUME_SLICE_HEIGHT = PROCESSED_IMAGE_HEIGHT
+
+# Where uploads are checked for slices already stored, by SOPInstanceUID and pixel
+# content hash: 'case' skips the duplicates of the same clinical case, 'patient' also
+# links the ones found in the patient's other cases (reusing their files and results),
+# 'off' stores every upload
+DUPLICATE_UPLOAD_SCOPE = os.environ.get("DUPLICATE_UPLOAD_SCOPE", "case")
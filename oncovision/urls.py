@@ -33,4 +33,7 @@ admin.site.index_title = "Bienvenido al portal de administración de Oncovision"
 
 if settings.DEBUG:
     from django.conf.urls.static import static
+    from django.contrib.staticfiles.urls import staticfiles_urlpatterns
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Served by runserver, but not by the ASGI server of run_backend.bat
+    urlpatterns += staticfiles_urlpatterns()
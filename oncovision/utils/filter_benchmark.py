@@ -0,0 +1,124 @@
+import tracemalloc
+import time
+
+import numpy as np
+
+from oncovision.utils.image_filters import adaptiveBilateralFilter, vectorizedAdaptiveBilateralFilter
+from oncovision.utils.filter_engines import ENGINES, availableEngines
+
+
+def _engineBenchmark(engine):
+    return lambda image, window_size: engine.filter(image[None], window_size)[0]
+
+
+# Every available registered engine, plus the vectorized engine with fast statistics.
+# Exact engines reproduce the reference loop's rounding and must stay within
+# EXACT_TOLERANCE gray levels everywhere; approximate engines (fast statistics, CuPy's
+# own normalization and padding) must stay within APPROXIMATE_TOLERANCE.
+BENCHMARK_ENGINES = {
+    name: (_engineBenchmark(ENGINES[name]), ENGINES[name].exact) for name in availableEngines()
+}
+BENCHMARK_ENGINES['fast_statistics'] = (
+    lambda image, window_size: vectorizedAdaptiveBilateralFilter(image, window_size, fast_statistics=True), False
+)
+
+EXACT_TOLERANCE = {'max_abs_diff': 1}
+APPROXIMATE_TOLERANCE = {'mean_abs_diff': 0.5, 'outlier_fraction': 0.01}
+
+
+def syntheticSlice(size, seed=0):
+    ''' Returns a size x size uint8 image resembling an axial chest CT slice: a soft tissue
+    body ellipse, two dark lungs with vessels and small nodules, and acquisition noise.
+    '''
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] / size
+    image = np.zeros((size, size), dtype=np.float32)
+
+    # Body and lungs
+    image[((x - 0.5) / 0.45) ** 2 + ((y - 0.5) / 0.35) ** 2 <= 1] = 180
+    for center_x in (0.32, 0.68):
+        image[((x - center_x) / 0.14) ** 2 + ((y - 0.48) / 0.24) ** 2 <= 1] = 30
+
+    # Vessels and nodules inside the lungs
+    for _ in range(12):
+        cx, cy = rng.uniform(0.2, 0.8), rng.uniform(0.3, 0.65)
+        radius = rng.uniform(0.004, 0.02)
+        image[(x - cx) ** 2 + (y - cy) ** 2 <= radius ** 2] = rng.uniform(90, 160)
+
+    image += rng.normal(0, 12, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def measureEngine(engine, image, window_size, repeats=1):
+    ''' Runs an engine repeats times and returns its output, best wall time in seconds and
+    peak traced host memory in bytes. Memory is measured on a separate run so tracing
+    does not inflate the timing; worker processes and device memory are not included.
+    '''
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = engine(image, window_size)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        engine(image, window_size)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return output, best, peak
+
+
+def compareOutputs(output, reference):
+    ''' Returns the max and mean absolute difference and the fraction of pixels that differ
+    by more than one gray level between two uint8 images.
+    '''
+    diff = np.abs(output.astype(np.int16) - reference.astype(np.int16))
+    return {
+        'max_abs_diff': int(diff.max()),
+        'mean_abs_diff': float(diff.mean()),
+        'outlier_fraction': float(np.mean(diff > 1)),
+    }
+
+
+def isEquivalent(comparison, exact):
+    ''' Checks a compareOutputs result against the tolerance for exact or approximate engines. '''
+    if exact:
+        return comparison['max_abs_diff'] <= EXACT_TOLERANCE['max_abs_diff']
+    return comparison['mean_abs_diff'] <= APPROXIMATE_TOLERANCE['mean_abs_diff'] and \
+        comparison['outlier_fraction'] <= APPROXIMATE_TOLERANCE['outlier_fraction']
+
+
+def runBenchmark(sizes, window_sizes, engines=None, repeats=1, reference_max_size=256):
+    ''' Benchmarks engines on synthetic slices and yields one result dict per
+    (size, window_size, engine). Outputs are compared with the reference loop for sizes up
+    to reference_max_size; larger sizes are only timed because the loop takes minutes.
+    '''
+    engines = engines or list(BENCHMARK_ENGINES)
+    for size in sizes:
+        image = syntheticSlice(size)
+        for window_size in window_sizes:
+            reference = None
+            if size <= reference_max_size:
+                reference = adaptiveBilateralFilter(image, window_size)
+
+            for name in engines:
+                engine, exact = BENCHMARK_ENGINES[name]
+                if name == 'reference' and reference is None:
+                    continue
+                output, seconds, peak = measureEngine(engine, image, window_size, repeats)
+                result = {
+                    'engine': name,
+                    'size': size,
+                    'window_size': window_size,
+                    'seconds': seconds,
+                    'megapixels_per_second': image.size / seconds / 1e6,
+                    'peak_memory': peak,
+                    'comparison': None,
+                    'equivalent': None,
+                }
+                if reference is not None:
+                    result['comparison'] = compareOutputs(output, reference)
+                    result['equivalent'] = isEquivalent(result['comparison'], exact)
+                yield result
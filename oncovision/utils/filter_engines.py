@@ -0,0 +1,240 @@
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from oncovision.utils.image_filters import (
+    adaptiveBilateralFilter, batchAdaptiveBilateralFilter, parallelAdaptiveBilateralFilter,
+    cudaAvailable, PARALLEL_MIN_PIXELS
+)
+
+# Tile budget used by the 'tiled' engine when no max_memory is configured
+DEFAULT_TILED_MEMORY = 64 * 1024 * 1024
+
+# Bump whenever an engine's output changes, so cached processed images are not reused
+ENGINE_VERSION = 1
+
+
+class FilterEngine:
+    """
+    An adaptive bilateral filter implementation the dispatcher can choose from.
+    function takes an (N, H, W) uint8 stack, window_size, sigma_d, max_memory,
+    fast_statistics and workers, and returns the filtered uint8 stack. Exact engines
+    reproduce adaptiveBilateralFilter's rounding. Bounded engines keep their
+    temporaries within max_memory. available may be a callable, which is only
+    evaluated when the registry is queried.
+    """
+
+    def __init__(self, name, function, exact=True, bounded=True, available=True):
+        self.name = name
+        self.function = function
+        self.exact = exact
+        self.bounded = bounded
+        self._available = available
+
+    @property
+    def available(self):
+        return self._available() if callable(self._available) else self._available
+
+    def filter(self, images, window_size=7, sigma_d=1.0, max_memory=None, fast_statistics=False, workers=None):
+        return self.function(images, window_size, sigma_d, max_memory, fast_statistics, workers)
+
+    def __repr__(self):
+        return f"FilterEngine({self.name})"
+
+
+ENGINES = {}
+
+
+def registerEngine(engine):
+    """
+    Adds an engine to the registry, replacing any engine with the same name.
+    """
+    ENGINES[engine.name] = engine
+    return engine
+
+
+registerEngine(FilterEngine(
+    'reference',
+    lambda images, window_size, sigma_d, max_memory, fast_statistics, workers: np.stack([
+        adaptiveBilateralFilter(image, window_size, sigma_d) for image in images
+    ]),
+))
+registerEngine(FilterEngine(
+    'vectorized',
+    lambda images, window_size, sigma_d, max_memory, fast_statistics, workers: batchAdaptiveBilateralFilter(
+        images, window_size, sigma_d, fast_statistics=fast_statistics
+    ),
+    bounded=False,
+))
+registerEngine(FilterEngine(
+    'tiled',
+    lambda images, window_size, sigma_d, max_memory, fast_statistics, workers: batchAdaptiveBilateralFilter(
+        images, window_size, sigma_d, max_memory or DEFAULT_TILED_MEMORY, fast_statistics
+    ),
+))
+registerEngine(FilterEngine(
+    'parallel',
+    lambda images, window_size, sigma_d, max_memory, fast_statistics, workers: parallelAdaptiveBilateralFilter(
+        images, window_size, sigma_d, workers, max_memory, fast_statistics
+    ),
+))
+registerEngine(FilterEngine(
+    'cuda',
+    lambda images, window_size, sigma_d, max_memory, fast_statistics, workers: batchAdaptiveBilateralFilter(
+        images, window_size, sigma_d, max_memory, fast_statistics, use_cuda=True
+    ),
+    exact=False, available=cudaAvailable,
+))
+
+
+def availableEngines():
+    """
+    Returns the names of the engines that can run on this host.
+    """
+    return [name for name, engine in ENGINES.items() if engine.available]
+
+
+class FilterDispatcher:
+    """
+    Picks the fastest available engine for each input size and window size.
+    Choices come from calibration records (seconds per engine for a stack of a given
+    pixel count and window size); without them a static heuristic is used. The
+    reference loop is never chosen automatically, only when pinned, and neither are
+    the engines that ignore max_memory when a budget is set.
+    """
+
+    def __init__(self, pinned_engine=None, max_memory=None, fast_statistics=False, workers=None,
+                 calibration=None):
+        if pinned_engine is not None and pinned_engine not in availableEngines():
+            raise ValueError(f"Filter engine '{pinned_engine}' is not available on this host.")
+        self.pinned_engine = pinned_engine
+        self.max_memory = max_memory
+        self.fast_statistics = fast_statistics
+        self.workers = workers or os.cpu_count() or 1
+        self.calibration = calibration or []
+
+    def candidates(self):
+        """
+        Returns the names of the engines the dispatcher may choose automatically.
+        """
+        return [
+            name for name in availableEngines()
+            if name != 'reference' and (self.max_memory is None or ENGINES[name].bounded)
+        ]
+
+    def calibrate(self, sizes=(128, 512), window_sizes=(5,), repeats=2, batch_size=1):
+        """
+        Times every candidate engine on stacks of batch_size synthetic slices, the batch
+        shape the pipeline filters, and replaces the calibration records. Returns the
+        new records.
+        """
+        # Imported here to keep the benchmark helpers out of the request path
+        from oncovision.utils.filter_benchmark import syntheticSlice
+
+        records = []
+        for size in sizes:
+            images = np.repeat(syntheticSlice(size)[None], batch_size, axis=0)
+            for window_size in window_sizes:
+                seconds = {}
+                for name in self.candidates():
+                    best = None
+                    for _ in range(repeats):
+                        start = time.perf_counter()
+                        self._run(name, images, window_size, 1.0)
+                        elapsed = time.perf_counter() - start
+                        best = elapsed if best is None else min(best, elapsed)
+                    seconds[name] = best
+                records.append({'pixels': images.size, 'window_size': window_size, 'seconds': seconds})
+        self.calibration = records
+        return records
+
+    def loadCalibration(self, path):
+        """
+        Loads calibration records saved by saveCalibration, ignoring engines that are not
+        available on this host. Returns False when the file does not exist.
+        """
+        if not os.path.exists(path):
+            return False
+        with open(path) as calibration_file:
+            records = json.load(calibration_file)
+        available = availableEngines()
+        self.calibration = [
+            {**record, 'seconds': {name: value for name, value in record['seconds'].items() if name in available}}
+            for record in records
+        ]
+        return True
+
+    def saveCalibration(self, path):
+        with open(path, 'w') as calibration_file:
+            json.dump(self.calibration, calibration_file, indent=2)
+
+    def choose(self, shape, window_size):
+        """
+        Returns the engine name to use for an image (H, W) or stack (N, H, W) shape.
+        """
+        if self.pinned_engine is not None:
+            return self.pinned_engine
+
+        pixels = math.prod(shape)
+        candidates = self.candidates()
+        records = [
+            {**record, 'seconds': {name: value for name, value in record['seconds'].items() if name in candidates}}
+            for record in self.calibration
+        ]
+        records = [record for record in records if record['seconds']]
+        if records:
+            # Nearest window size first, then nearest stack size on a log scale
+            record = min(records, key=lambda record: (
+                abs(record['window_size'] - window_size),
+                abs(math.log(record['pixels']) - math.log(max(pixels, 1)))
+            ))
+            return min(record['seconds'], key=record['seconds'].get)
+
+        if cudaAvailable():
+            return 'cuda'
+        if self.workers > 1 and pixels >= PARALLEL_MIN_PIXELS:
+            return 'parallel'
+        return 'tiled' if self.max_memory is not None else 'vectorized'
+
+    def filter(self, images, window_size=7, sigma_d=1.0, engine=None):
+        """
+        Filters an image (H, W) or stack (N, H, W) with the given engine, or the engine
+        chosen for its shape.
+        """
+        stack = images[None] if images.ndim == 2 else images
+        filtered = self._run(engine or self.choose(stack.shape, window_size), stack, window_size, sigma_d)
+        return filtered[0] if images.ndim == 2 else filtered
+
+    def _run(self, name, images, window_size, sigma_d):
+        return ENGINES[name].filter(
+            images, window_size, sigma_d, self.max_memory, self.fast_statistics, self.workers
+        )
+
+
+_dispatcher = None
+
+
+def getFilterDispatcher():
+    """
+    Returns the process-wide dispatcher configured from the IMAGE_FILTER_* settings,
+    creating it on first use. Saved calibration is loaded when present; otherwise the
+    dispatcher calibrates itself if IMAGE_FILTER_CALIBRATE_ON_STARTUP is enabled.
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        from django.conf import settings
+
+        dispatcher = FilterDispatcher(
+            pinned_engine=settings.IMAGE_FILTER_ENGINE,
+            max_memory=settings.IMAGE_FILTER_MAX_MEMORY,
+            fast_statistics=settings.IMAGE_FILTER_FAST_STATISTICS,
+            workers=settings.IMAGE_FILTER_WORKERS,
+        )
+        if dispatcher.pinned_engine is None and not dispatcher.loadCalibration(settings.IMAGE_FILTER_CALIBRATION_FILE):
+            if settings.IMAGE_FILTER_CALIBRATE_ON_STARTUP:
+                dispatcher.calibrate(batch_size=settings.PROCESSING_JOB_BATCH_SIZE)
+        _dispatcher = dispatcher
+    return _dispatcher
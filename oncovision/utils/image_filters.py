@@ -1,12 +1,51 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
+import functools
+import math
 import cv2
+import os
 
-# Try to import cupy, but don't fail if it's not available
-try:
-    import cupy as cp
-    CUDA_AVAILABLE = True
-except ImportError:
-    CUDA_AVAILABLE = False
+_cupy_module = None
+_cupy_checked = False
+
+
+def _cupy():
+    ''' Imports cupy on first use, since it takes seconds to load. Returns None when it is
+    not available.
+    '''
+    global _cupy_module, _cupy_checked
+    if not _cupy_checked:
+        # Try to import cupy, but don't fail if it's not available
+        try:
+            import cupy
+            _cupy_module = cupy
+        except ImportError:
+            _cupy_module = None
+        _cupy_checked = True
+    return _cupy_module
+
+
+def cudaAvailable():
+    ''' Returns whether the CuPy engine can be used on this host. '''
+    return _cupy() is not None
+
+
+def __getattr__(name):
+    # CUDA_AVAILABLE is resolved lazily so importing this module does not load cupy
+    if name == 'CUDA_AVAILABLE':
+        return cudaAvailable()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Approximate bytes of temporaries the vectorized and CuPy block kernels allocate per
+# output pixel, as (bytes per window element, fixed bytes). Used to size tiles.
+CPU_TILE_COST = (16, 160)
+CUDA_TILE_COST = (40, 64)
+
+# Images (or stacks) with fewer pixels than this are filtered in-process, since
+# spawning bands across the process pool costs more than it saves.
+PARALLEL_MIN_PIXELS = 256 * 256
 
 
 def adaptiveBilateralFilter(image, window_size=7, sigma_d=1.0):
@@ -69,8 +108,278 @@ def adaptiveBilateralFilter(image, window_size=7, sigma_d=1.0):
     return (filtered_image * 255).astype(np.uint8)
 
 
-def cudaAdaptiveBilateralFilter(image, window_size=7, sigma_d=1.0):
-    ''' Function that returns an image filtered with an adaptive bilateral filter.
+@functools.lru_cache(maxsize=32)
+def _domainFilter(window_size, sigma_d):
+    ''' Returns the (window_size, window_size) float64 gaussian domain filter. The result
+    is cached and shared between calls, so it is read-only.
+    '''
+    pad = window_size // 2
+    x, y = np.meshgrid(np.arange(-pad, pad + 1), np.arange(-pad, pad + 1))
+    domain_filter = np.exp(-(x**2 + y**2) / (2 * sigma_d**2))
+    domain_filter.flags.writeable = False
+    return domain_filter
+
+
+def _pairwiseSum(terms):
+    ''' Adds a list of equally shaped arrays element-wise in the same order numpy's
+    pairwise summation uses when reducing a window of len(terms) values, so the
+    vectorized engine reproduces the rounding of adaptiveBilateralFilter exactly.
+    '''
+    n = len(terms)
+    if n < 8:
+        result = terms[0]
+        for term in terms[1:]:
+            result = result + term
+        return result
+    if n <= 128:
+        partial = list(terms[:8])
+        i = 8
+        while i < n - (n % 8):
+            for j in range(8):
+                partial[j] = partial[j] + terms[i + j]
+            i += 8
+        result = ((partial[0] + partial[1]) + (partial[2] + partial[3])) + \
+            ((partial[4] + partial[5]) + (partial[6] + partial[7]))
+        for term in terms[i:]:
+            result = result + term
+        return result
+    half = n // 2
+    half -= half % 8
+    return _pairwiseSum(terms[:half]) + _pairwiseSum(terms[half:])
+
+
+def _slidingWindowReduce(xp, array, window_size, axis, operation):
+    ''' Reduces every window_size-long run along axis ('sum', 'min' or 'max') in O(1) per
+    element, independent of window_size. The axis is split into window_size-aligned
+    blocks whose prefix and suffix reductions are combined (van Herk / Gil-Werman), so
+    results only depend on the block alignment, not on the array's extent.
+    Returns an array that is window_size - 1 shorter along axis.
+    '''
+    k = window_size
+    if operation != 'sum' and xp is not np:
+        # CuPy: separable running extrema from cupyx, cropped to the valid windows
+        from cupyx.scipy import ndimage
+        running = ndimage.minimum_filter1d if operation == 'min' else ndimage.maximum_filter1d
+        valid = [slice(None)] * array.ndim
+        valid[axis] = slice(k // 2, array.shape[axis] - k // 2)
+        return running(array, k, axis=axis)[tuple(valid)]
+
+    values = xp.moveaxis(array, axis, -1)
+    length = values.shape[-1]
+    valid_length = length - k + 1
+    blocks = -(-length // k)
+    values = xp.pad(values, [(0, 0)] * (values.ndim - 1) + [(0, blocks * k - length)], mode='edge')
+    values = values.reshape(values.shape[:-1] + (blocks, k))
+
+    if operation == 'sum':
+        prefix = xp.cumsum(values, axis=-1)
+        suffix = xp.cumsum(values[..., ::-1], axis=-1)[..., ::-1]
+    else:
+        accumulate = np.minimum.accumulate if operation == 'min' else np.maximum.accumulate
+        prefix = accumulate(values, axis=-1)
+        suffix = accumulate(values[..., ::-1], axis=-1)[..., ::-1]
+    prefix = prefix.reshape(prefix.shape[:-2] + (blocks * k,))[..., k - 1:k - 1 + valid_length]
+    suffix = suffix.reshape(suffix.shape[:-2] + (blocks * k,))[..., :valid_length]
+
+    if operation == 'sum':
+        # Windows starting on a block boundary are exactly one block
+        aligned = (xp.arange(valid_length) % k) == 0
+        result = xp.where(aligned, suffix, suffix + prefix)
+    elif operation == 'min':
+        result = xp.minimum(suffix, prefix)
+    else:
+        result = xp.maximum(suffix, prefix)
+    return xp.moveaxis(result, -1, axis)
+
+
+def _windowStatistics(xp, padded_block, window_size):
+    ''' Returns the float32 (mean, std, min, max) of every window_size x window_size window
+    of a padded block (or stack of blocks), using separable box sums for mean and std and
+    separable running extrema for min and max. Sums are accumulated in float64.
+    '''
+    def box(array, operation):
+        rows = _slidingWindowReduce(xp, array, window_size, -1, operation)
+        return _slidingWindowReduce(xp, rows, window_size, -2, operation)
+
+    values = padded_block.astype(xp.float64)
+    count = window_size * window_size
+    local_mean = box(values, 'sum') / count
+    local_var = xp.maximum(box(values * values, 'sum') / count - local_mean**2, 0)
+    return (
+        local_mean.astype(xp.float32),
+        xp.sqrt(local_var).astype(xp.float32),
+        box(padded_block, 'min'),
+        box(padded_block, 'max'),
+    )
+
+
+def _adaptiveBilateralBlock(padded_block, window_size, domain_filter, fast_statistics=False):
+    ''' Filters the interior of a reflect-padded float32 block, or of a (N, rows, cols)
+    stack of blocks, with the adaptive bilateral filter, one whole-array operation per
+    window offset. With fast_statistics the local mean, std, min and max come from
+    _windowStatistics instead of the full window, which no longer reproduces the
+    reference rounding exactly.
+    Returns a float32 array of shape (..., rows - 2 * pad, cols - 2 * pad).
+    '''
+    k = window_size
+    pad = k // 2
+    h = padded_block.shape[-2] - 2 * pad
+    w = padded_block.shape[-1] - 2 * pad
+
+    # Shifted views of the padded block, one per window offset in row-major order
+    shifted = [padded_block[..., dy:dy + h, dx:dx + w] for dy in range(k) for dx in range(k)]
+    center = padded_block[..., pad:pad + h, pad:pad + w]
+    count = np.float32(k * k)
+
+    # Local stats
+    if fast_statistics:
+        local_mean, local_std, local_min, local_max = _windowStatistics(np, padded_block, window_size)
+    else:
+        local_mean = _pairwiseSum(shifted) / count
+        local_min = np.minimum.reduce(shifted)
+        local_max = np.maximum.reduce(shifted)
+        local_var = _pairwiseSum([(region - local_mean) * (region - local_mean) for region in shifted]) / count
+        local_std = np.sqrt(local_var)
+
+    # ABF adaptive offset
+    delta = center - local_mean
+    zeta = np.where(delta > 0, local_max - center,
+        np.where(delta < 0, local_min - center, np.float32(0)))
+
+    # Sigma for range filter using local standard deviation
+    sigma_r = local_std + np.float32(1e-6)
+    denominator = 2 * sigma_r**2
+
+    # Combine the domain and range filters
+    combined_filter = [
+        domain_filter.flat[i] * np.exp(-((region - center - zeta) ** 2) / denominator)
+        for i, region in enumerate(shifted)
+    ]
+    normalization = _pairwiseSum(combined_filter)
+
+    # Filter the block
+    filtered = _pairwiseSum([
+        region * (weight / normalization) for region, weight in zip(shifted, combined_filter)
+    ])
+    return filtered.astype(np.float32)
+
+
+def _tiles(height, width, tile_pixels, window_size):
+    ''' Yields (row, col, rows, cols) tiles of about tile_pixels output pixels covering
+    a height x width image. Full-width bands are used whenever a single row fits. Tile
+    origins fall on multiples of window_size, which keeps _windowStatistics blocks aligned.
+    '''
+    if tile_pixels is None or tile_pixels >= height * width:
+        yield 0, 0, height, width
+        return
+    side = max(1, math.isqrt(tile_pixels))
+    if side >= width:
+        cols, rows = width, tile_pixels // width
+    else:
+        cols, rows = side, side
+    rows = max(window_size, rows - rows % window_size)
+    if cols < width:
+        cols = max(window_size, cols - cols % window_size)
+    for row in range(0, height, rows):
+        for col in range(0, width, cols):
+            yield row, col, min(rows, height - row), min(cols, width - col)
+
+
+def _tilePixels(window_size, tile_cost, max_memory):
+    ''' Returns how many output pixels fit in one tile for a peak-memory budget in bytes,
+    or None when the whole image should be filtered at once.
+    '''
+    if max_memory is None:
+        return None
+    bytes_per_window_element, fixed_bytes = tile_cost
+    bytes_per_pixel = bytes_per_window_element * window_size * window_size + fixed_bytes
+    return max(1, int(max_memory) // bytes_per_pixel)
+
+
+def _filterTiles(padded_image, output, window_size, block_filter, tile_pixels):
+    ''' Runs block_filter over halo-padded tiles of padded_image, an image or a stack of
+    images, and writes each tile into output. Every tile reads the same padded pixels the
+    whole image would, so the stitched result is identical to filtering it in one block.
+    '''
+    pad = window_size // 2
+    height, width = output.shape[-2:]
+    for row, col, rows, cols in _tiles(height, width, tile_pixels, window_size):
+        block = padded_image[..., row:row + rows + 2 * pad, col:col + cols + 2 * pad]
+        output[..., row:row + rows, col:col + cols] = block_filter(block)
+    return output
+
+
+def _normalizedPadding(images, pad, out=None):
+    ''' Min-max normalizes each image of an (N, H, W) stack to float32 [0, 1] and
+    reflect-pads it by pad pixels, as adaptiveBilateralFilter does before filtering.
+    The padded stack is written into out when given, and one normalization buffer is
+    reused for every slice.
+    '''
+    count, height, width = images.shape
+    if out is None:
+        out = np.empty((count, height + 2 * pad, width + 2 * pad), dtype=np.float32)
+    normalized = np.empty((height, width), dtype=np.float32)
+    for index in range(count):
+        cv2.normalize(images[index].astype(np.float32, copy=False), normalized, 0, 1, cv2.NORM_MINMAX)
+        cv2.copyMakeBorder(normalized, pad, pad, pad, pad, cv2.BORDER_REFLECT, dst=out[index])
+    return out
+
+
+def batchAdaptiveBilateralFilter(images, window_size=7, sigma_d=1.0, max_memory=None, fast_statistics=False,
+                                 use_cuda=False):
+    ''' Function that returns a stack of images filtered with an adaptive bilateral filter
+    in one vectorized pass. The domain filter and the padded working buffer are built once
+    for the whole stack; each slice is normalized on its own, so the result equals filtering
+    the slices one by one. With use_cuda the stack is uploaded to and downloaded from the
+    GPU once, instead of once per slice.
+    Parameters
+    ___
+    images: numpy array
+        The (N, H, W) stack of images to be filtered.
+    window_size: int
+        The size of the window used for filtering. It should be an odd number.
+    sigma_d: float
+        The constant used to calculate the domain filter. It controls the spatial extent of the filter.
+    max_memory: int or None
+        Peak bytes of temporaries allowed for the whole stack. When set, the stack is filtered
+        in halo-padded tiles sized to the budget; the result is identical to the untiled one.
+    fast_statistics: bool
+        Derive the local mean, std, min and max from separable box sums and running
+        extrema, so their cost does not grow with window_size. Not bit-identical to the
+        reference loop; see _windowStatistics.
+    use_cuda: bool
+        Filter on the GPU with the CuPy engine (see cudaAdaptiveBilateralFilter).
+    Returns
+    ___
+    filtered_images: numpy array
+        The filtered (N, H, W) uint8 stack.
+    '''
+    images = np.asarray(images)
+    if use_cuda:
+        return _cudaBatchAdaptiveBilateralFilter(images, window_size, sigma_d, max_memory, fast_statistics)
+
+    padded_stack = _normalizedPadding(images, window_size // 2)
+    domain_filter = _domainFilter(window_size, sigma_d)
+
+    filtered_images = _filterTiles(
+        padded_stack, np.empty(images.shape, dtype=np.float32), window_size,
+        lambda block: _adaptiveBilateralBlock(block, window_size, domain_filter, fast_statistics),
+        _stackTilePixels(len(images), window_size, CPU_TILE_COST, max_memory)
+    )
+    return (filtered_images * 255).astype(np.uint8)
+
+
+def _stackTilePixels(count, window_size, tile_cost, max_memory):
+    ''' Returns the per-slice tile size for filtering count slices at once within max_memory. '''
+    tile_pixels = _tilePixels(window_size, tile_cost, max_memory)
+    return None if tile_pixels is None else max(1, tile_pixels // max(1, count))
+
+
+def vectorizedAdaptiveBilateralFilter(image, window_size=7, sigma_d=1.0, max_memory=None, fast_statistics=False):
+    ''' Function that returns an image filtered with an adaptive bilateral filter,
+    computed with whole-array numpy operations instead of a per-pixel loop.
+    The output matches adaptiveBilateralFilter pixel for pixel; a difference of at
+    most 1 gray level is tolerated to absorb float32 exp rounding across numpy builds.
     Parameters
     ___
     image: numpy array
@@ -79,34 +388,167 @@ def cudaAdaptiveBilateralFilter(image, window_size=7, sigma_d=1.0):
         The size of the window used for filtering. It should be an odd number.
     sigma_d: float
         The constant used to calculate the domain filter. It controls the spatial extent of the filter.
+    max_memory: int or None
+        Peak bytes of temporaries allowed. When set, the image is filtered in halo-padded
+        tiles sized to the budget; the result is identical to the untiled one.
+    fast_statistics: bool
+        Derive the local mean, std, min and max from separable box sums and running
+        extrema, so their cost does not grow with window_size. Not bit-identical to the
+        reference loop; see _windowStatistics.
     Returns
     ___
     filtered_image: numpy array
         The filtered image.
     '''
+    return batchAdaptiveBilateralFilter(image[None], window_size, sigma_d, max_memory, fast_statistics)[0]
+
+
+def _attachSharedArray(name, shape, dtype):
+    ''' Attaches to a shared memory block created by the parent process and returns it
+    with a numpy view over its buffer. Only the parent unlinks the block.
+    '''
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _filterSharedBand(task):
+    ''' Process pool entry point: filters rows [row, row + rows) of one slice of the shared
+    padded stack and writes the uint8 result into the shared output stack.
+    '''
+    input_name, output_name, shape, window_size, sigma_d, max_memory, fast_statistics, index, row, rows = task
+    pad = window_size // 2
+    count, height, width = shape
+    input_shm, padded_stack = _attachSharedArray(
+        input_name, (count, height + 2 * pad, width + 2 * pad), np.float32
+    )
+    output_shm, output_stack = _attachSharedArray(output_name, shape, np.uint8)
+    try:
+        domain_filter = _domainFilter(window_size, sigma_d)
+        band = _filterTiles(
+            padded_stack[index, row:row + rows + 2 * pad], np.empty((rows, width), dtype=np.float32),
+            window_size, lambda block: _adaptiveBilateralBlock(block, window_size, domain_filter, fast_statistics),
+            _tilePixels(window_size, CPU_TILE_COST, max_memory)
+        )
+        output_stack[index, row:row + rows] = (band * 255).astype(np.uint8)
+    finally:
+        del padded_stack, output_stack
+        input_shm.close()
+        output_shm.close()
+
+
+_process_pool = None
+_process_pool_workers = None
+
+
+def _processPool(workers):
+    ''' Returns a process pool with the given number of workers, reused across calls. '''
+    global _process_pool, _process_pool_workers
+    if _process_pool is None or _process_pool_workers != workers:
+        if _process_pool is not None:
+            _process_pool.shutdown()
+        _process_pool = ProcessPoolExecutor(max_workers=workers)
+        _process_pool_workers = workers
+    return _process_pool
+
+
+def parallelAdaptiveBilateralFilter(image, window_size=7, sigma_d=1.0, workers=None, max_memory=None,
+                                    fast_statistics=False, min_parallel_pixels=PARALLEL_MIN_PIXELS):
+    ''' Function that returns an image, or a stack of images, filtered with an adaptive
+    bilateral filter across a process pool. Each slice is split into horizontal bands
+    with window_size // 2 halo rows; the padded input and the output live in shared
+    memory, so no pixel data is pickled. The result is identical to
+    vectorizedAdaptiveBilateralFilter applied to each slice.
+    Parameters
+    ___
+    image: numpy array
+        The input image (H, W) or stack of images (N, H, W) to be filtered.
+    window_size: int
+        The size of the window used for filtering. It should be an odd number.
+    sigma_d: float
+        The constant used to calculate the domain filter. It controls the spatial extent of the filter.
+    workers: int or None
+        Number of worker processes. Defaults to the number of CPUs.
+    max_memory: int or None
+        Peak bytes of temporaries allowed per worker, as in vectorizedAdaptiveBilateralFilter.
+    fast_statistics: bool
+        Use O(1)-per-pixel local statistics, as in vectorizedAdaptiveBilateralFilter.
+    min_parallel_pixels: int
+        Inputs with fewer pixels are filtered in the calling process.
+    Returns
+    ___
+    filtered_image: numpy array
+        The filtered image or stack, with the same shape as the input.
+    '''
+    workers = workers or os.cpu_count() or 1
+    stack = image[None] if image.ndim == 2 else image
+    count, height, width = stack.shape
+
+    # Small inputs are not worth the pool overhead
+    if workers <= 1 or stack.size < min_parallel_pixels:
+        filtered = batchAdaptiveBilateralFilter(stack, window_size, sigma_d, max_memory, fast_statistics)
+        return filtered[0] if image.ndim == 2 else filtered
+
+    pad = window_size // 2
+    padded_shape = (count, height + 2 * pad, width + 2 * pad)
+    input_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(padded_shape)) * 4)
+    output_shm = shared_memory.SharedMemory(create=True, size=count * height * width)
+    try:
+        padded_stack = np.ndarray(padded_shape, dtype=np.float32, buffer=input_shm.buf)
+        _normalizedPadding(stack, pad, out=padded_stack)
+
+        # Split every slice into enough bands to keep all workers busy, starting each
+        # band on a multiple of window_size like _tiles does
+        bands_per_slice = max(1, math.ceil(2 * workers / count))
+        band_rows = window_size * math.ceil(height / bands_per_slice / window_size)
+        tasks = [
+            (input_shm.name, output_shm.name, (count, height, width), window_size, sigma_d, max_memory,
+             fast_statistics, index, row, min(band_rows, height - row))
+            for index in range(count)
+            for row in range(0, height, band_rows)
+        ]
+        for _ in _processPool(workers).map(_filterSharedBand, tasks):
+            pass
+
+        filtered = np.ndarray((count, height, width), dtype=np.uint8, buffer=output_shm.buf).copy()
+        del padded_stack
+    finally:
+        input_shm.close()
+        input_shm.unlink()
+        output_shm.close()
+        output_shm.unlink()
+    return filtered[0] if image.ndim == 2 else filtered
+
+
+def _cudaAdaptiveBilateralBlock(padded_block, window_size, domain_filter, fast_statistics=False):
+    ''' Filters the interior of a reflect-padded CuPy block, or of a (N, rows, cols) stack
+    of blocks, with the adaptive bilateral filter, optionally taking the local stats from
+    _windowStatistics.
+    Returns a float CuPy array of shape (..., rows - 2 * pad, cols - 2 * pad).
+    '''
+    cp = _cupy()
     pad = window_size // 2
-    img = cp.asarray(image, dtype=cp.float32) / 255.0
-    img = cp.pad(img, pad, mode='reflect')
-    H, W = image.shape
+    H = padded_block.shape[-2] - 2 * pad
+    W = padded_block.shape[-1] - 2 * pad
     k = window_size
 
     # Create strided sliding window view
-    shape = (H, W, k, k)
-    strides = img.strides * 2
-    patches = cp.lib.stride_tricks.as_strided(img, shape=shape, strides=strides)
-
-    # Domain filter
-    y, x = cp.meshgrid(cp.arange(-pad, pad + 1), cp.arange(-pad, pad + 1))
-    domain_filter = cp.exp(-(x**2 + y**2) / (2 * sigma_d**2))
-    domain_filter = domain_filter[None, None, :, :]
+    shape = padded_block.shape[:-2] + (H, W, k, k)
+    strides = padded_block.strides + padded_block.strides[-2:]
+    patches = cp.lib.stride_tricks.as_strided(padded_block, shape=shape, strides=strides)
 
     # Central pixels
-    center = patches[:, :, pad, pad][:, :, None, None]
+    center = patches[..., pad, pad][..., None, None]
 
     # Local stats
-    local_mean = cp.mean(patches, axis=(2, 3), keepdims=True)
-    local_min = cp.min(patches, axis=(2, 3), keepdims=True)
-    local_max = cp.max(patches, axis=(2, 3), keepdims=True)
+    if fast_statistics:
+        local_mean, local_std, local_min, local_max = [
+            stat[..., None, None] for stat in _windowStatistics(cp, padded_block, window_size)
+        ]
+    else:
+        local_mean = cp.mean(patches, axis=(-2, -1), keepdims=True)
+        local_min = cp.min(patches, axis=(-2, -1), keepdims=True)
+        local_max = cp.max(patches, axis=(-2, -1), keepdims=True)
+        local_std = cp.std(patches, axis=(-2, -1), keepdims=True)
     delta = center - local_mean
 
     # ζ adaptive offset
@@ -114,7 +556,7 @@ def cudaAdaptiveBilateralFilter(image, window_size=7, sigma_d=1.0):
         cp.where(delta < 0, local_min - center, 0.0))
 
     # σr: adaptive std dev
-    sigma_r = cp.std(patches, axis=(2, 3), keepdims=True) + 1e-5
+    sigma_r = local_std + 1e-5
 
     # Range filter
     diff = patches - center - zeta
@@ -122,8 +564,56 @@ def cudaAdaptiveBilateralFilter(image, window_size=7, sigma_d=1.0):
 
     # Combined kernel
     kernel = domain_filter * range_filter
-    kernel /= cp.sum(kernel, axis=(2, 3), keepdims=True)
+    kernel /= cp.sum(kernel, axis=(-2, -1), keepdims=True)
 
     # Apply to image
-    result = cp.sum(kernel * patches, axis=(2, 3))
-    return cp.asnumpy((result * 255).clip(0, 255).astype(cp.uint8))
+    return cp.sum(kernel * patches, axis=(-2, -1))
+
+
+def _cudaBatchAdaptiveBilateralFilter(images, window_size, sigma_d, max_memory, fast_statistics):
+    ''' Filters an (N, H, W) stack with the CuPy engine, keeping the padded input and the
+    output on the device so the stack crosses the bus once in each direction.
+    '''
+    cp = _cupy()
+    pad = window_size // 2
+    img = cp.asarray(images, dtype=cp.float32) / 255.0
+    img = cp.pad(img, ((0, 0), (pad, pad), (pad, pad)), mode='reflect')
+
+    # Domain filter
+    y, x = cp.meshgrid(cp.arange(-pad, pad + 1), cp.arange(-pad, pad + 1))
+    domain_filter = cp.exp(-(x**2 + y**2) / (2 * sigma_d**2))
+
+    def block_filter(block):
+        result = _cudaAdaptiveBilateralBlock(block, window_size, domain_filter, fast_statistics)
+        return (result * 255).clip(0, 255).astype(cp.uint8)
+
+    filtered_images = _filterTiles(
+        img, cp.empty(images.shape, dtype=cp.uint8), window_size, block_filter,
+        _stackTilePixels(len(images), window_size, CUDA_TILE_COST, max_memory)
+    )
+    return cp.asnumpy(filtered_images)
+
+
+def cudaAdaptiveBilateralFilter(image, window_size=7, sigma_d=1.0, max_memory=None, fast_statistics=False):
+    ''' Function that returns an image filtered with an adaptive bilateral filter.
+    Parameters
+    ___
+    image: numpy array
+        The input image to be filtered.
+    window_size: int
+        The size of the window used for filtering. It should be an odd number.
+    sigma_d: float
+        The constant used to calculate the domain filter. It controls the spatial extent of the filter.
+    max_memory: int or None
+        Peak bytes of device temporaries allowed. When set, the image is filtered in
+        halo-padded tiles sized to the budget and stitched on the device.
+    fast_statistics: bool
+        Derive the local mean, std, min and max from separable box sums and running
+        extrema, so their cost does not grow with window_size. Not bit-identical to the
+        reference loop; see _windowStatistics.
+    Returns
+    ___
+    filtered_image: numpy array
+        The filtered image.
+    '''
+    return _cudaBatchAdaptiveBilateralFilter(image[None], window_size, sigma_d, max_memory, fast_statistics)[0]
@@ -0,0 +1,310 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import time
+
+import numpy as np
+import cv2
+
+# Reduced-resolution grayscale decode flags, largest reduction first
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+PIPELINE_STAGES = ('decode', 'resize', 'filter', 'encode')
+
+
+def pixelDigest(pixels):
+    ''' Returns the SHA-256 hex digest of an image's pixels, shape and dtype. '''
+    digest = hashlib.sha256(f"{pixels.shape}:{pixels.dtype}:".encode())
+    digest.update(pixels if pixels.flags.c_contiguous else pixels.copy())
+    return digest.hexdigest()
+
+
+def imageSize(source):
+    ''' Returns the (width, height) of an image file or encoded bytes, reading only its
+    header, or None when the format is not recognized.
+    '''
+    from PIL import Image, UnidentifiedImageError
+    import io
+
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+            return image.size
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+def reducedDecodeFlag(width, height, target_width, target_height):
+    ''' Returns the largest reduced grayscale decode flag that still yields an image at
+    least as large as the target, or cv2.IMREAD_GRAYSCALE when no reduction fits.
+    '''
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if width // factor >= target_width and height // factor >= target_height:
+            return flag
+    return cv2.IMREAD_GRAYSCALE
+
+
+def decodeSlice(source, target_size=None):
+    ''' Function that decodes an image straight to grayscale, at a reduced resolution
+    when it is at least twice as large as target_size.
+    Parameters
+    ___
+    source: str or bytes
+        The image path or its encoded bytes.
+    target_size: tuple
+        The (width, height) the slice will be resized to, or None to decode at full
+        resolution.
+    Returns
+    ___
+    pixels: numpy array
+        The grayscale image, or None when it cannot be decoded.
+    '''
+    flag = cv2.IMREAD_GRAYSCALE
+    if target_size is not None:
+        size = imageSize(source)
+        if size is not None:
+            flag = reducedDecodeFlag(*size, *target_size)
+    if isinstance(source, bytes):
+        return cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flag)
+    return cv2.imread(source, flag)
+
+
+def imageDigest(source):
+    ''' Returns the pixelDigest of an image path or encoded bytes decoded to grayscale at
+    full resolution, or None when it cannot be decoded.
+    '''
+    pixels = decodeSlice(source)
+    return pixelDigest(pixels) if pixels is not None else None
+
+
+def encodeSlice(image, compression=None):
+    ''' Encodes an image as PNG bytes with the given zlib compression level (0-9, None
+    for OpenCV's default), or returns None when encoding fails.
+    '''
+    params = [] if compression is None else [cv2.IMWRITE_PNG_COMPRESSION, compression]
+    is_success, buffer = cv2.imencode('.png', image, params)
+    return buffer.tobytes() if is_success else None
+
+
+def _scaledSize(width, height, max_side):
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def pyramidLevels(source, max_sides, compression=None):
+    ''' Function that builds the downscaled levels of an image pyramid.
+    Parameters
+    ___
+    source: str or bytes
+        The image path or its encoded bytes.
+    max_sides: dict
+        Level name -> longest side in pixels. Levels at least as large as the image are
+        left out, the full image serves them.
+    compression: int
+        zlib level of the PNGs, None for OpenCV's default.
+    Returns
+    ___
+    levels: dict
+        Level name -> PNG bytes, or None when the image cannot be decoded.
+    '''
+    image = cv2.imread(source, cv2.IMREAD_UNCHANGED) if isinstance(source, str) \
+        else cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+    levels = {}
+    # Largest level first, each one downscaled from the previous for speed
+    for name, max_side in sorted(max_sides.items(), key=lambda item: -item[1]):
+        if max_side >= max(width, height):
+            continue
+        image = cv2.resize(image, _scaledSize(width, height, max_side), interpolation=cv2.INTER_AREA)
+        levels[name] = encodeSlice(image, compression)
+    return levels
+
+
+def deepZoomTiles(source, tile_size=256, overlap=1, compression=None):
+    ''' Function that cuts an image into Deep Zoom tiles.
+    Parameters
+    ___
+    source: str or bytes
+        The image path or its encoded bytes.
+    tile_size, overlap: int
+        Tile side and the pixels each tile shares with its neighbours.
+    compression: int
+        zlib level of the PNGs, None for OpenCV's default.
+    Returns
+    ___
+    size: tuple
+        The (width, height) of the image, or None when it cannot be decoded.
+    tiles: list
+        (level, column, row, PNG bytes) of every tile. Level 0 is 1x1 pixel and the last
+        level is the full resolution, as in the Deep Zoom format.
+    '''
+    image = cv2.imread(source, cv2.IMREAD_UNCHANGED) if isinstance(source, str) \
+        else cv2.imdecode(np.frombuffer(source, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None, []
+    height, width = image.shape[:2]
+    max_level = int(np.ceil(np.log2(max(width, height, 1))))
+    tiles = []
+    for level in range(max_level, -1, -1):
+        scale = 2 ** (max_level - level)
+        level_size = (max(1, -(-width // scale)), max(1, -(-height // scale)))
+        if level != max_level:
+            # Halve the previous level rather than resampling the full image
+            image = cv2.resize(image, level_size, interpolation=cv2.INTER_AREA)
+        level_height, level_width = image.shape[:2]
+        for column in range(-(-level_width // tile_size)):
+            for row in range(-(-level_height // tile_size)):
+                x0, y0 = max(column * tile_size - overlap, 0), max(row * tile_size - overlap, 0)
+                x1 = min((column + 1) * tile_size + overlap, level_width)
+                y1 = min((row + 1) * tile_size + overlap, level_height)
+                tiles.append((level, column, row, encodeSlice(image[y0:y1, x0:x1], compression)))
+    return (width, height), tiles
+
+
+def _loadSlice(task):
+    ''' Decodes and resizes one slice in a pool worker. Returns the digest of the decoded
+    pixels and the resized slice, or None.
+    '''
+    source, target_size, reduced_decode = task
+    pixels = decodeSlice(source, target_size if reduced_decode else None)
+    if pixels is None:
+        return None
+    return pixelDigest(pixels), cv2.resize(pixels, target_size)
+
+
+def _encodeSlice(task):
+    return encodeSlice(*task)
+
+
+_pipeline_pool = None
+_pipeline_pool_workers = None
+
+
+def _pipelinePool(workers):
+    ''' Returns a process pool with the given number of workers, reused across calls. '''
+    global _pipeline_pool, _pipeline_pool_workers
+    if _pipeline_pool is None or _pipeline_pool_workers != workers:
+        if _pipeline_pool is not None:
+            _pipeline_pool.shutdown()
+        _pipeline_pool = ProcessPoolExecutor(max_workers=workers)
+        _pipeline_pool_workers = workers
+    return _pipeline_pool
+
+
+def parallelMap(function, items, workers):
+    ''' Maps a picklable function over items in the pipeline's process pool, or in this
+    process when there is a single worker or item. Returns the results in order.
+    '''
+    if workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    return list(_pipelinePool(workers).map(function, items))
+
+
+class PreprocessingPipeline:
+    '''
+    Decode -> resize -> filter -> encode pipeline producing the processed slices.
+    Slices are decoded straight to grayscale, at a reduced resolution when the source
+    is much larger than the target, and resized into a working stack that is reused
+    across batches. With workers > 1 decoding and encoding run in a process pool.
+    timings accumulates the wall time in seconds spent in each stage.
+    '''
+
+    def __init__(self, width=512, height=512, window_size=5, sigma_d=1.0, png_compression=None,
+                 reduced_decode=True, workers=1, dispatcher=None):
+        self.width = width
+        self.height = height
+        self.window_size = window_size
+        self.sigma_d = sigma_d
+        self.png_compression = png_compression
+        self.reduced_decode = reduced_decode
+        self.workers = workers
+        self.dispatcher = dispatcher
+        self._stack = np.empty((0, height, width), dtype=np.uint8)
+        self.resetTimings()
+
+    def resetTimings(self):
+        self.timings = {stage: 0.0 for stage in PIPELINE_STAGES}
+
+    def formatTimings(self):
+        return ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in self.timings.items())
+
+    def _workingStack(self, count):
+        ''' Returns a (count, height, width) view of the working stack, growing it as needed. '''
+        if self._stack.shape[0] < count:
+            self._stack = np.empty((max(count, 2 * self._stack.shape[0]), self.height, self.width), dtype=np.uint8)
+        return self._stack[:count]
+
+    def load(self, sources):
+        ''' Decodes and resizes the slices of a batch.
+        Parameters
+        ___
+        sources: list
+            Image paths or encoded bytes.
+        Returns
+        ___
+        stack: numpy array
+            (N, height, width) uint8 view of the working stack holding the loaded slices in
+            source order. It is overwritten by the next load.
+        digests: list
+            The pixelDigest of each decoded source, or None for the sources that could not
+            be decoded; their stack rows are left out.
+        '''
+        target_size = (self.width, self.height)
+        digests = []
+        if self.workers > 1 and len(sources) > 1:
+            start = time.perf_counter()
+            tasks = [(source, target_size, self.reduced_decode) for source in sources]
+            loaded = list(_pipelinePool(self.workers).map(_loadSlice, tasks))
+            stack = self._workingStack(sum(item is not None for item in loaded))
+            index = 0
+            for item in loaded:
+                digests.append(item[0] if item is not None else None)
+                if item is not None:
+                    stack[index] = item[1]
+                    index += 1
+            # Decoding and resizing overlap in the pool, so they are timed as one stage
+            self.timings['decode'] += time.perf_counter() - start
+            return stack, digests
+
+        # Each slice is resized right after decoding, so only one full-size slice is alive
+        stack = self._workingStack(len(sources))
+        index = 0
+        for source in sources:
+            start = time.perf_counter()
+            pixels = decodeSlice(source, target_size if self.reduced_decode else None)
+            digests.append(pixelDigest(pixels) if pixels is not None else None)
+            resize_start = time.perf_counter()
+            self.timings['decode'] += resize_start - start
+            if pixels is not None:
+                cv2.resize(pixels, target_size, dst=stack[index])
+                index += 1
+                self.timings['resize'] += time.perf_counter() - resize_start
+        return stack[:index], digests
+
+    def filter(self, stack, engine=None):
+        ''' Filters a (N, height, width) stack with the given engine, or the dispatcher's
+        engine for its shape.
+        '''
+        start = time.perf_counter()
+        filtered = self.dispatcher.filter(stack, window_size=self.window_size, sigma_d=self.sigma_d, engine=engine)
+        self.timings['filter'] += time.perf_counter() - start
+        return filtered
+
+    def encode(self, images):
+        ''' Encodes each slice of a stack as PNG bytes, None for the slices that failed. '''
+        start = time.perf_counter()
+        encoded = parallelMap(_encodeSlice, [(image, self.png_compression) for image in images], self.workers)
+        self.timings['encode'] += time.perf_counter() - start
+        return encoded
+
+    def run(self, sources):
+        ''' Runs the whole pipeline on a batch and returns the PNG bytes of each source, or
+        None for the sources that could not be decoded or encoded.
+        '''
+        stack, digests = self.load(sources)
+        encoded = iter(self.encode(self.filter(stack)))
+        return [next(encoded) if digest is not None else None for digest in digests]
@@ -19,4 +19,23 @@ MALIGNANCY_TYPES = [
     ('2', 'Indeterminado'),
     ('3', 'Moderadamente Sospechoso'),
     ('4', 'Altamente Sospechoso'),
-]
\ No newline at end of file
+]
+
+PROCESSING_JOB_KINDS = [
+    ('filter', 'Filtrado'),
+    ('inference', 'Análisis'),
+    ('volume', 'Volumen'),
+]
+
+PROCESSING_JOB_STATES = [
+    ('queued', 'En cola'),
+    ('running', 'En ejecución'),
+    ('done', 'Completada'),
+    ('failed', 'Fallida'),
+]
+
+UPLOAD_SESSION_STATES = [
+    ('open', 'Abierta'),
+    ('finalizing', 'Finalizando'),
+    ('finalized', 'Finalizada'),
+]
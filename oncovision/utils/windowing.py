@@ -0,0 +1,138 @@
+import functools
+
+import numpy as np
+
+# (center, width) in Hounsfield units of the standard chest CT windows
+WINDOWS = {
+    'lung': (-600.0, 1500.0),
+    'mediastinal': (40.0, 400.0),
+}
+
+
+def windowFor(dataset, window):
+    ''' Function that resolves the window to apply to a DICOM dataset.
+    Parameters
+    ___
+    dataset: pydicom Dataset
+        The parsed DICOM file.
+    window: str
+        'lung' or 'mediastinal' for the standard CT windows, 'file' for the file's own
+        WindowCenter/WindowWidth, or 'minmax' to stretch each slice to its own range.
+    Returns
+    ___
+    window: tuple
+        The (center, width) in Hounsfield units, or None for a min-max stretch. The
+        standard windows fall back to the file's window, and that one to a min-max
+        stretch, when the file has no rescale or window attributes.
+    '''
+    if window in WINDOWS and 'RescaleIntercept' in dataset:
+        return WINDOWS[window]
+    if window != 'minmax' and 'WindowCenter' in dataset and 'WindowWidth' in dataset:
+        # Both attributes can be multi-valued, the first window is the default one
+        center, width = dataset.WindowCenter, dataset.WindowWidth
+        center = center[0] if hasattr(center, '__len__') else center
+        width = width[0] if hasattr(width, '__len__') else width
+        return float(center), float(width)
+    return None
+
+
+def _windowEdges(center, width):
+    ''' Returns the lowest and highest values mapped inside the output range by the DICOM
+    linear window function (PS3.3 C.11.2.1.2).
+    '''
+    width = max(width, 1.0)
+    return center - 0.5 - (width - 1) / 2, center - 0.5 + (width - 1) / 2
+
+
+@functools.lru_cache(maxsize=32)
+def windowLookupTable(dtype, slope, intercept, center, width, invert=False):
+    ''' Function that returns the uint8 lookup table mapping every stored value of an 8 or
+    16-bit integer dtype to its windowed intensity. Index it with the pixels viewed as
+    unsigned integers of the same size. The table is read-only and cached.
+    Parameters
+    ___
+    dtype: str
+        The numpy dtype of the stored pixels (uint8, int8, uint16 or int16).
+    slope, intercept: float
+        RescaleSlope and RescaleIntercept, converting stored values to Hounsfield units.
+    center, width: float
+        The window, in Hounsfield units.
+    invert: bool
+        Whether to invert the output, for MONOCHROME1 images.
+    Returns
+    ___
+    lookup_table: numpy array
+        uint8 array of 2 ** bits entries.
+    '''
+    dtype = np.dtype(dtype)
+    unsigned = np.dtype(f'uint{dtype.itemsize * 8}')
+    stored = np.arange(2 ** (dtype.itemsize * 8), dtype=np.int64).astype(unsigned).view(dtype)
+    lookup_table = _windowFloat(stored.astype(np.float32), slope, intercept, center, width, invert)
+    lookup_table.flags.writeable = False
+    return lookup_table
+
+
+def _windowFloat(pixels, slope, intercept, center, width, invert):
+    ''' Windows a float32 array in place and returns it converted to uint8. '''
+    low, high = _windowEdges(center, width)
+    # A window of width 1 (a constant slice stretched to its own range) is a threshold
+    span = max(high - low, 1.0)
+    # Hounsfield units, then the window mapped to [0, 255]
+    pixels *= np.float32(slope * 255.0 / span)
+    pixels += np.float32((intercept - low) * 255.0 / span)
+    np.clip(pixels, 0, 255, out=pixels)
+    if invert:
+        np.subtract(255, pixels, out=pixels)
+    np.rint(pixels, out=pixels)
+    return pixels.astype(np.uint8)
+
+
+def applyWindow(pixels, slope=1.0, intercept=0.0, center=None, width=None, invert=False):
+    ''' Function that converts stored DICOM pixels to Hounsfield units and maps a window
+    of them to 8-bit intensities, identically for every slice of a series.
+    Parameters
+    ___
+    pixels: numpy array
+        The stored pixel values (pydicom's pixel_array).
+    slope, intercept: float
+        RescaleSlope and RescaleIntercept of the file.
+    center, width: float
+        The window in Hounsfield units, or None to stretch the slice's own range (8-bit
+        data is returned unchanged).
+    invert: bool
+        Whether to invert the output, for MONOCHROME1 images.
+    Returns
+    ___
+    image: numpy array
+        The uint8 image. 8 and 16-bit integer data goes through a cached lookup table,
+        anything else through in-place float32 operations on a single working copy.
+    '''
+    if center is None or width is None:
+        if pixels.dtype == np.uint8:
+            # 8-bit data is already in the output range
+            return pixels
+        low, high = float(pixels.min()), float(pixels.max())
+        center, width = (low + high + 1) / 2, max(high - low + 1, 1.0)
+        slope, intercept = 1.0, 0.0
+    if pixels.dtype.kind in 'iu' and pixels.dtype.itemsize <= 2:
+        lookup_table = windowLookupTable(
+            pixels.dtype.str, float(slope), float(intercept), float(center), float(width), invert
+        )
+        unsigned = np.dtype(f'uint{pixels.dtype.itemsize * 8}')
+        return np.take(lookup_table, pixels.view(unsigned))
+    return _windowFloat(pixels.astype(np.float32), slope, intercept, center, width, invert)
+
+
+def windowDataset(dataset, window='lung'):
+    ''' Returns the uint8 image of a DICOM dataset's pixels with the window resolved by
+    windowFor applied.
+    '''
+    resolved = windowFor(dataset, window)
+    center, width = resolved if resolved is not None else (None, None)
+    return applyWindow(
+        dataset.pixel_array,
+        float(dataset.get('RescaleSlope', 1.0) or 1.0),
+        float(dataset.get('RescaleIntercept', 0.0) or 0.0),
+        center, width,
+        invert=dataset.get('PhotometricInterpretation') == 'MONOCHROME1',
+    )
@@ -38,10 +38,15 @@ echo Activando entorno virtual...
 call venv\Scripts\activate.bat
 echo.
 
+echo Iniciando procesador de imagenes en otra ventana...
+start "OncoVision - Procesador de imagenes" cmd /k "call venv\Scripts\activate.bat && python manage.py process_jobs"
+echo.
+
+REM Servidor ASGI: los eventos de procesamiento (clinical_case_events) se envian en vivo
 echo Iniciando servidor Django en http://0.0.0.0:8080/
 echo.
 echo Presione Ctrl+C para detener el servidor
 echo ========================================
 echo.
 
-python manage.py runserver 0.0.0.0:8080
+uvicorn oncovision.asgi:application --host 0.0.0.0 --port 8080